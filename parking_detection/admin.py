@@ -1,8 +1,13 @@
 from django.contrib import admin
-from .models import ParkingLot, ParkingStatus
+from .models import Camera, DetectorLease, DetectorWorker, ParkingLot, ParkingStatus
+
+class CameraInline(admin.TabularInline):
+    model = Camera
+    extra = 0
 
 @admin.register(ParkingLot)
 class ParkingLotAdmin(admin.ModelAdmin):
+    inlines = (CameraInline,)
     list_display = ('name', 'id', 'is_active', 'created_at')
     list_filter = ('is_active',)
     search_fields = ('name',)
@@ -11,4 +16,13 @@ class ParkingLotAdmin(admin.ModelAdmin):
 class ParkingStatusAdmin(admin.ModelAdmin):
     list_display = ('parking_lot', 'free_spaces', 'total_spaces', 'timestamp')
     list_filter = ('parking_lot',)
-    date_hierarchy = 'timestamp'
\ No newline at end of file
+    date_hierarchy = 'timestamp'
+
+@admin.register(DetectorLease)
+class DetectorLeaseAdmin(admin.ModelAdmin):
+    list_display = ('parking_lot', 'owner', 'acquired_at', 'expires_at')
+    list_filter = ('owner',)
+
+@admin.register(DetectorWorker)
+class DetectorWorkerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'heartbeat_at', 'started_at')
\ No newline at end of file
@@ -1,6 +1,71 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+
+# Entry points of the WSGI/ASGI servers whose processes serve the API
+SERVER_SCRIPTS = ("gunicorn", "uvicorn", "daphne", "hypercorn", "granian", "uwsgi", "mod_wsgi", "waitress-serve")
+# Management commands that serve the API and should bring detectors up
+DETECTOR_COMMANDS = ("runserver",)
+MANAGEMENT_SCRIPTS = ("manage", "django-admin", "django")
 
 
 class ParkingDetectionConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "parking_detection"
+
+    started = False
+    start_lock = threading.Lock()
+
+    def ready(self):
+        """Run detectors in processes that serve the API"""
+        # Keep the nearby lots index in step with lot changes
+        from .utils.geo import connect_signals
+        connect_signals()
+
+        if not settings.PARKING_DETECTORS_AUTOSTART or not self._serves_api():
+            return
+
+        # Wait for the first request, so a server master preloading the app
+        # never runs detectors, only the workers it forks and that serve
+        request_started.connect(self._start_detectors, dispatch_uid="parking_detectors_autostart")
+
+    def _start_detectors(self, **kwargs):
+        with self.start_lock:
+            if ParkingDetectionConfig.started:
+                return
+            ParkingDetectionConfig.started = True
+        request_started.disconnect(dispatch_uid="parking_detectors_autostart")
+
+        # Imported here so migrate, test and shell never load the detectors
+        from .utils.detector_manager import DetectorManager
+        from .utils.leases import LeaseCoordinator
+
+        # Take part in lot assignment like any run_detectors worker
+        coordinator = LeaseCoordinator(DetectorManager())
+        threading.Thread(target=coordinator.run, daemon=True).start()
+
+    @staticmethod
+    def _serves_api():
+        """Tell web servers apart from every other process setting Django up
+
+        Only known WSGI/ASGI servers and runserver qualify. Management
+        commands, test runners, task queues and scripts never run detectors.
+        """
+        path = sys.argv[0] if sys.argv else ""
+        script = os.path.basename(path)
+        if script == "__main__.py":
+            # python -m <package>
+            script = os.path.basename(os.path.dirname(path))
+        script = os.path.splitext(script)[0]
+
+        if script in SERVER_SCRIPTS:
+            return True
+        if script not in MANAGEMENT_SCRIPTS or len(sys.argv) < 2 or sys.argv[1] not in DETECTOR_COMMANDS:
+            return False
+
+        # The autoreloader parent only watches files, the child serves requests
+        return "--noreload" in sys.argv or os.environ.get("RUN_MAIN") == "true"
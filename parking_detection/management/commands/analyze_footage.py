@@ -0,0 +1,187 @@
+import csv
+import datetime
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from parking_detection.models import Camera, ParkingLot, ParkingStatus
+from parking_detection.utils.batch_analysis import (
+    SEGMENT_SECONDS,
+    WARMUP_SECONDS,
+    analyze_video,
+)
+from parking_detection.utils.coordinates import CoordinatesError, load_coordinates
+from parking_detection.utils.motion_detector import MotionDetector
+from shared.statuses import ParkingStatus as ParkingStatusEnum
+
+
+class Command(BaseCommand):
+    help = (
+        "Analyse recorded footage offline in parallel segments and write the "
+        "per-space occupancy transitions to a file or the status history"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("video", help="Recorded video file")
+        parser.add_argument("--lot", help="Parking lot whose coordinates and classifier to use")
+        parser.add_argument("--camera", help="Camera of the lot the footage comes from")
+        parser.add_argument("--coordinates", help="Coordinates YAML, instead of the lot's")
+        parser.add_argument(
+            "--classifier", choices=[name for name, _ in ParkingLot.CLASSIFIER_CHOICES],
+            help="Classifier, defaults to the lot's or laplacian"
+        )
+        parser.add_argument("--model", help="Registered model for the model classifiers")
+        parser.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count")
+        parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+        parser.add_argument("--warmup-seconds", type=float, default=WARMUP_SECONDS)
+        parser.add_argument("--stride", type=int, default=MotionDetector.FRAME_STRIDE,
+                            help="Analyse every n-th frame")
+        parser.add_argument("--output", help="Write the transitions to a .csv or .jsonl file")
+        parser.add_argument("--history", action="store_true",
+                            help="Store a status row of the lot at every transition")
+        parser.add_argument("--started-at",
+                            help="Wall-clock time of the first frame, defaults to the file's "
+                                 "modification time minus its length")
+
+    def handle(self, *args, **options):
+        lot, camera = self._lot(options)
+        coordinates_path = options["coordinates"] or (camera or lot).data_path
+        if not coordinates_path or not os.path.exists(coordinates_path):
+            raise CommandError("Pass --coordinates or a lot with a coordinates file")
+        if not os.path.exists(options["video"]):
+            raise CommandError(f"Video {options['video']} does not exist")
+        if options["history"] and lot.pk is None:
+            raise CommandError("--history needs --lot")
+        if options["warmup_seconds"] <= MotionDetector.DETECT_DELAY:
+            raise CommandError(f"The warm-up must be longer than {MotionDetector.DETECT_DELAY}s")
+
+        try:
+            coordinates = load_coordinates(coordinates_path)
+        except CoordinatesError as e:
+            raise CommandError(f"Invalid coordinates: {e}")
+
+        segments_done = []
+
+        def on_segment(result):
+            segments_done.append(result)
+            self.stdout.write(
+                f"Segment {result.index} from {result.start_time:.0f}s: "
+                f"{result.frames} frames, {len(result.transitions)} transitions"
+            )
+
+        started = time.perf_counter()
+        try:
+            transitions, duration = analyze_video(
+                options["video"], coordinates, lot, camera,
+                workers=options["workers"],
+                segment_seconds=options["segment_seconds"],
+                warmup_seconds=options["warmup_seconds"],
+                stride=max(1, options["stride"]),
+                on_segment=on_segment,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        started_at = self._started_at(options, duration)
+        if options["output"]:
+            self._write(options["output"], transitions, started_at)
+        if options["history"]:
+            rows = self._save_history(lot, coordinates, transitions, started_at)
+            self.stdout.write(f"Stored {rows} status rows for {lot.name}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {duration:.0f}s of footage in {elapsed:.1f}s "
+            f"({duration / max(elapsed, 1e-6):.0f}x real time), "
+            f"{sum(result.frames for result in segments_done)} frames, "
+            f"{len(transitions)} transitions"
+        ))
+
+    @staticmethod
+    def _lot(options):
+        """Lot and camera configuring the analysis, an unsaved lot without --lot"""
+        if not options["lot"]:
+            return ParkingLot(
+                classifier=options["classifier"] or "laplacian", model_name=options["model"] or ""
+            ), None
+
+        try:
+            lot = ParkingLot.objects.get(id=options["lot"])
+            camera = lot.cameras.get(id=options["camera"]) if options["camera"] else None
+        except (ParkingLot.DoesNotExist, Camera.DoesNotExist, ValueError):
+            raise CommandError("Parking lot or camera not found")
+
+        if options["classifier"]:
+            lot.classifier = options["classifier"]
+        if options["model"]:
+            lot.model_name = options["model"]
+        return lot, camera
+
+    @staticmethod
+    def _started_at(options, duration):
+        if options["started_at"]:
+            started_at = parse_datetime(options["started_at"])
+            if started_at is None:
+                raise CommandError(f"Could not parse {options['started_at']} as a date and time")
+            if timezone.is_naive(started_at):
+                started_at = timezone.make_aware(started_at)
+            return started_at
+
+        modified = os.path.getmtime(options["video"])
+        return datetime.datetime.fromtimestamp(modified - duration, tz=datetime.UTC)
+
+    @staticmethod
+    def _write(path, transitions, started_at):
+        """Transitions as CSV or JSON lines, by the file's extension"""
+        rows = [
+            {
+                "seconds": round(seconds, 3),
+                "time": (started_at + datetime.timedelta(seconds=seconds)).isoformat(),
+                "space": space_id,
+                "status": status,
+            }
+            for seconds, space_id, status in transitions
+        ]
+        with open(path, "w", newline="") as file:
+            if path.endswith(".jsonl"):
+                file.writelines(json.dumps(row) + "\n" for row in rows)
+            else:
+                writer = csv.DictWriter(file, fieldnames=["seconds", "time", "space", "status"])
+                writer.writeheader()
+                writer.writerows(rows)
+
+    @staticmethod
+    def _save_history(lot, coordinates, transitions, started_at):
+        """One status row per moment a space changed, timestamped in the footage's time"""
+        current = {space["id"]: ParkingStatusEnum.NOT_DETERMINED.value for space in coordinates}
+        rows = []
+        for index, (seconds, space_id, status) in enumerate(transitions):
+            current[space_id] = status
+            # Spaces changing on the same frame share a row
+            if index + 1 < len(transitions) and transitions[index + 1][0] == seconds:
+                continue
+
+            values = list(current.values())
+            free = values.count(ParkingStatusEnum.FREE.value)
+            occupied = values.count(ParkingStatusEnum.OCCUPIED.value)
+            row = ParkingStatus(
+                parking_lot=lot,
+                total_spaces=len(values),
+                free_spaces=free,
+                occupied_spaces=occupied,
+                unknown_spaces=len(values) - free - occupied,
+                raw_statuses=[{"id": space_id, "status": value} for space_id, value in current.items()],
+            )
+            row.footage_time = started_at + datetime.timedelta(seconds=seconds)
+            rows.append(row)
+
+        created = ParkingStatus.objects.bulk_create(rows, batch_size=500)
+        # The timestamp is set on creation, backdate it to the footage
+        for row in created:
+            row.timestamp = row.footage_time
+        ParkingStatus.objects.bulk_update(created, ["timestamp"], batch_size=500)
+        return len(created)
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.models import ParkingLot
+from parking_detection.utils.calibration import sample_space_crops
+from parking_detection.utils.classifiers import VEHICLE_CLASSES
+from parking_detection.utils.coordinates import CoordinatesError, load_coordinates
+from parking_detection.utils.model_registry import ModelRegistry
+
+
+class Command(BaseCommand):
+    help = "Compare speed and vehicle-detection agreement of registered models"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models", nargs="+", help="Registered models, the first is the reference"
+        )
+        parser.add_argument("--lot", required=True, help="Lot whose footage is used")
+        parser.add_argument("--frames", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            lot = ParkingLot.objects.get(id=options["lot"])
+        except ParkingLot.DoesNotExist:
+            raise CommandError(f"Parking lot {options['lot']} not found")
+
+        try:
+            coordinates_data = load_coordinates(lot.data_path)
+        except CoordinatesError as e:
+            raise CommandError(f"Invalid coordinates of {lot.name}: {e}")
+        crops = list(sample_space_crops(lot, coordinates_data, options["frames"]))
+        if not crops:
+            raise CommandError("No frames could be read from the lot's video")
+
+        registry = ModelRegistry()
+        reference = None
+        self.stdout.write(f"{'model':<32}{'ms/space':>10}{'spaces/s':>10}{'agreement':>11}")
+
+        for name in options["models"]:
+            model = registry.get(name)
+            found = []
+            start = time.perf_counter()
+            for crop in crops:
+                result = model(crop, verbose=False)[0]
+                found.append(
+                    any(int(c) in VEHICLE_CLASSES for c in result.boxes.cls)
+                )
+            elapsed = time.perf_counter() - start
+
+            if reference is None:
+                reference = found
+            agreement = sum(a == b for a, b in zip(found, reference)) / len(found)
+
+            self.stdout.write(
+                f"{name:<32}{elapsed / len(crops) * 1000:>10.2f}"
+                f"{len(crops) / elapsed:>10.1f}{agreement:>10.1%}"
+            )
@@ -0,0 +1,192 @@
+import collections
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import cv2 as open_cv
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.utils.classifiers import (
+    HybridClassifier,
+    LaplacianClassifier,
+    TiledClassifier,
+)
+from parking_detection.utils.coordinates import load_coordinates
+from parking_detection.utils.motion_detector import MotionDetector
+from parking_detection.utils.synthetic import write_synthetic_lot
+from shared.statuses import ParkingStatus
+
+CLASSIFIERS = {
+    LaplacianClassifier.name: LaplacianClassifier,
+    HybridClassifier.name: HybridClassifier,
+    TiledClassifier.name: TiledClassifier,
+}
+STAGES = ("decode", "preprocess", "laplacian", "inference", "debounce")
+FPS = 25
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the detector on synthetic lots of several sizes and resolutions, "
+        "optionally against a stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spaces", type=int, nargs="+", default=[12, 48, 120])
+        parser.add_argument(
+            "--resolutions", nargs="+", default=["640x360", "1280x720", "1920x1080"]
+        )
+        parser.add_argument("--frames", type=int, default=250)
+        parser.add_argument("--classifier", choices=sorted(CLASSIFIERS), default="laplacian")
+        parser.add_argument("--model", help="Registered model for the model classifiers")
+        parser.add_argument("--workdir", help="Keep the generated footage here")
+        parser.add_argument("--memory-frames", type=int, default=25)
+        parser.add_argument("--baseline", help="Fail on regressions against this baseline JSON")
+        parser.add_argument("--save-baseline", help="Write the results as a baseline JSON")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.15, help="Allowed relative slowdown"
+        )
+
+    def handle(self, *args, **options):
+        sizes = [self._resolution(value) for value in options["resolutions"]]
+        with tempfile.TemporaryDirectory() as temporary:
+            results = self._benchmark(options["workdir"] or temporary, sizes, options)
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as file:
+                json.dump({"machine": platform.platform(), "cases": results}, file, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["tolerance"])
+
+    def _benchmark(self, workdir, sizes, options):
+        """Generate and analyse every lot size at every resolution"""
+        results = {}
+        self.stdout.write(
+            f"{'case':<28}{'fps':>9}"
+            + "".join(f"{stage + ' ms':>14}" for stage in STAGES)
+            + f"{'peak KiB':>10}{'accuracy':>10}"
+        )
+        for width, height in sizes:
+            for spaces in options["spaces"]:
+                case = f"{options['classifier']}/{spaces}@{width}x{height}"
+                paths = write_synthetic_lot(workdir, spaces, width, height, options["frames"], FPS)
+                result = self._run(*paths, options)
+                results[case] = result
+
+                self.stdout.write(
+                    f"{case:<28}{result['fps']:>9.1f}"
+                    + "".join(f"{result['stages_ms'].get(stage, 0.0):>14.3f}" for stage in STAGES)
+                    + f"{result['peak_kib']:>10.0f}{result['accuracy']:>10.1%}"
+                )
+        return results
+
+    @staticmethod
+    def _resolution(value):
+        try:
+            width, height = (int(part) for part in value.lower().split("x"))
+        except ValueError:
+            raise CommandError(f"Resolutions look like 1280x720, not {value}")
+        return width, height
+
+    def _run(self, video_path, coordinates_path, truth_path, options):
+        """Analyse every frame synchronously, timing each stage"""
+        coordinates = load_coordinates(coordinates_path)
+        truth = np.load(truth_path)
+
+        classifier_class = CLASSIFIERS[options["classifier"]]
+        classifier = (
+            classifier_class() if classifier_class is LaplacianClassifier
+            else classifier_class(options["model"])
+        )
+        detector = MotionDetector(video_path, coordinates, 0, classifier=classifier)
+
+        timings = collections.defaultdict(list)
+
+        def observe(stage, seconds):
+            timings[stage].append(seconds)
+
+        classifier.observe = observe
+
+        capture = open_cv.VideoCapture(video_path)
+        result, frame = capture.read()
+        if not result:
+            raise CommandError(f"Could not read the generated video {video_path}")
+        # Set the detector up and load its model outside the measurement
+        detector.analyze_frame(frame, 0.0)
+        timings.clear()
+
+        settled = int((MotionDetector.DETECT_DELAY + 0.5) * FPS)
+        correct = scored = analysed = 0
+        started = time.perf_counter()
+        for index in range(1, len(truth)):
+            decode_started = time.perf_counter()
+            result, frame = capture.read()
+            if not result:
+                break
+            observe("decode", time.perf_counter() - decode_started)
+
+            statuses = detector.analyze_frame(frame, index / FPS, observe)
+            analysed += 1
+            if index >= settled:
+                occupied = np.array([status == ParkingStatus.OCCUPIED for status in statuses])
+                correct += int(np.count_nonzero(occupied == truth[index]))
+                scored += len(statuses)
+        elapsed = time.perf_counter() - started
+        capture.release()
+
+        return {
+            "fps": analysed / elapsed if elapsed else 0.0,
+            "stages_ms": {stage: float(np.mean(values)) * 1000 for stage, values in timings.items()},
+            "peak_kib": self._peak_memory(detector, video_path, options["memory_frames"]) / 1024,
+            "accuracy": correct / scored if scored else 0.0,
+        }
+
+    @staticmethod
+    def _peak_memory(detector, video_path, frames):
+        """Peak traced allocations while analysing, in a separate pass as tracing is slow"""
+        capture = open_cv.VideoCapture(video_path)
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            for index in range(frames):
+                result, frame = capture.read()
+                if not result:
+                    break
+                detector.analyze_frame(frame, index / FPS)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            capture.release()
+        return max(peak - baseline, 0)
+
+    def _compare(self, results, baseline_path, tolerance):
+        """Fail when a case got slower, heavier or less accurate than the baseline"""
+        with open(baseline_path) as file:
+            baseline = json.load(file)["cases"]
+
+        regressions = []
+        for case, result in results.items():
+            reference = baseline.get(case)
+            if reference is None:
+                self.stdout.write(f"{case}: not in the baseline")
+                continue
+
+            if result["fps"] < reference["fps"] * (1 - tolerance):
+                regressions.append(f"{case}: {result['fps']:.1f} fps, was {reference['fps']:.1f}")
+            if result["peak_kib"] > reference["peak_kib"] * (1 + tolerance) + 256:
+                regressions.append(
+                    f"{case}: {result['peak_kib']:.0f} KiB peak, was {reference['peak_kib']:.0f}"
+                )
+            if result["accuracy"] < reference["accuracy"] - 0.01:
+                regressions.append(
+                    f"{case}: {result['accuracy']:.1%} accurate, was {reference['accuracy']:.1%}"
+                )
+
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.models import OccupancyProfile, ParkingLot
+from parking_detection.utils.forecast import update_profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the time-of-week occupancy profiles the forecasts use with the "
+        "statuses stored since the last update"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lot", help="Only this parking lot")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Drop the profiles and read the whole history again")
+
+    def handle(self, *args, **options):
+        lots = ParkingLot.objects.all()
+        if options["lot"]:
+            lots = lots.filter(id=options["lot"])
+            if not lots.exists():
+                raise CommandError(f"Parking lot {options['lot']} not found")
+        if options["rebuild"]:
+            OccupancyProfile.objects.filter(parking_lot__in=lots).delete()
+
+        for lot in lots:
+            started = time.perf_counter()
+            added = update_profile(lot.id)
+            self.stdout.write(
+                f"{lot.name}: {added} statuses added in {time.perf_counter() - started:.2f}s"
+            )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.models import ParkingLot
+from parking_detection.utils.calibration import sample_space_crops
+from parking_detection.utils.coordinates import CoordinatesError, load_coordinates
+from parking_detection.utils.model_registry import (
+    EXPORT_FORMATS,
+    ModelRegistry,
+    ModelRegistryError,
+)
+
+
+class Command(BaseCommand):
+    help = "Export a registered model to ONNX or OpenVINO, optionally INT8-quantized"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Registered PyTorch model to export")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="onnx")
+        parser.add_argument(
+            "--int8", action="store_true", help="Quantize to INT8 after export"
+        )
+        parser.add_argument(
+            "--calibration-lot",
+            action="append",
+            default=[],
+            help="Lot whose footage calibrates the INT8 model, can be repeated",
+        )
+        parser.add_argument(
+            "--frames", type=int, default=50, help="Frames sampled per calibration lot"
+        )
+
+    def handle(self, *args, **options):
+        crops = None
+        if options["int8"]:
+            if not options["calibration_lot"]:
+                raise CommandError("--int8 needs at least one --calibration-lot")
+            crops = list(self._calibration_crops(options["calibration_lot"], options["frames"]))
+            self.stdout.write(f"Calibrating on {len(crops)} space crops")
+
+        try:
+            entry = ModelRegistry().export(
+                options["name"], options["format"], options["int8"], crops
+            )
+        except ModelRegistryError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Registered {entry['file']} ({entry['backend']})")
+
+    @staticmethod
+    def _calibration_crops(lot_ids, frames):
+        for lot_id in lot_ids:
+            try:
+                lot = ParkingLot.objects.get(id=lot_id)
+            except ParkingLot.DoesNotExist:
+                raise CommandError(f"Parking lot {lot_id} not found")
+
+            try:
+                coordinates_data = load_coordinates(lot.data_path)
+            except CoordinatesError as e:
+                raise CommandError(f"Invalid coordinates of {lot.name}: {e}")
+
+            yield from sample_space_crops(lot, coordinates_data, frames)
@@ -0,0 +1,136 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from parking_detection.models import ParkingLot, ParkingStatus
+from parking_detection.utils.load_test import (
+    DEFAULT_MIX,
+    ClientSession,
+    HttpSession,
+    parse_mix,
+    run_load,
+    summarize,
+)
+from shared.statuses import ParkingStatus as ParkingStatusEnum
+
+SEED_NAME = "Load test lot"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the parking API with concurrent clients, through the Django "
+        "test client on a seeded test database or against a running server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--lots", type=int, default=50, help="Lots to seed")
+        parser.add_argument("--statuses", type=int, default=20, help="Status rows to seed per lot")
+        parser.add_argument("--spaces", type=int, default=60, help="Spaces per seeded lot")
+        parser.add_argument(
+            "--seed", action="store_true",
+            help="With --url, seed the server's database, removed again afterwards"
+        )
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--duration", type=float, help="Seconds to run instead of --requests")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["url"]:
+            summary = self._against_server(options, mix)
+        else:
+            summary = self._against_test_client(options, mix)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self._report(summary)
+
+    def _against_server(self, options, mix):
+        seeded = self._seed(options) if options["seed"] else []
+        try:
+            lot_ids = seeded or [
+                str(i) for i in ParkingLot.objects.filter(is_active=True).values_list("id", flat=True)
+            ]
+            if not lot_ids and "lot" in mix:
+                raise CommandError("No active lots for the lot endpoint, pass --seed")
+            return self._drive(lambda: HttpSession(options["url"]), lot_ids, mix, options)
+        finally:
+            ParkingLot.objects.filter(id__in=seeded).delete()
+
+    def _against_test_client(self, options, mix):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            lot_ids = self._seed(options)
+            return self._drive(ClientSession, lot_ids, mix, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _drive(self, session_factory, lot_ids, mix, options):
+        results, elapsed = run_load(
+            session_factory, lot_ids, mix, options["concurrency"],
+            requests=None if options["duration"] else options["requests"],
+            duration=options["duration"],
+        )
+        summary = summarize(results, elapsed)
+        total = sum(endpoint["requests"] for endpoint in summary.values())
+        summary["total"] = {"requests": total, "throughput": total / elapsed, "seconds": elapsed}
+        return summary
+
+    def _seed(self, options):
+        """Create lots with a status history, returns their IDs"""
+        rng = random.Random(0)
+        lots = ParkingLot.objects.bulk_create(
+            ParkingLot(name=f"{SEED_NAME} {index}") for index in range(options["lots"])
+        )
+        statuses = list(ParkingStatusEnum)
+        rows = []
+        for lot in lots:
+            for _ in range(options["statuses"]):
+                raw = [
+                    {"id": space, "status": rng.choice(statuses).value}
+                    for space in range(options["spaces"])
+                ]
+                free = sum(1 for space in raw if space["status"] == ParkingStatusEnum.FREE.value)
+                occupied = sum(1 for space in raw if space["status"] == ParkingStatusEnum.OCCUPIED.value)
+                rows.append(ParkingStatus(
+                    parking_lot=lot,
+                    total_spaces=len(raw),
+                    free_spaces=free,
+                    occupied_spaces=occupied,
+                    unknown_spaces=len(raw) - free - occupied,
+                    raw_statuses=raw,
+                ))
+        ParkingStatus.objects.bulk_create(rows, batch_size=500)
+        self.stdout.write(f"Seeded {len(lots)} lots with {len(rows)} status rows")
+        return [str(lot.id) for lot in lots]
+
+    def _report(self, summary):
+        total = summary.pop("total")
+        self.stdout.write(
+            f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        )
+        for name, endpoint in summary.items():
+            queries = f"{endpoint['queries']:.1f}" if endpoint["queries"] is not None else "n/a"
+            self.stdout.write(
+                f"{name:<14}{endpoint['requests']:>9}{endpoint['errors']:>8}"
+                f"{endpoint['throughput']:>9.1f}{endpoint['p50_ms']:>9.1f}"
+                f"{endpoint['p95_ms']:>9.1f}{endpoint['p99_ms']:>9.1f}{queries:>9}"
+            )
+        self.stdout.write(
+            f"{total['requests']} requests in {total['seconds']:.1f}s, "
+            f"{total['throughput']:.1f} req/s"
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.models import ParkingLot, ProfileCapture
+from parking_detection.utils.profiler import (
+    MAX_SECONDS,
+    request_capture,
+    wait_for_capture,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sample the detector threads of a running parking lot, wherever its "
+        "worker runs, and write collapsed stacks for flamegraph tools"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("lot", help="Parking lot to profile")
+        parser.add_argument("--seconds", type=int, default=10, help=f"At most {MAX_SECONDS}")
+        parser.add_argument("--output", help="File to write, defaults to profile-<lot>.folded")
+
+    def handle(self, *args, **options):
+        try:
+            lot = ParkingLot.objects.get(id=options["lot"])
+        except ParkingLot.DoesNotExist:
+            raise CommandError(f"Parking lot {options['lot']} not found")
+
+        self.stdout.write(f"Profiling {lot.name} for {options['seconds']}s")
+        capture = wait_for_capture(request_capture(lot, options["seconds"]))
+        if capture.status != ProfileCapture.DONE:
+            raise CommandError(capture.stacks or "Profile capture failed")
+
+        output = options["output"] or f"profile-{lot.id}.folded"
+        with open(output, "w") as file:
+            file.write(capture.stacks)
+        self.stdout.write(f"Wrote {len(capture.stacks.splitlines())} stacks to {output}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from parking_detection.utils.model_registry import ModelRegistry
+
+
+class Command(BaseCommand):
+    help = "Copy model weights into the local registry and record their checksum"
+
+    def add_arguments(self, parser):
+        parser.add_argument("weights", help="Path to the weights file")
+        parser.add_argument("--name", required=True, help="Name lots refer to")
+        # Not --version, BaseCommand already uses it for Django's version
+        parser.add_argument("--model-version", required=True, help="Version of the weights")
+
+    def handle(self, *args, **options):
+        registry = ModelRegistry()
+        entry = registry.register(options["weights"], options["name"], options["model_version"])
+        self.stdout.write(
+            f"Registered {options['name']} {entry['version']} as {registry.directory / entry['file']}"
+        )
@@ -0,0 +1,53 @@
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from parking_detection.utils import frame_server
+from parking_detection.utils.detector_manager import DetectorManager
+from parking_detection.utils.leases import LeaseCoordinator
+
+
+class Command(BaseCommand):
+    help = (
+        "Run detectors in the foreground as a worker, sharing the active "
+        "parking lots with the other workers through database leases"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", help="Worker name, unique across workers")
+        parser.add_argument(
+            "--lease-ttl", type=float, help="Seconds before the leases of a dead worker expire"
+        )
+        parser.add_argument(
+            "--http-port", "--metrics-port", dest="http_port", type=int,
+            help="Serve /metrics and the snapshots and streams of this worker's lots on this port",
+        )
+        parser.add_argument(
+            "--http-address",
+            help="Address the --http-port server listens on, PARKING_WORKER_HTTP_ADDRESS by default",
+        )
+        parser.add_argument(
+            "--advertise-url",
+            help="URL the web tier reaches the --http-port server at, http://<host>:<port> by default",
+        )
+
+    def handle(self, *args, **options):
+        url = ""
+        if options["http_port"]:
+            address = options["http_address"] or settings.PARKING_WORKER_HTTP_ADDRESS
+            frame_server.serve(options["http_port"], address)
+            # A server on every interface is reached by the host's name
+            host = socket.getfqdn() if address in ("", "0.0.0.0", "::") else address
+            if ":" in host:
+                host = f"[{host}]"
+            url = options["advertise_url"] or f"http://{host}:{options['http_port']}"
+            self.stdout.write(f"Serving metrics and frames on {url}")
+
+        coordinator = LeaseCoordinator(DetectorManager(), options["name"], options["lease_ttl"], url)
+        self.stdout.write(f"Running detector worker {coordinator.name}, press Ctrl+C to stop")
+
+        try:
+            coordinator.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from parking_detection.models import Camera, ParkingLot
+from parking_detection.utils.calibration import sample_frames
+from parking_detection.utils.classifiers import (
+    HybridClassifier,
+    PatchClassifier,
+    patch_weights_path,
+    train_logistic,
+)
+from parking_detection.utils.coordinates import CoordinatesError, load_coordinates
+from parking_detection.utils.motion_detector import MotionDetector
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a lot's patch classifier on spaces where the Laplacian and the "
+        "vehicle detector of the hybrid mode agree"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("lot", help="Parking lot to train for")
+        parser.add_argument("--camera", help="Train for one of the lot's cameras instead")
+        parser.add_argument("--frames", type=int, default=200)
+        parser.add_argument("--epochs", type=int, default=500)
+        parser.add_argument(
+            "--holdout", type=float, default=0.2, help="Share of samples kept for validation"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            lot = ParkingLot.objects.get(id=options["lot"])
+        except ParkingLot.DoesNotExist:
+            raise CommandError(f"Parking lot {options['lot']} not found")
+
+        # A camera brings its own source and coordinates, the lot's are used otherwise
+        source = lot
+        if options["camera"]:
+            try:
+                source = lot.cameras.get(id=options["camera"])
+            except Camera.DoesNotExist:
+                raise CommandError(f"Camera {options['camera']} not found in {lot.name}")
+        path = patch_weights_path(lot.id, source.id if source is not lot else None)
+
+        try:
+            coordinates_data = load_coordinates(source.data_path)
+        except CoordinatesError as e:
+            raise CommandError(f"Invalid coordinates: {e}")
+
+        hybrid = HybridClassifier(lot.model_name or None)
+        patch = PatchClassifier(path)
+        detector = MotionDetector(
+            source.video_path, coordinates_data, source.start_frame, classifier=hybrid
+        )
+        detector._initialize_detection()
+        patch.prepare(detector.geometry)
+        hybrid.load()
+
+        features, labels = self._bootstrap(source, detector.geometry, hybrid, patch, options["frames"])
+        if len(set(labels)) < 2:
+            raise CommandError("Need agreed samples of both free and occupied spaces")
+
+        rng = np.random.default_rng(0)
+        order = rng.permutation(len(labels))
+        split = int(len(order) * (1 - options["holdout"]))
+        train, holdout = order[:split], order[split:]
+
+        weights, bias = train_logistic(features[train], labels[train], options["epochs"])
+
+        if len(holdout):
+            predictions = (features[holdout] @ weights + bias) > 0
+            accuracy = np.mean(predictions == labels[holdout].astype(bool))
+            self.stdout.write(f"Holdout accuracy: {accuracy:.1%} on {len(holdout)} samples")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, weights=weights, bias=np.float32(bias))
+        self.stdout.write(
+            f"Saved patch classifier for {lot.name} to {path}, "
+            f"set the lot's classifier to '{PatchClassifier.name}' to use it"
+        )
+
+    def _bootstrap(self, source, geometry, hybrid, patch, frames):
+        """Label patches where both hybrid signals agree, skip the rest"""
+        features, labels = [], []
+        for frame in sample_frames(source.video_path, frames, source.start_frame):
+            grayed = MotionDetector.preprocess(frame)
+            frame_features = patch.features(grayed)
+
+            for index in range(len(geometry)):
+                clear = hybrid.is_clear(grayed, index)
+                if clear == hybrid.vehicle_found(frame, index):
+                    continue
+                features.append(frame_features[index].copy())
+                labels.append(0 if clear else 1)
+
+        self.stdout.write(f"Bootstrapped {len(labels)} labelled spaces")
+        return np.array(features, dtype=np.float32), np.array(labels)
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglot',
+            name='model_name',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-18 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0003_parkinglot_classifier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglot',
+            name='max_staleness',
+            field=models.FloatField(default=5.0, help_text='Seconds between analyses at most'),
+        ),
+        migrations.AddField(
+            model_name='parkinglot',
+            name='priority',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
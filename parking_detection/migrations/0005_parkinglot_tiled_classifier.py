@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0004_parkinglot_schedule'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parkinglot',
+            name='classifier',
+            field=models.CharField(choices=[('hybrid', 'Laplacian + vehicle detector'), ('tiled', 'Laplacian + tiled vehicle detector'), ('laplacian', 'Laplacian only'), ('patch', 'Per-space patch model')], default='hybrid', max_length=16),
+        ),
+    ]
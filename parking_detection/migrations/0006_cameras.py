@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:01
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0005_parkinglot_tiled_classifier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglot',
+            name='fusion',
+            field=models.CharField(choices=[('best_view', 'Camera with the best view'), ('majority', 'Majority of cameras'), ('confidence', 'Confidence-weighted vote')], default='best_view', help_text='How spaces seen by several cameras get one status', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='Camera',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(default='Unnamed Camera', max_length=255)),
+                ('video_path', models.CharField(max_length=255)),
+                ('data_path', models.CharField(max_length=255)),
+                ('start_frame', models.IntegerField(default=1)),
+                ('weight', models.FloatField(default=1.0, help_text="How much this camera's view is trusted")),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cameras', to='parking_detection.parkinglot')),
+            ],
+            options={
+                'verbose_name': 'Camera',
+                'verbose_name_plural': 'Cameras',
+            },
+        ),
+    ]
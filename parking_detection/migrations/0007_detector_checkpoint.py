@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0006_cameras'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectorCheckpoint',
+            fields=[
+                ('key', models.UUIDField(help_text='Camera, or parking lot without cameras', primary_key=True, serialize=False)),
+                ('statuses', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='parking_detection.parkinglot')),
+            ],
+            options={
+                'verbose_name': 'Detector Checkpoint',
+                'verbose_name_plural': 'Detector Checkpoints',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0007_detector_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectorLease',
+            fields=[
+                ('parking_lot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lease', serialize=False, to='parking_detection.parkinglot')),
+                ('owner', models.CharField(max_length=255)),
+                ('acquired_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('health', models.JSONField(blank=True, default=dict, help_text='Detector health by camera')),
+            ],
+            options={
+                'verbose_name': 'Detector Lease',
+                'verbose_name_plural': 'Detector Leases',
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectorWorker',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('heartbeat_at', models.DateTimeField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Detector Worker',
+                'verbose_name_plural': 'Detector Workers',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0008_detector_leases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.PositiveIntegerField(default=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('stacks', models.TextField(blank=True, default='', help_text='Collapsed stacks, or the error')),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profiles', to='parking_detection.parkinglot')),
+            ],
+            options={
+                'verbose_name': 'Profile Capture',
+                'verbose_name_plural': 'Profile Captures',
+                'ordering': ['-requested_at'],
+            },
+        ),
+    ]
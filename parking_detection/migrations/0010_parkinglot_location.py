@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0009_profile_capture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglot',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='WGS 84 degrees', null=True),
+        ),
+        migrations.AddField(
+            model_name='parkinglot',
+            name='longitude',
+            field=models.FloatField(blank=True, help_text='WGS 84 degrees', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='parkingstatus',
+            index=models.Index(fields=['parking_lot', '-timestamp'], name='status_lot_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0010_parkinglot_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyProfile',
+            fields=[
+                ('parking_lot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy_profile', serialize=False, to='parking_detection.parkinglot')),
+                ('bucket_minutes', models.PositiveIntegerField(default=15)),
+                ('sums', models.BinaryField(help_text='Sum of the free share of the statuses in each bucket')),
+                ('counts', models.BinaryField(help_text='Statuses in each bucket')),
+                ('last_status_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Occupancy Profile',
+                'verbose_name_plural': 'Occupancy Profiles',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0011_occupancy_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpaceDwellStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('space_id', models.IntegerField()),
+                ('occupied', models.BooleanField(help_text='Last determined status, unknown when null', null=True)),
+                ('occupied_since', models.DateTimeField(blank=True, null=True)),
+                ('arrivals', models.PositiveIntegerField(default=0)),
+                ('sessions', models.PositiveIntegerField(default=0, help_text='Stays with a known arrival and departure')),
+                ('dwell_sum', models.FloatField(default=0.0)),
+                ('dwell_sum_squares', models.FloatField(default=0.0)),
+                ('dwell_histogram', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='space_stats', to='parking_detection.parkinglot')),
+            ],
+            options={
+                'verbose_name': 'Space Dwell Stats',
+                'verbose_name_plural': 'Space Dwell Stats',
+                'constraints': [models.UniqueConstraint(fields=('parking_lot', 'space_id'), name='unique_lot_space_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking_detection', '0012_space_dwell_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectorworker',
+            name='url',
+            field=models.CharField(blank=True, help_text="Base URL serving the worker's frames, empty without one", max_length=255),
+        ),
+    ]
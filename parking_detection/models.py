@@ -4,12 +4,34 @@ import uuid
 
 class ParkingLot(models.Model):
     """Model representing a parking lot"""
+    CLASSIFIER_CHOICES = [
+        ("hybrid", "Laplacian + vehicle detector"),
+        ("tiled", "Laplacian + tiled vehicle detector"),
+        ("laplacian", "Laplacian only"),
+        ("patch", "Per-space patch model"),
+    ]
+    FUSION_CHOICES = [
+        ("best_view", "Camera with the best view"),
+        ("majority", "Majority of cameras"),
+        ("confidence", "Confidence-weighted vote"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, default="Unnamed Parking Lot")
     image_path = models.CharField(max_length=255, null=True, blank=True)
     video_path = models.CharField(max_length=255, null=True, blank=True)
     data_path = models.CharField(max_length=255, null=True, blank=True)
     start_frame = models.IntegerField(default=1)
+    model_name = models.CharField(max_length=64, blank=True, default="")
+    classifier = models.CharField(max_length=16, choices=CLASSIFIER_CHOICES, default="hybrid")
+    priority = models.PositiveIntegerField(default=1)
+    max_staleness = models.FloatField(default=5.0, help_text="Seconds between analyses at most")
+    fusion = models.CharField(
+        max_length=16, choices=FUSION_CHOICES, default="best_view",
+        help_text="How spaces seen by several cameras get one status"
+    )
+    latitude = models.FloatField(null=True, blank=True, help_text="WGS 84 degrees")
+    longitude = models.FloatField(null=True, blank=True, help_text="WGS 84 degrees")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -22,6 +44,30 @@ class ParkingLot(models.Model):
         verbose_name_plural = "Parking Lots"
 
 
+class Camera(models.Model):
+    """Model representing one camera covering part of a parking lot
+
+    Space IDs in the coordinates are global to the lot, a space covered by
+    several cameras has the same ID in each of their coordinates files.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='cameras')
+    name = models.CharField(max_length=255, default="Unnamed Camera")
+    video_path = models.CharField(max_length=255)
+    data_path = models.CharField(max_length=255)
+    start_frame = models.IntegerField(default=1)
+    weight = models.FloatField(default=1.0, help_text="How much this camera's view is trusted")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.parking_lot.name} / {self.name}"
+
+    class Meta:
+        verbose_name = "Camera"
+        verbose_name_plural = "Cameras"
+
+
 class ParkingStatus(models.Model):
     """Model representing the current status of a parking lot"""
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='statuses')
@@ -39,4 +85,136 @@ class ParkingStatus(models.Model):
         verbose_name = "Parking Status"
         verbose_name_plural = "Parking Statuses"
         ordering = ['-timestamp']
-        get_latest_by = "timestamp"
\ No newline at end of file
+        get_latest_by = "timestamp"
+        indexes = [
+            # Latest status of a lot
+            models.Index(fields=['parking_lot', '-timestamp'], name='status_lot_latest_idx'),
+        ]
+
+
+class DetectorCheckpoint(models.Model):
+    """Model holding the last debounced statuses of a detector, to resume from"""
+    key = models.UUIDField(primary_key=True, help_text="Camera, or parking lot without cameras")
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='checkpoints')
+    statuses = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.key}"
+
+    class Meta:
+        verbose_name = "Detector Checkpoint"
+        verbose_name_plural = "Detector Checkpoints"
+
+
+class DetectorWorker(models.Model):
+    """Model representing a process running detectors, alive while it beats"""
+    name = models.CharField(max_length=255, primary_key=True)
+    heartbeat_at = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    url = models.CharField(
+        max_length=255, blank=True, help_text="Base URL serving the worker's frames, empty without one"
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Detector Worker"
+        verbose_name_plural = "Detector Workers"
+
+
+class DetectorLease(models.Model):
+    """Model granting one worker the right to run a lot's detectors until it expires"""
+    parking_lot = models.OneToOneField(
+        ParkingLot, on_delete=models.CASCADE, primary_key=True, related_name='lease'
+    )
+    owner = models.CharField(max_length=255)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    health = models.JSONField(default=dict, blank=True, help_text="Detector health by camera")
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.owner}"
+
+    class Meta:
+        verbose_name = "Detector Lease"
+        verbose_name_plural = "Detector Leases"
+
+
+class ProfileCapture(models.Model):
+    """Model representing an on-demand profile of a lot's detectors"""
+    PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='profiles')
+    seconds = models.PositiveIntegerField(default=10)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    stacks = models.TextField(blank=True, default="", help_text="Collapsed stacks, or the error")
+    requested_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.requested_at} ({self.status})"
+
+    class Meta:
+        verbose_name = "Profile Capture"
+        verbose_name_plural = "Profile Captures"
+        ordering = ['-requested_at']
+
+
+class OccupancyProfile(models.Model):
+    """Model holding a lot's typical free share by time of week, to forecast from
+
+    `sums` and `counts` are packed float64 and uint32 arrays with one entry
+    per time-of-week bucket, updated from the statuses after `last_status_id`.
+    """
+    parking_lot = models.OneToOneField(
+        ParkingLot, on_delete=models.CASCADE, primary_key=True, related_name='occupancy_profile'
+    )
+    bucket_minutes = models.PositiveIntegerField(default=15)
+    sums = models.BinaryField(help_text="Sum of the free share of the statuses in each bucket")
+    counts = models.BinaryField(help_text="Statuses in each bucket")
+    last_status_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.updated_at}"
+
+    class Meta:
+        verbose_name = "Occupancy Profile"
+        verbose_name_plural = "Occupancy Profiles"
+
+
+class SpaceDwellStats(models.Model):
+    """Model holding the running dwell and turnover aggregates of one parking space
+
+    Dwell times are the seconds from a vehicle's arrival to its departure,
+    `dwell_histogram` counts them per bucket of utils/analytics.py.
+    """
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='space_stats')
+    space_id = models.IntegerField()
+    occupied = models.BooleanField(null=True, help_text="Last determined status, unknown when null")
+    occupied_since = models.DateTimeField(null=True, blank=True)
+    arrivals = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0, help_text="Stays with a known arrival and departure")
+    dwell_sum = models.FloatField(default=0.0)
+    dwell_sum_squares = models.FloatField(default=0.0)
+    dwell_histogram = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - space {self.space_id}"
+
+    class Meta:
+        verbose_name = "Space Dwell Stats"
+        verbose_name_plural = "Space Dwell Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['parking_lot', 'space_id'], name='unique_lot_space_stats'),
+        ]
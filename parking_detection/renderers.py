@@ -0,0 +1,48 @@
+import re
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .utils.status_feed import StatusFeed
+
+# Where orjson's bytes would differ from DRF's, which escapes the U+2028 and
+# U+2029 line separators and writes one-digit exponents as e-07
+DRF_ONLY = re.compile(rb"\xe2\x80[\xa8\xa9]|\de-\d(?!\d)")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON encoded with orjson, byte for byte what DRF's renderer writes
+
+    The bytes are DRF's: indented (browsable or ?indent) responses, and
+    the rare ones orjson would write differently, go through DRF's encoder,
+    as do values orjson does not know about.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        rendered = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+        if DRF_ONLY.search(rendered):
+            return super().render(data, accepted_media_type, renderer_context)
+        return rendered
+
+
+class StatusFeedRenderer(BaseRenderer):
+    """The binary status feed documented in utils/status_feed.py"""
+
+    media_type = "application/x-parking-status"
+    format = "bin"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, StatusFeed):
+            return data.encode()
+        # Errors have no binary form, they stay readable
+        return JSONRenderer().render(data)
@@ -1,3 +1,1536 @@
-from django.test import TestCase
+import datetime
+import importlib.util
+import io
+import itertools
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import cv2 as open_cv
+import numpy as np
+import yaml
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from shared.statuses import ParkingStatus
+
+from .apps import ParkingDetectionConfig
+from .models import (
+    Camera,
+    DetectorLease,
+    DetectorWorker,
+    ParkingLot,
+    ProfileCapture,
+)
+from .models import ParkingStatus as ParkingStatusRow
+from .renderers import FastJSONRenderer
+from .utils import frame_server
+from .utils.analytics import DWELL_BUCKETS, LotAnalytics, SpaceStats
+from .utils.batch_analysis import analyze_video, plan_segments
+from .utils.calibration import (
+    LETTERBOX_FILL,
+    CalibrationReader,
+    letterbox,
+    sample_frames,
+    space_crops,
+    write_calibration_dataset,
+)
+from .utils.classifiers import (
+    PATCH_SIZE,
+    HybridClassifier,
+    LaplacianClassifier,
+    PatchClassifier,
+    TiledClassifier,
+    build_classifier,
+    patch_maps,
+    patch_weights_path,
+    train_logistic,
+)
+from .utils.coordinates import (
+    CoordinatesError,
+    format_coordinates,
+    load_coordinates,
+    load_geometry,
+    parse_coordinates,
+    validate_spaces,
+)
+from .utils.detector_manager import DetectorManager
+from .utils.forecast import forecast, update_profile
+from .utils.frame_ring import SharedFrameRing
+from .utils.fusion import BEST_VIEW, CONFIDENCE, MAJORITY, CameraView, fuse
+from .utils.geo import LotIndex, distance
+from .utils.geometry import SpaceGeometry
+from .utils.leases import LeaseCoordinator
+from .utils.load_test import ClientSession, parse_mix, run_load, summarize
+from .utils.metrics import NULL_CHILD, Counter, Histogram, MetricsRegistry
+from .utils.model_registry import (
+    WARMUP_BATCH,
+    WARMUP_SIZE,
+    ModelRegistry,
+    ModelRegistryError,
+    exported_input_shape,
+    file_checksum,
+    inference_device,
+    limit_threads,
+    warmup_shape,
+)
+from .utils.motion_detector import MotionDetector
+from .utils.pipeline import drain, get_next, put_latest
+from .utils.profiler import folded, refresh_capture, request_capture, sample_stacks
+from .utils.scheduler import AnalysisScheduler
+from .utils.snapshots import SNAPSHOTS, SnapshotCache, latest_frame, snap_width
+from .utils.space_detection import detect_spaces
+from .utils.status_feed import read_varint
+from .utils.streams import BOUNDARY, LiveStream, StreamHub
+from .utils.supervisor import (
+    FAILED,
+    RUNNING,
+    DetectorSupervisor,
+    from_checkpoint,
+    to_checkpoint,
+)
+from .utils.synthetic import background, lot_layout, write_synthetic_lot
+from .utils.tiling import assign_to_spaces, merge_detections, plan_tiles
+
+
+class StartupTests(SimpleTestCase):
+    """Keep the web tier cheap to boot"""
+
+    IMPORT_BUDGET = 1.0  # seconds
+    HEAVY_MODULES = ("torch", "ultralytics")
+
+    def test_url_loading_skips_ml_stack(self):
+        script = (
+            "import json, sys, time\n"
+            "start = time.perf_counter()\n"
+            "import django\n"
+            "django.setup()\n"
+            "import server.urls\n"
+            "elapsed = time.perf_counter() - start\n"
+            "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))\n"
+        )
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "server.settings",
+            "PARKING_DETECTORS_AUTOSTART": "false",
+        }
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        report = json.loads(result.stdout)
+
+        for module in self.HEAVY_MODULES:
+            self.assertNotIn(module, report["modules"])
+        self.assertLess(report["elapsed"], self.IMPORT_BUDGET)
+
+    def test_only_web_servers_run_detectors(self):
+        serving = {
+            ("/venv/bin/gunicorn", "server.wsgi"): True,
+            ("/venv/lib/python3.13/site-packages/uvicorn/__main__.py", "server.asgi:application"): True,
+            ("manage.py", "runserver", "--noreload"): True,
+            ("manage.py", "runserver"): False,
+            ("manage.py", "migrate"): False,
+            ("/venv/bin/pytest",): False,
+            ("/venv/bin/celery", "-A", "server", "worker"): False,
+            ("scripts/report.py",): False,
+        }
+        for argv, expected in serving.items():
+            with self.subTest(argv=argv), mock.patch.object(sys, "argv", list(argv)), \
+                    mock.patch.dict(os.environ, {"RUN_MAIN": ""}):
+                self.assertIs(ParkingDetectionConfig._serves_api(), expected)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.weights = os.path.join(self.directory, "weights.pt")
+        with open(self.weights, "wb") as file:
+            file.write(b"weights")
+        settings_override = override_settings(PARKING_MODELS_DIR=os.path.join(self.directory, "models"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.registry = ModelRegistry()
+        self.addCleanup(self.registry.models.pop, "test-model", None)
+
+    def test_command_records_the_weights_in_the_manifest(self):
+        output = io.StringIO()
+        call_command("register_model", self.weights, name="test-model", model_version="3", stdout=output)
+        self.assertIn("Registered test-model 3", output.getvalue())
+
+        entry = ModelRegistry().manifest()["test-model"]
+        self.assertEqual((entry["version"], entry["backend"]), ("3", "torch"))
+        self.assertEqual(entry["sha256"], file_checksum(self.weights))
+        self.assertEqual(entry["file"], "test-model-3.pt")
+
+    def test_checksum_mismatch_is_rejected(self):
+        entry = self.registry.register(self.weights, "test-model", "1")
+        with open(self.registry.directory / entry["file"], "ab") as file:
+            file.write(b" tampered")
+
+        with self.assertRaisesRegex(ModelRegistryError, "Checksum mismatch"):
+            self.registry.get("test-model")
+        self.assertNotIn("test-model", self.registry.models)
+
+    def test_models_load_once_per_process(self):
+        self.registry.register(self.weights, "test-model", "1")
+        with mock.patch.object(ModelRegistry, "_load", side_effect=lambda name: object()) as load:
+            threads = [threading.Thread(target=self.registry.get, args=("test-model",)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertIs(self.registry.get("test-model"), ModelRegistry().get("test-model"))
+        load.assert_called_once_with("test-model")
+
+    def test_exports_are_checked_before_anything_loads(self):
+        self.registry.register(self.weights, "test-model", "1")
+        with self.assertRaisesRegex(ModelRegistryError, "Unsupported export format"):
+            self.registry.export("test-model", "tflite")
+        with self.assertRaisesRegex(ModelRegistryError, "calibration crops"):
+            self.registry.export("test-model", "onnx", int8=True)
+
+        # Exports are registered with their runtime, OpenVINO's as a directory
+        export = os.path.join(self.directory, "export")
+        os.makedirs(export)
+        with open(os.path.join(export, "model.xml"), "w") as file:
+            file.write("<net/>")
+        entry = self.registry.register(export, "test-model-openvino", "1", backend="openvino")
+        self.addCleanup(self.registry.models.pop, "test-model-openvino", None)
+        self.assertEqual((entry["file"], entry["backend"]), ("test-model-openvino-1_openvino_model", "openvino"))
+        with self.assertRaisesRegex(ModelRegistryError, "not a registered PyTorch model"):
+            self.registry.export("test-model-openvino", "onnx")
+
+    def test_backend_selection(self):
+        with mock.patch.dict(os.environ, {"PYTORCH_DEVICE": ""}):
+            self.assertEqual(inference_device("onnx", True), "cpu")
+            self.assertEqual(inference_device("openvino", True), "cpu")
+            self.assertEqual(inference_device("torch", True), "cuda")
+            self.assertEqual(inference_device("torch", False), "cpu")
+        with mock.patch.dict(os.environ, {"PYTORCH_DEVICE": "mps"}):
+            self.assertEqual(inference_device("torch", False), "mps")
+
+        with mock.patch.dict(os.environ):
+            os.environ.pop("OMP_NUM_THREADS", None)
+            limit_threads(0)
+            self.assertNotIn("OMP_NUM_THREADS", os.environ)
+            limit_threads(2)
+            self.assertEqual(os.environ["OMP_NUM_THREADS"], "2")
+            limit_threads(4)
+            self.assertEqual(os.environ["OMP_NUM_THREADS"], "2")
+
+    def test_warm_up_fits_static_exports(self):
+        self.assertEqual(warmup_shape(None), (WARMUP_BATCH, WARMUP_SIZE))
+        self.assertEqual(warmup_shape([None, 3, None, None]), (WARMUP_BATCH, WARMUP_SIZE))
+        self.assertEqual(warmup_shape([1, 3, 320, 320]), (1, 320))
+        self.assertEqual(warmup_shape([None, 3, 480, 480]), (WARMUP_BATCH, 480))
+
+    @unittest.skipUnless(
+        all(importlib.util.find_spec(module) for module in ("onnx", "onnxruntime", "openvino")),
+        "needs the cpu-runtimes extra",
+    )
+    def test_exports_are_warmed_up_at_their_input_shape(self):
+        import onnx
+        import openvino
+
+        for input_shape, expected in [([1, 3, 320, 320], (1, 320)), (["batch", 3, 480, 480], (WARMUP_BATCH, 480))]:
+            with self.subTest(input_shape=input_shape):
+                graph = onnx.helper.make_graph(
+                    [onnx.helper.make_node("Identity", ["images"], ["output0"])],
+                    "export",
+                    [onnx.helper.make_tensor_value_info("images", onnx.TensorProto.FLOAT, input_shape)],
+                    [onnx.helper.make_tensor_value_info("output0", onnx.TensorProto.FLOAT, input_shape)],
+                )
+                path = os.path.join(self.directory, "model.onnx")
+                onnx.save(onnx.helper.make_model(
+                    graph, opset_imports=[onnx.helper.make_opsetid("", 17)], ir_version=8
+                ), path)
+                shape = exported_input_shape(path, "onnx")
+                self.assertEqual(shape, [None if input_shape[0] == "batch" else 1, 3, *input_shape[2:]])
+                self.assertEqual(warmup_shape(shape), expected)
+
+                openvino_dir = os.path.join(self.directory, f"model_openvino_{input_shape[2]}")
+                os.makedirs(openvino_dir)
+                openvino.save_model(openvino.convert_model(path), os.path.join(openvino_dir, "model.xml"))
+                self.assertEqual(exported_input_shape(openvino_dir, "openvino"), shape)
+
+    def test_missing_runtime_is_a_registry_error(self):
+        with mock.patch.dict(sys.modules, {"onnxruntime": None}), \
+                self.assertRaisesRegex(ModelRegistryError, "onnxruntime is not installed"):
+            exported_input_shape(self.weights, "onnx")
+
+        self.registry.register(self.weights, "test-model", "1")
+        entry = self.registry.register(self.weights, "test-model-onnx", "1", backend="onnx")
+        self.addCleanup(self.registry.models.pop, "test-model-onnx", None)
+        self.assertEqual(entry["backend"], "onnx")
+        with mock.patch.dict(sys.modules, {"onnxruntime": None}):
+            with self.assertRaisesRegex(ModelRegistryError, "cpu-runtimes"):
+                self.registry.get("test-model-onnx")
+            with self.assertRaisesRegex(ModelRegistryError, "cpu-runtimes"):
+                self.registry.export("test-model", "onnx")
+
+
+class CalibrationTests(SimpleTestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.directory = directory
+        self.video, coordinates_path, _ = write_synthetic_lot(directory, 4, 160, 90, 40)
+        with open(coordinates_path) as file:
+            self.coordinates = yaml.safe_load(file)
+
+    def test_frames_are_sampled_evenly(self):
+        self.assertEqual(len(list(sample_frames(self.video, 5))), 5)
+        self.assertEqual(len(list(sample_frames(self.video, 100, start_frame=30))), 10)
+        self.assertEqual(list(sample_frames(self.video, 5, start_frame=40)), [])
+
+        frame = next(sample_frames(self.video, 1))
+        crops = list(space_crops(frame, self.coordinates))
+        self.assertEqual(len(crops), 4)
+        *_, w, h = open_cv.boundingRect(np.array(self.coordinates[0]["coordinates"]))
+        self.assertEqual(crops[0].shape, (h, w, 3))
+
+    def test_crops_become_model_inputs(self):
+        crop = np.full((50, 100, 3), 255, dtype=np.uint8)
+        boxed = letterbox(crop, 64)
+        self.assertEqual(boxed.shape, (64, 64, 3))
+        self.assertTrue((boxed[0] == LETTERBOX_FILL).all())
+        self.assertTrue((boxed[32] == 255).all())
+
+        reader = CalibrationReader([crop, crop], "images", 64)
+        tensor = reader.get_next()["images"]
+        self.assertEqual((tensor.shape, tensor.dtype), ((1, 3, 64, 64), np.float32))
+        self.assertLessEqual(tensor.max(), 1.0)
+        self.assertIsNotNone(reader.get_next())
+        self.assertIsNone(reader.get_next())
+
+        data, count = write_calibration_dataset([crop] * 3, os.path.join(self.directory, "calibration"), {0: "car"})
+        self.assertEqual(count, 3)
+        with open(data) as file:
+            self.assertEqual(yaml.safe_load(file)["names"], {0: "car"})
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, "calibration", "images"))), 3)
+
+
+class AnalysisSchedulerTests(SimpleTestCase):
+    def test_spare_budget_follows_churn_and_priority(self):
+        scheduler = AnalysisScheduler(budget=1.0, max_rate=100)
+        scheduler.register("busy", priority=1, max_staleness=10)
+        scheduler.register("idle", priority=1, max_staleness=10)
+        scheduler.register("important", priority=5, max_staleness=10)
+
+        for _ in range(20):
+            scheduler.finished("busy", churn=0.5, cost=0.01)
+            scheduler.finished("idle", churn=0.0, cost=0.01)
+            scheduler.finished("important", churn=0.0, cost=0.01)
+        scheduler._rebalance()
+        stats = scheduler.stats()
+
+        self.assertGreater(stats["busy"]["target_rate"], stats["important"]["target_rate"])
+        self.assertGreater(stats["important"]["target_rate"], stats["idle"]["target_rate"])
+        for schedule in stats.values():
+            self.assertGreaterEqual(schedule["target_rate"], 0.1)
+        spent = sum(s["target_rate"] * s["cost"] for s in stats.values())
+        self.assertAlmostEqual(spent, 1.0, places=3)
+
+    def test_over_budget_degrades_every_lot_evenly(self):
+        scheduler = AnalysisScheduler(budget=0.5, max_rate=100)
+        scheduler.register("a", max_staleness=1)
+        scheduler.register("b", max_staleness=1)
+        for _ in range(50):
+            scheduler.finished("a", churn=0.0, cost=0.5)
+            scheduler.finished("b", churn=0.0, cost=0.5)
+        with self.assertLogs("parking_detection.utils.scheduler", "WARNING"):
+            scheduler._rebalance()
+        stats = scheduler.stats()
+
+        self.assertAlmostEqual(stats["a"]["target_rate"], stats["b"]["target_rate"])
+        self.assertLess(stats["a"]["target_rate"], 1.0)
+
+
+class PipelineTests(SimpleTestCase):
+    class GatedClassifier(LaplacianClassifier):
+        """Classifies once `gate` is open, recording the position of every frame"""
+
+        def __init__(self):
+            super().__init__()
+            self.gate = threading.Event()
+            self.gate.set()
+            self.busy = threading.Event()
+
+        def classify(self, frame, grayed):
+            self.busy.set()
+            self.gate.wait()
+            return super().classify(frame, grayed)
+
+    def start(self, frames=300):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        video, coordinates_path, _ = write_synthetic_lot(directory, 4, 160, 90, frames)
+        with open(coordinates_path) as file:
+            coordinates = yaml.safe_load(file)
+        classifier = self.GatedClassifier()
+        detector = MotionDetector(video, coordinates, 0, classifier=classifier)
+        positions = []
+        debounce = detector._debounce
+        detector._debounce = lambda statuses, position: positions.append(position) or debounce(statuses, position)
+        detector.detect_motion_headless()
+        self.addCleanup(detector.stop_detection)
+        return detector, classifier, positions
+
+    def test_full_queue_drops_the_oldest_frame(self):
+        stage_queue, dropped = queue.Queue(2), []
+        for item in range(5):
+            put_latest(stage_queue, item, dropped.append)
+        self.assertEqual(dropped, [0, 1, 2])
+        self.assertEqual(get_next(stage_queue, lambda: True), 3)
+        drain(stage_queue, dropped.append)
+        self.assertEqual(dropped, [0, 1, 2, 4])
+        self.assertIsNone(get_next(stage_queue, lambda: False))
+
+    def test_frames_keep_their_order_and_stop_drains_the_stages(self):
+        detector, _, positions = self.start()
+        deadline = time.monotonic() + 10
+        while len(positions) < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        detector.stop_detection()
+
+        self.assertGreaterEqual(len(positions), 10)
+        self.assertEqual(positions[:10], sorted(set(positions[:10])))
+        self.assertFalse(any(thread.is_alive() for thread in detector.threads))
+        self.assertIsNone(detector.ring)
+        self.assertEqual(detector.pool.free.qsize(), detector.pool.size)
+        self.assertTrue(detector.decoded.empty() and detector.prepared.empty())
+
+    def test_ring_outlives_a_stage_still_running(self):
+        detector, classifier, _ = self.start()
+        self.assertTrue(classifier.busy.wait(10))
+        classifier.gate.clear()
+        classifier.busy.clear()
+        self.assertTrue(classifier.busy.wait(10))
+
+        with self.assertLogs("parking_detection.utils.motion_detector", "WARNING"):
+            detector.stop_detection()
+        self.assertIsNotNone(detector.ring)
+
+        classifier.gate.set()
+        for thread in detector.threads:
+            thread.join(timeout=5)
+        self.assertIsNone(detector.ring)
+        self.assertEqual(detector.failure, None)
+
+
+class SharedFrameRingTests(SimpleTestCase):
+    def test_pinned_frames_are_never_overwritten(self):
+        ring = SharedFrameRing.create((4, 4, 3), slots=3, pins=2)
+        self.addCleanup(ring.release)
+
+        index, view = ring.begin_write()
+        view[:] = 7
+        first = ring.commit(index, 0.5)
+        pin, frame, position = ring.pin(first)
+
+        for value in range(10):
+            index, view = ring.begin_write()
+            view[:] = value
+            ring.commit(index, 1.0)
+
+        self.assertTrue((frame == 7).all())
+        self.assertEqual(position, 0.5)
+        ring.unpin(pin)
+        for _ in range(3):
+            index, _ = ring.begin_write()
+            ring.commit(index, 2.0)
+        self.assertIsNone(ring.pin(first))
+
+    def test_attached_reader_sees_frames_without_copies(self):
+        ring = SharedFrameRing.create((2, 2, 3), slots=2, pins=1)
+        self.addCleanup(ring.release)
+        reader = SharedFrameRing.attach(ring.name, ring.lock)
+        self.addCleanup(reader.release)
+
+        index, view = ring.begin_write()
+        view[:] = 42
+        sequence = ring.commit(index, 0.0)
+        pin, frame, _ = reader.pin(sequence)
+
+        self.assertTrue(np.shares_memory(frame, reader.frames))
+        self.assertTrue((frame == 42).all())
+        reader.unpin(pin)
+
+    def test_rings_fit_their_shared_memory_budget(self):
+        megabytes, full_hd, uhd = 2**20, (1080, 1920, 3), (2160, 3840, 3)
+        # 1080p fits all the frames in flight, 4K as few as the stages allow
+        self.assertEqual(MotionDetector.pool_size(full_hd, 64 * megabytes), MotionDetector.POOL_SIZE)
+        self.assertEqual(MotionDetector.pool_size(full_hd, 50 * megabytes), 6)
+        self.assertEqual(MotionDetector.pool_size(uhd, 64 * megabytes), MotionDetector.MIN_POOL_SIZE)
+
+        self.enterContext(mock.patch("parking_detection.utils.frame_ring.shm_available", return_value=megabytes))
+        with self.assertRaises(OSError):
+            SharedFrameRing.create(full_hd, slots=6, pins=4)
+
+
+class SteadyStateAllocationTests(SimpleTestCase):
+    """The per-frame hot path must reuse its buffers"""
+
+    FRAMES = 200
+    ALLOWED_GROWTH = 4096  # bytes, interpreter noise
+
+    def setUp(self):
+        coordinates = [
+            {"id": i, "coordinates": [[10 + 30 * i, 10], [35 + 30 * i, 12], [36 + 30 * i, 70], [9 + 30 * i, 68]]}
+            for i in range(10)
+        ]
+        self.geometry = SpaceGeometry.from_coordinates(coordinates)
+        rng = np.random.default_rng(0)
+        self.frame = rng.integers(0, 255, (120, 320, 3), dtype=np.uint8)
+        self.blurred = np.empty_like(self.frame)
+        self.grayed = np.empty(self.frame.shape[:2], dtype=np.uint8)
+
+    def assert_no_growth(self, classifier):
+        classifier.prepare(self.geometry)
+        classifier.load()
+
+        def analyse():
+            MotionDetector.preprocess(self.frame, self.blurred, self.grayed)
+            classifier.classify(self.frame, self.grayed)
+
+        for _ in range(10):
+            analyse()
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        before = tracemalloc.take_snapshot()
+        for _ in range(self.FRAMES):
+            analyse()
+        after = tracemalloc.take_snapshot()
+
+        growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        self.assertLess(growth, self.ALLOWED_GROWTH)
+
+    def test_laplacian_classifier(self):
+        self.assert_no_growth(LaplacianClassifier())
+
+    def test_patch_classifier(self):
+        weights = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "weights.npz")
+        np.savez(weights, weights=np.ones(PATCH_SIZE * PATCH_SIZE, np.float32), bias=np.float32(0))
+        self.assert_no_growth(PatchClassifier(weights))
+
+
+class ClassifierSelectionTests(SimpleTestCase):
+    def test_each_classifier_setting(self):
+        lot = ParkingLot(model_name="yolov8s.pt")
+        expected = {
+            "hybrid": HybridClassifier,
+            "tiled": TiledClassifier,
+            "laplacian": LaplacianClassifier,
+            "patch": PatchClassifier,
+        }
+        for value, kind in expected.items():
+            lot.classifier = value
+            classifier = build_classifier(lot)
+            self.assertIs(type(classifier), kind)
+            if isinstance(classifier, HybridClassifier):
+                # The vehicle model is only loaded by the detection thread
+                self.assertEqual(classifier.model_name, "yolov8s.pt")
+                self.assertIsNone(classifier.yolo)
+
+    def test_patch_weights_per_camera(self):
+        lot = ParkingLot(classifier="patch")
+        camera = Camera(parking_lot=lot)
+
+        self.assertEqual(build_classifier(lot).weights_path, patch_weights_path(lot.id))
+        self.assertEqual(
+            build_classifier(lot, camera).weights_path, patch_weights_path(lot.id, camera.id)
+        )
+        self.assertNotEqual(patch_weights_path(lot.id), patch_weights_path(lot.id, camera.id))
+
+    def test_logistic_separates_synthetic_features(self):
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 2, 400)
+        features = rng.normal(size=(400, 8)).astype(np.float32)
+        features[:, 0] += np.where(labels, 2.0, -2.0)
+
+        weights, bias = train_logistic(features, labels)
+        accuracy = np.mean(((features @ weights + bias) > 0) == labels.astype(bool))
+        self.assertGreater(accuracy, 0.95)
+
+
+class PatchTrainingTests(TestCase):
+    def test_training_on_a_synthetic_lot(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=directory))
+        video, coordinates_path, truth_path = write_synthetic_lot(directory, 8, 320, 180, 120)
+        lot = ParkingLot.objects.create(
+            video_path=video, data_path=coordinates_path, start_frame=0, classifier="patch"
+        )
+
+        # The Laplacian stands in for the vehicle model and always agrees
+        def vehicle_found(classifier, frame, index):
+            return not classifier.is_clear(MotionDetector.preprocess(frame), index)
+
+        self.enterContext(mock.patch.object(HybridClassifier, "load"))
+        self.enterContext(
+            mock.patch.object(HybridClassifier, "vehicle_found", autospec=True, side_effect=vehicle_found)
+        )
+        output = io.StringIO()
+        call_command("train_occupancy_classifier", str(lot.id), frames=60, stdout=output)
+        self.assertIn("Holdout accuracy", output.getvalue())
+        self.assertTrue(os.path.exists(patch_weights_path(lot.id)))
+
+        with open(coordinates_path) as file:
+            coordinates = yaml.safe_load(file)
+        truth = np.load(truth_path)
+        detector = MotionDetector(video, coordinates, 0, classifier=build_classifier(lot))
+        capture = open_cv.VideoCapture(video)
+        self.addCleanup(capture.release)
+        matches = []
+        for index in range(len(truth)):
+            _, frame = capture.read()
+            statuses = detector.analyze_frame(frame, index / 25)
+            if index >= 40:
+                matches.extend(
+                    (status == ParkingStatus.OCCUPIED) == occupied
+                    for status, occupied in zip(statuses, truth[index])
+                )
+        self.assertGreater(np.mean(matches), 0.8)
+
+
+class TilingTests(SimpleTestCase):
+    def test_every_space_lies_inside_its_tile(self):
+        # Two rows of spaces across a 4K frame
+        bounds = [(100 + 150 * i, 200 + 1200 * row, 120, 220) for row in range(2) for i in range(24)]
+        tiles, assignment = plan_tiles(bounds, 640, 64)
+
+        for (x, y, w, h), tile_index in zip(bounds, assignment):
+            tx, ty, tw, th = tiles[tile_index]
+            self.assertTrue(tx <= x and ty <= y and x + w <= tx + tw and y + h <= ty + th)
+        # A tile fits four spaces of a row, no tile covers both rows
+        self.assertEqual(len(tiles), 2 * 6)
+
+    def test_oversized_space_gets_its_own_tile(self):
+        tiles, assignment = plan_tiles([(0, 0, 900, 300)], 640, 64)
+        self.assertEqual(tiles[assignment[0]][2:], (900, 900))
+
+    def test_detections_merge_and_assign(self):
+        bounds = [(0, 0, 100, 100), (200, 0, 100, 100)]
+        # The same car seen by two overlapping tiles
+        boxes = np.array([[10, 10, 90, 95], [12, 8, 92, 96]], dtype=np.float64)
+        kept = merge_detections(boxes, np.array([0.9, 0.8]), 0.25, 0.5)
+
+        self.assertEqual(list(kept), [0])
+        self.assertEqual(list(assign_to_spaces(boxes[kept], bounds, 0.4)), [True, False])
+
+
+class FusionTests(SimpleTestCase):
+    FREE, OCCUPIED, UNKNOWN = ParkingStatus.FREE, ParkingStatus.OCCUPIED, ParkingStatus.NOT_DETERMINED
+
+    def views(self):
+        # Space 2 is seen by all three cameras, closest by the first one
+        return [
+            CameraView([1, 2], [self.FREE, self.OCCUPIED], [100.0, 900.0]),
+            CameraView([2, 3], [self.FREE, self.UNKNOWN], [300.0, 500.0]),
+            CameraView([2], [self.FREE], [400.0]),
+        ]
+
+    def test_one_status_per_global_space(self):
+        fused = fuse(self.views(), BEST_VIEW)
+        self.assertEqual(list(fused), [1, 2, 3])
+        self.assertEqual(fused[2], self.OCCUPIED)
+        self.assertEqual(fused[3], self.UNKNOWN)
+
+    def test_votes_count_cameras_or_view_quality(self):
+        self.assertEqual(fuse(self.views(), MAJORITY)[2], self.FREE)
+        self.assertEqual(fuse(self.views(), CONFIDENCE)[2], self.OCCUPIED)
+
+
+class DetectorSupervisorTests(SimpleTestCase):
+    class Detector:
+        geometry = None
+        failure = None
+        heartbeat = 0.0
+
+        def is_alive(self):
+            return True
+
+    class Manager:
+        def __init__(self):
+            self.running = True
+            self.scheduler = AnalysisScheduler(1.0, 10)
+            self.origins = {"cam": ("lot", "cam")}
+            self.detectors = {"cam": DetectorSupervisorTests.Detector()}
+            self.restarted = []
+
+        def restart_camera(self, key):
+            self.restarted.append(key)
+            self.detectors[key] = DetectorSupervisorTests.Detector()
+
+    def test_crashed_detector_restarts_with_growing_backoff(self):
+        manager = self.Manager()
+        supervisor = DetectorSupervisor(manager)
+        manager.detectors["cam"].heartbeat = time.monotonic()
+        supervisor.check()
+        self.assertEqual(supervisor.health["cam"].state, RUNNING)
+
+        manager.detectors["cam"].failure = "_detection_loop: boom"
+        with self.assertLogs("parking_detection.utils.supervisor", "WARNING"):
+            supervisor.check()
+        self.assertEqual(supervisor.health["cam"].state, FAILED)
+        self.assertEqual(manager.restarted, [])
+
+        supervisor.health["cam"].next_restart = 0.0
+        supervisor.check()
+        self.assertEqual(manager.restarted, ["cam"])
+        self.assertEqual(supervisor.health["cam"].backoff, 2 * DetectorSupervisor.MIN_BACKOFF)
+
+        # The new detector never beats, so it is seen as stalled
+        with self.assertLogs("parking_detection.utils.supervisor", "WARNING") as logs:
+            supervisor.check()
+        self.assertIn("stalled", logs.output[0])
+
+    def test_restarted_detector_resumes_checkpointed_statuses(self):
+        coordinates = [
+            {"id": 7, "coordinates": [[0, 0], [20, 0], [20, 20], [0, 20]]},
+            {"id": 9, "coordinates": [[30, 0], [50, 0], [50, 20], [30, 20]]},
+        ]
+        detector = MotionDetector(None, coordinates, 1, classifier=LaplacianClassifier())
+        detector._initialize_detection()
+        detector._debounce([ParkingStatus.OCCUPIED, ParkingStatus.FREE], 0.0)
+        detector._debounce([ParkingStatus.OCCUPIED, ParkingStatus.FREE], 2.0)
+
+        stored = json.loads(json.dumps(to_checkpoint(detector.checkpoint())))
+        resumed = MotionDetector(
+            None, coordinates, 1, classifier=LaplacianClassifier(), initial_statuses=from_checkpoint(stored)
+        )
+        resumed._initialize_detection()
+        self.assertEqual(resumed.current_statuses, [ParkingStatus.OCCUPIED, ParkingStatus.FREE])
+        self.assertEqual(resumed.changed_at, detector.changed_at)
+
+
+class LeaseCoordinatorTests(TestCase):
+    class Manager:
+        def __init__(self):
+            self.running = set()
+
+        def start_detector(self, parking_lot_id):
+            self.running.add(parking_lot_id)
+
+        def stop_detector(self, parking_lot_id):
+            self.running.discard(parking_lot_id)
+
+        def restart_detector(self, parking_lot_id):
+            pass
+
+        def get_schedule(self):
+            return {}
+
+    def setUp(self):
+        self.lots = {ParkingLot.objects.create(name=f"Lot {i}").id for i in range(5)}
+        self.first = LeaseCoordinator(self.Manager(), "first", ttl=30)
+        self.second = LeaseCoordinator(self.Manager(), "second", ttl=30)
+
+    def test_workers_split_lots_and_take_over_dead_ones(self):
+        # The first worker alone claims everything, then shares with the second
+        self.first.tick()
+        self.assertEqual(self.first.manager.running, self.lots)
+        self.second.tick()
+        self.first.tick()
+        self.second.tick()
+        self.assertEqual(len(self.first.manager.running), 3)
+        self.assertEqual(len(self.second.manager.running), 2)
+        self.assertFalse(self.first.manager.running & self.second.manager.running)
+
+        # The first worker stops beating, its leases expire
+        past = timezone.now() - 2 * self.first.ttl
+        DetectorWorker.objects.filter(name="first").update(heartbeat_at=past)
+        DetectorLease.objects.filter(owner="first").update(expires_at=past)
+        self.second.tick()
+        self.assertEqual(self.second.manager.running, self.lots)
+
+        # Back from a stall, it finds its lots taken and stops them
+        self.first.tick()
+        self.assertFalse(self.first.manager.running & self.second.manager.running)
+
+    def test_deactivated_lot_is_released(self):
+        self.first.tick()
+        lot = ParkingLot.objects.get(id=next(iter(self.lots)))
+        lot.is_active = False
+        lot.save()
+        self.first.tick()
+        self.assertNotIn(lot.id, self.first.manager.running)
+        self.assertFalse(DetectorLease.objects.filter(parking_lot=lot).exists())
+
+
+class MetricsTests(SimpleTestCase):
+    def test_text_exposition_format(self):
+        registry = MetricsRegistry()
+        frames = Counter("frames_total", "Frames", ("detector", "outcome"), registry=registry)
+        stage = Histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.01, 0.1), registry=registry)
+        frames.labels('cam "a"', "read").inc(3)
+        stage.labels("decode").observe(0.005)
+        stage.labels("decode").observe(0.05)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE frames_total counter", lines)
+        self.assertIn('frames_total{detector="cam \\"a\\"",outcome="read"} 3.0', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="0.01"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="+Inf"} 2', lines)
+        self.assertIn('stage_seconds_count{stage="decode"} 2', lines)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        stage = Histogram("stage_seconds", "Stage time", ("stage",), registry=registry)
+        self.assertIs(stage.labels("decode"), NULL_CHILD)
+        stage.labels("decode").observe(1.0)
+        self.assertNotIn("stage_seconds_count", registry.render())
+
+    def test_metrics_endpoint(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("# TYPE parking_detector_stage_seconds histogram", response.content.decode())
+
+
+class ProfilerTests(SimpleTestCase):
+    def test_samples_collapse_to_folded_stacks(self):
+        stop = threading.Event()
+
+        def busy_stage():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy_stage, name="classify:lot")
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+        counts = sample_stacks([thread], 0.2, interval=0.002)
+        self.assertTrue(counts)
+        stack, count = folded(counts).splitlines()[0].rsplit(" ", 1)
+        self.assertTrue(stack.startswith("classify:lot;threading:"))
+        self.assertIn(":busy_stage:", stack)
+        self.assertGreater(int(count), 0)
+
+    def test_profile_endpoint_is_admin_only(self):
+        response = self.client.post("/api/parking/lots/00000000-0000-0000-0000-000000000000/profile/")
+        self.assertIn(response.status_code, (401, 403))
+
+
+class ProfileCaptureTests(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "password")
+        )
+        self.lot = ParkingLot.objects.create(name="Profiled")
+        now = timezone.now()
+        DetectorLease.objects.create(
+            parking_lot=self.lot, owner="worker-1", acquired_at=now,
+            expires_at=now + datetime.timedelta(seconds=30),
+        )
+
+    def test_captures_are_requested_then_polled(self):
+        started = time.monotonic()
+        response = self.client.post(f"/api/parking/lots/{self.lot.id}/profile/", {"seconds": 5})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual((response.status_code, response.json()["status"]), (202, "pending"))
+        url = response["Location"]
+        self.assertEqual(self.client.get(url).status_code, 202)
+
+        # The worker answers within a supervisor round
+        ProfileCapture.objects.filter(id=response.json()["id"]).update(
+            status=ProfileCapture.DONE, stacks="classify:lot;module:run:1 3\n"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"classify:lot;module:run:1 3\n")
+
+    def test_captures_nobody_picks_up_fail(self):
+        capture = request_capture(self.lot, 1)
+        ProfileCapture.objects.filter(id=capture.id).update(
+            requested_at=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        response = self.client.get(f"/api/parking/lots/{self.lot.id}/profile/{capture.id}/")
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("picked the capture up", response.json()["error"])
+        self.assertEqual(refresh_capture(capture).status, ProfileCapture.FAILED)
+
+
+class SyntheticLotTests(SimpleTestCase):
+    def test_detector_follows_the_ground_truth(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        video, coordinates_path, truth_path = write_synthetic_lot(directory, 8, 320, 180, 60)
+        with open(coordinates_path) as file:
+            coordinates = yaml.safe_load(file)
+        truth = np.load(truth_path)
+        self.assertEqual(truth.shape, (60, 8))
+
+        detector = MotionDetector(video, coordinates, 0, classifier=LaplacianClassifier())
+        capture = open_cv.VideoCapture(video)
+        self.addCleanup(capture.release)
+        matches = []
+        for index in range(len(truth)):
+            result, frame = capture.read()
+            self.assertTrue(result)
+            statuses = detector.analyze_frame(frame, index / 25)
+            if index >= 40:
+                matches.extend(
+                    (status == ParkingStatus.OCCUPIED) == occupied
+                    for status, occupied in zip(statuses, truth[index])
+                )
+        self.assertGreater(np.mean(matches), 0.8)
+
+
+class LoadTestTests(TransactionTestCase):
+    def test_drives_the_mix_and_counts_queries(self):
+        lots = [ParkingLot.objects.create(name=f"Lot {index}") for index in range(3)]
+        lot_ids = [str(lot.id) for lot in lots]
+
+        results, elapsed = run_load(
+            ClientSession, lot_ids, parse_mix("status=1,lot=1"), concurrency=2, requests=20
+        )
+        summary = summarize(results, elapsed)
+
+        self.assertEqual(sum(endpoint["requests"] for endpoint in summary.values()), 20)
+        self.assertEqual(set(summary), {"status", "lot"})
+        self.assertEqual(summary["status"]["errors"], 0)
+        self.assertGreater(summary["status"]["queries"], 0)
+        self.assertLessEqual(summary["status"]["p50_ms"], summary["status"]["p99_ms"])
+
+    def test_rejects_unknown_endpoints(self):
+        with self.assertRaises(ValueError):
+            parse_mix("status=1,nope=2")
+
+
+class BatchAnalysisTests(SimpleTestCase):
+    def test_segments_merge_into_the_single_pass_timeline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            video, coordinates_path, _ = write_synthetic_lot(directory, 6, 320, 180, 25 * 30, 25)
+            with open(coordinates_path) as file:
+                coordinates = yaml.safe_load(file)
+            lot = ParkingLot(classifier="laplacian")
+
+            single, duration = analyze_video(video, coordinates, lot, workers=1, segment_seconds=60)
+            segmented, _ = analyze_video(video, coordinates, lot, workers=2, segment_seconds=7)
+
+        self.assertEqual(duration, 30)
+        self.assertTrue(single)
+        self.assertEqual(segmented, single)
+
+    def test_segments_warm_up_on_the_previous_frames(self):
+        segments = plan_segments(1000, 25, segment_seconds=10, warmup_seconds=2)
+        self.assertEqual([(s.warmup, s.start, s.end) for s in segments[:2]], [(0, 0, 250), (200, 250, 500)])
+        self.assertEqual(segments[-1].end, 1000)
+
+
+class SpaceDetectionTests(SimpleTestCase):
+    def test_finds_the_painted_spaces_of_an_empty_lot(self):
+        layout = lot_layout(48, 1280, 720)
+        spaces = detect_spaces(background(layout, 1280, 720))
+
+        self.assertEqual(len(spaces), len(layout))
+        self.assertEqual([space["id"] for space in spaces], list(range(len(layout))))
+        for expected, found in zip(layout, spaces):
+            # Spaces run from line to line, a few pixels wider than the layout's
+            self.assertTrue(np.allclose(found["coordinates"], expected["coordinates"], atol=12))
+
+    def test_blank_image_has_no_spaces(self):
+        self.assertEqual(detect_spaces(np.full((360, 640, 3), 90, dtype=np.uint8)), [])
+
+    def test_spaces_stay_inside_the_image(self):
+        # Slanted stall lines running into the image borders
+        image = np.full((300, 600, 3), 70, dtype=np.uint8)
+        for x in range(-60, 640, 100):
+            open_cv.line(image, (x, 40), (x + 60, 260), (230, 230, 230), 4)
+        spaces = detect_spaces(image)
+
+        self.assertEqual(len(spaces), 5)
+        for space in spaces:
+            for x, y in space["coordinates"]:
+                self.assertTrue(0 <= x < 600 and 0 <= y < 300, space)
+
+
+class CoordinatesTests(SimpleTestCase):
+    SPACES = [
+        {"id": i, "coordinates": [[10 + 30 * i, 10], [35 + 30 * i, 12], [36 + 30 * i, 70], [9 + 30 * i, 68]]}
+        for i in range(5)
+    ]
+
+    def test_invalid_spaces_are_rejected(self):
+        square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+        for data in (
+            [],
+            {"id": 0, "coordinates": square},
+            [{"id": 0, "coordinates": square}, {"id": 0, "coordinates": square}],
+            [{"id": -1, "coordinates": square}],
+            [{"id": 0, "coordinates": [[0, 0], [10, 0], [10, 10]]}],
+            [{"id": 0, "coordinates": [[0, 0], [10, 0], [10, 10], [0, -10]]}],
+            [{"id": 0, "coordinates": [[0, 0], [10, 0], [20, 0], [30, 0]]}],
+            # Bow tie, the corners are not in order around the space
+            [{"id": 0, "coordinates": [[0, 0], [10, 10], [10, 0], [0, 10]]}],
+        ):
+            with self.subTest(data=data), self.assertRaises(CoordinatesError):
+                validate_spaces(data)
+
+    def test_yaml_and_json_parse_alike(self):
+        self.assertEqual(parse_coordinates(json.dumps(self.SPACES)), self.SPACES)
+        self.assertEqual(parse_coordinates(yaml.safe_dump(self.SPACES)), self.SPACES)
+
+    def test_compiled_geometry_is_memory_mapped_from_the_cache(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, "coordinates.yaml")
+        with open(path, "w") as file:
+            yaml.safe_dump(self.SPACES, file)
+        cache = os.path.join(directory, "cache")
+
+        compiled = load_geometry(path, cache)
+        cached = load_geometry(path, cache)
+        fresh = SpaceGeometry.from_coordinates(self.SPACES)
+
+        self.assertEqual(len(os.listdir(cache)), 1)
+        self.assertIsInstance(cached.bounds, np.memmap)
+        np.testing.assert_array_equal(cached.bounds, fresh.bounds)
+        for cached_mask, mask in zip(compiled.masks, fresh.masks):
+            np.testing.assert_array_equal(cached_mask, mask)
+
+        # Classifiers work on the read-only masks as on fresh ones
+        frame = np.random.default_rng(0).integers(0, 255, (120, 320, 3), dtype=np.uint8)
+        grayed = MotionDetector.preprocess(frame)
+        statuses = []
+        for geometry in (cached, fresh):
+            classifier = LaplacianClassifier()
+            classifier.prepare(geometry)
+            statuses.append(classifier.classify(frame, grayed))
+        self.assertEqual(statuses[0], statuses[1])
+
+    def test_patches_start_at_the_first_corner(self):
+        geometry = SpaceGeometry.from_coordinates(self.SPACES)
+        map_x, map_y = patch_maps(geometry.transforms)
+
+        self.assertEqual(map_x.shape, (len(self.SPACES) * PATCH_SIZE, PATCH_SIZE))
+        for index, space in enumerate(self.SPACES):
+            top = index * PATCH_SIZE
+            self.assertAlmostEqual(map_x[top, 0], space["coordinates"][0][0], places=3)
+            self.assertAlmostEqual(map_y[top + PATCH_SIZE - 1, PATCH_SIZE - 1], space["coordinates"][2][1], places=3)
+
+    def test_spaces_past_the_frame_edge_are_measured_inside_it(self):
+        grayed = np.random.default_rng(0).integers(0, 255, (100, 200), dtype=np.uint8)
+        edge = [[170, 20], [230, 20], [230, 80], [170, 80]]
+        classifier = LaplacianClassifier()
+        classifier.prepare(SpaceGeometry.from_coordinates([{"id": 0, "coordinates": edge}]))
+
+        # The visible part of the space, computed on its own
+        mask = np.zeros(grayed.shape, dtype=np.uint8)
+        open_cv.fillPoly(mask, [np.array(edge)], 255)
+        laplacian = np.abs(open_cv.Laplacian(grayed[20:81, 170:200], open_cv.CV_32F))
+        expected = np.mean(laplacian * (mask[20:81, 170:200] > 0))
+        for _ in range(2):
+            self.assertAlmostEqual(classifier.edges(grayed, 0), expected, places=3)
+
+        outside = [[210, 20], [260, 20], [260, 80], [210, 80]]
+        classifier.prepare(SpaceGeometry.from_coordinates([{"id": 3, "coordinates": outside}]))
+        with self.assertRaisesRegex(ValueError, "Space 3"):
+            classifier.edges(grayed, 0)
+
+
+class SpaceListViewTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(self.settings(
+            MEDIA_ROOT=self.media.name, PARKING_GEOMETRY_CACHE=os.path.join(self.media.name, "cache")
+        ))
+        self.lot = ParkingLot.objects.create(name="Lot")
+        self.url = f"/api/parking/lots/{self.lot.id}/spaces/"
+
+    def test_submitted_spaces_are_stored_and_bump_the_lot_version(self):
+        version = self.lot.updated_at
+        spaces = [{"id": 0, "coordinates": [[0, 0], [10, 0], [10, 20], [0, 20]]}]
+
+        response = self.client.put(self.url, spaces, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).json(), spaces)
+        self.lot.refresh_from_db()
+        self.assertTrue(os.path.exists(self.lot.data_path))
+        self.assertGreater(self.lot.updated_at, version)
+
+    def test_malformed_spaces_are_rejected(self):
+        response = self.client.put(
+            self.url, [{"id": 0, "coordinates": [[0, 0], [10, 0]]}], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).json(), [])
+
+    def test_submitted_spaces_are_compiled(self):
+        spaces = [{"id": 0, "coordinates": [[0, 0], [10, 0], [10, 20], [0, 20]]}]
+        self.client.put(self.url, spaces, content_type="application/json")
+        self.assertEqual(len(os.listdir(settings.PARKING_GEOMETRY_CACHE)), 1)
+
+    def test_spaces_must_fit_in_the_frames(self):
+        self.lot.image_path = os.path.join(self.media.name, "lot.png")
+        open_cv.imwrite(self.lot.image_path, np.zeros((60, 100, 3), dtype=np.uint8))
+        self.lot.save()
+
+        outside = [{"id": 4, "coordinates": [[80, 0], [100, 0], [100, 20], [80, 20]]}]
+        response = self.client.put(self.url, outside, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Space 4 has corners outside the 100x60 frame", response.json()["error"])
+        inside = [{"id": 4, "coordinates": [[79, 0], [99, 0], [99, 59], [79, 59]]}]
+        self.assertEqual(self.client.put(self.url, inside, content_type="application/json").status_code, 200)
+
+        # A new lot's or camera's spaces are checked against its video
+        directory = os.path.join(self.media.name, "synthetic")
+        video, coordinates_path, _ = write_synthetic_lot(directory, 4, 160, 90, 2)
+        spaces = load_coordinates(coordinates_path)
+        spaces[-1]["coordinates"][1][0] = 160
+        data = io.BytesIO(format_coordinates(spaces).encode())
+        data.name = "coordinates.yaml"
+        with open(video, "rb") as video_file:
+            response = self.client.post(
+                f"/api/parking/lots/{self.lot.id}/cameras/", {"video_file": video_file, "data_file": data}
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("outside the 160x90 frame", response.json()["error"])
+        self.assertFalse(self.lot.cameras.exists())
+        self.lot.refresh_from_db()
+        self.assertEqual(os.listdir(os.path.dirname(self.lot.data_path)), [os.path.basename(self.lot.data_path)])
+
+
+class SnapshotTests(TestCase):
+    SPACES = CoordinatesTests.SPACES
+
+    def setUp(self):
+        self.detector = MotionDetector(None, self.SPACES, 0, classifier=LaplacianClassifier())
+        self.frame = np.random.default_rng(0).integers(0, 255, (120, 320, 3), dtype=np.uint8)
+        self.detector.analyze_frame(self.frame, 0.0)
+
+    def test_each_frame_version_is_encoded_once(self):
+        cache = SnapshotCache()
+        first = cache.get("camera", self.detector)
+        self.assertIs(cache.get("camera", self.detector), first)
+        self.assertEqual(cache.encodes, 1)
+
+        self.detector.analyze_frame(self.frame, 0.1)
+        second = cache.get("camera", self.detector)
+        self.assertGreater(second.version, first.version)
+        self.assertEqual(cache.encodes, 2)
+
+        small = cache.get("camera", self.detector, width=160)
+        image = open_cv.imdecode(np.frombuffer(small.jpeg, np.uint8), open_cv.IMREAD_COLOR)
+        self.assertEqual(image.shape[:2], (60, 160))
+
+    def test_torn_frames_are_never_served_as_current(self):
+        cache = SnapshotCache()
+        first = cache.get("camera", self.detector)
+
+        # The detector overwrites the frame during every copy attempt
+        churning = mock.Mock(wraps=self.detector, current_frame=self.frame, current_statuses=[])
+        type(churning).frame_version = mock.PropertyMock(side_effect=itertools.count(first.version + 1))
+        self.assertIsNone(latest_frame(churning))
+        self.assertIs(cache.get("camera", churning), first)
+        self.assertEqual(cache.encodes, 1)
+
+    def test_endpoint_serves_the_detector_of_this_process(self):
+        lot = ParkingLot.objects.create(name="Lot")
+        url = f"/api/parking/lots/{lot.id}/snapshot.jpg"
+        self.assertEqual(self.client.get(url).status_code, 409)
+
+        manager = DetectorManager()
+        manager.cameras[lot.id] = [(lot.id, 1.0)]
+        manager.detectors[lot.id] = self.detector
+        self.addCleanup(manager.cameras.pop, lot.id)
+        self.addCleanup(manager.detectors.pop, lot.id)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        version = response["X-Frame-Version"]
+        self.assertEqual(self.client.get(url, {"since": version}).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.detector.analyze_frame(self.frame, 0.1)
+        self.assertEqual(self.client.get(url, {"since": version}).status_code, 200)
+
+        stream = self.client.get(f"/api/parking/lots/{lot.id}/stream.mjpg")
+        self.assertTrue(stream["Content-Type"].startswith("multipart/x-mixed-replace"))
+        self.assertIn(b"image/jpeg", next(iter(stream.streaming_content)))
+        stream.close()
+
+    @override_settings(PARKING_WORKER_SECRET="worker-secret")
+    def test_frames_of_other_workers_are_proxied(self):
+        lot = ParkingLot.objects.create(name="Lot")
+        url = f"/api/parking/lots/{lot.id}/snapshot.jpg"
+        now = timezone.now()
+        DetectorLease.objects.create(
+            parking_lot=lot, owner="worker-2", acquired_at=now, expires_at=now + datetime.timedelta(minutes=1)
+        )
+        worker = DetectorWorker.objects.create(name="worker-2", heartbeat_at=now)
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, response.json()["worker"]), (409, "worker-2"))
+
+        class OtherProcess:
+            get_detector = DetectorManager.get_detector
+
+            def __init__(self, cameras, detectors):
+                self.cameras, self.detectors = cameras, detectors
+
+        other = OtherProcess({lot.id: [(lot.id, 1.0)]}, {lot.id: self.detector})
+        server = frame_server.serve(0, manager=other)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+        worker.url = f"http://127.0.0.1:{server.server_address[1]}"
+        worker.save()
+
+        # Only the web tier, which knows the secret, gets the worker's frames
+        response = frame_server.open_upstream(worker.url, f"lots/{lot.id}/snapshot.jpg")
+        self.assertEqual(response.status, 200)
+        response.close()
+        with self.settings(PARKING_WORKER_SECRET=""):
+            response = frame_server.open_upstream(worker.url, f"lots/{lot.id}/snapshot.jpg")
+        self.assertEqual(response.status, 403)
+        response.close()
+
+        response = self.client.get(url, {"width": 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response["Content-Type"], response["X-Detector-Worker"]), ("image/jpeg", "worker-2"))
+        image = open_cv.imdecode(np.frombuffer(response.content, np.uint8), open_cv.IMREAD_COLOR)
+        self.assertEqual(image.shape[1], 160)
+        self.assertEqual(self.client.get(url, {"width": 100}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        stream = self.client.get(f"/api/parking/lots/{lot.id}/stream.mjpg")
+        self.assertTrue(stream["Content-Type"].startswith("multipart/x-mixed-replace"))
+        self.assertIn(b"image/jpeg", next(iter(stream.streaming_content)))
+        stream.close()
+
+        server.shutdown()
+        server.server_close()
+        with self.assertLogs("parking_detection.views", "WARNING"):
+            response = self.client.get(url)
+        self.assertEqual((response.status_code, response.json()["url"]), (502, worker.url))
+
+    def test_viewers_share_one_encoder(self):
+        stream = LiveStream("stream-camera", lambda: self.detector, fps=50)
+        viewers = [stream.attach() for _ in range(10)]
+        encodes = SNAPSHOTS.encodes
+
+        received = [viewer.get(timeout=2) for viewer in viewers]
+        self.assertTrue(all(snapshot is received[0] for snapshot in received))
+        self.assertEqual(SNAPSHOTS.encodes, encodes + 1)
+
+        # A viewer that does not keep up only ever holds the latest frame
+        for position in (0.1, 0.2, 0.3):
+            self.detector.analyze_frame(self.frame, position)
+            time.sleep(0.1)
+        self.assertEqual(viewers[0].get(timeout=2).version, self.detector.frame_version)
+        self.assertTrue(viewers[0].empty())
+
+        thread = stream.thread
+        for viewer in viewers:
+            stream.detach(viewer)
+        thread.join(timeout=2)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(stream.thread)
+
+    def test_streams_share_rounded_widths_and_go_with_their_last_viewer(self):
+        self.assertEqual([snap_width(w) for w in (16, 200, 1920, 4000, None)], [160, 320, 1920, None, None])
+        hub = StreamHub()
+        first, viewer = hub.attach("hub-camera", lambda: self.detector, snap_width(200))
+        second, other = hub.attach("hub-camera", lambda: self.detector, snap_width(300))
+        self.assertIs(first, second)
+
+        first.detach(viewer)
+        self.assertEqual(list(hub.streams), [("hub-camera", 320)])
+        thread = first.thread
+        first.detach(other)
+        self.assertEqual(hub.streams, {})
+        thread.join(timeout=2)
+        self.assertFalse(thread.is_alive())
+
+    def test_stream_yields_multipart_jpegs(self):
+        stream = LiveStream("stream-parts", lambda: self.detector, fps=50)
+        frames = stream.frames(stream.attach())
+        part = next(frames)
+        frames.close()
+
+        self.assertTrue(part.startswith(f"--{BOUNDARY}\r\nContent-Type: image/jpeg".encode()))
+        self.assertEqual(stream.viewers, set())
+
+
+class LotIndexTests(SimpleTestCase):
+    def test_finds_the_same_lots_as_measuring_every_one(self):
+        rng = np.random.default_rng(0)
+        lots = [
+            (index, f"Lot {index}", float(latitude), float(longitude))
+            for index, (latitude, longitude) in enumerate(
+                zip(rng.uniform(-17.5, -17.3, 3000), rng.uniform(-66.3, -66.0, 3000))
+            )
+        ]
+        index = LotIndex()
+        index.build(lots)
+        index.built_at = time.monotonic()
+
+        started = time.perf_counter()
+        found = index.near(-17.39, -66.16, 1500)
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+        expected = sorted(
+            lot_id for lot_id, _, latitude, longitude in lots
+            if distance(-17.39, -66.16, latitude, longitude) <= 1500
+        )
+        self.assertEqual(sorted(lot[1] for lot in found), expected)
+        self.assertEqual([lot[0] for lot in found], sorted(lot[0] for lot in found))
+
+    def test_search_wraps_around_the_antimeridian(self):
+        index = LotIndex()
+        index.build([(1, "East", 0.0, 179.999), (2, "West", 0.0, -179.999), (3, "Far", 0.0, 170.0)])
+        index.built_at = time.monotonic()
+        self.assertEqual({lot[1] for lot in index.near(0.0, 180.0, 1000)}, {1, 2})
+
+
+class NearbyLotsViewTests(TestCase):
+    def test_nearest_lots_with_enough_free_spaces(self):
+        near = ParkingLot.objects.create(name="Near", latitude=-17.3935, longitude=-66.1570)
+        full = ParkingLot.objects.create(name="Full", latitude=-17.3940, longitude=-66.1575)
+        ParkingLot.objects.create(name="Far", latitude=-17.5, longitude=-66.3)
+        ParkingLot.objects.create(name="Nowhere")
+        ParkingStatusRow.objects.create(parking_lot=near, total_spaces=10, free_spaces=4)
+        ParkingStatusRow.objects.create(parking_lot=full, total_spaces=10, free_spaces=0)
+
+        url = "/api/parking/nearby/"
+        response = self.client.get(url, {"lat": -17.3935, "lon": -66.1570, "radius": 1000})
+        self.assertEqual([lot["name"] for lot in response.json()], ["Near", "Full"])
+        self.assertEqual(response.json()[0]["free_spaces"], 4)
+
+        response = self.client.get(url, {"lat": -17.3935, "lon": -66.1570, "min_free": 1})
+        self.assertEqual([lot["name"] for lot in response.json()], ["Near"])
+        self.assertEqual(self.client.get(url, {"lat": 100, "lon": 0}).status_code, 400)
+
+    def test_lots_are_created_with_valid_coordinates_only(self):
+        for latitude, longitude in (("north", "-66.1570"), ("-17.3935", ""), ("91", "0"), ("0", "-181")):
+            response = self.client.post(
+                "/api/parking/lots/", {"latitude": latitude, "longitude": longitude}
+            )
+            self.assertEqual(response.status_code, 400, (latitude, longitude))
+        self.assertFalse(ParkingLot.objects.exists())
+
+
+class StatusFeedTests(TestCase):
+    def setUp(self):
+        self.lots = [ParkingLot.objects.create(name=f"Lot {index}") for index in range(10)]
+        for lot in self.lots[:9]:
+            ParkingStatusRow.objects.create(
+                parking_lot=lot, total_spaces=3, free_spaces=1, occupied_spaces=1,
+                raw_statuses=[
+                    {"id": 2, "status": "FREE"},
+                    {"id": 0, "status": "OCCUPIED"},
+                    {"id": 1, "status": "NOT_DETERMINED"},
+                ],
+            )
+
+    def test_status_queries_do_not_grow_with_lots(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/parking/status/")
+        rows = response.json()
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[0]["free_spaces"], 1)
+        self.assertEqual(rows[-1]["status"], "No status available")
+
+    def test_binary_feed_decodes_with_the_dictionary(self):
+        dictionary = self.client.get("/api/parking/status/dictionary/").json()
+        response = self.client.get("/api/parking/status/", HTTP_ACCEPT="application/x-parking-status")
+        self.assertEqual(response["Content-Type"], "application/x-parking-status")
+        data = response.content
+        self.assertEqual(data[:3], b"PS\x01")
+
+        revision, offset = read_varint(data, 3)
+        self.assertEqual(revision, dictionary["revision"])
+        count, offset = read_varint(data, offset)
+        decoded = {}
+        for _ in range(count):
+            fields = []
+            for _ in range(6):
+                value, offset = read_varint(data, offset)
+                fields.append(value)
+            index, total, free, _, _, spaces = fields
+            packed = data[offset : offset + (spaces + 3) // 4]
+            offset += len(packed)
+            codes = [(packed[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(spaces)]
+            decoded[dictionary["lots"][index]["id"]] = (total, free, codes)
+
+        self.assertEqual(offset, len(data))
+        self.assertEqual(decoded[str(self.lots[0].id)], (3, 1, [2, 0, 1]))
+        self.assertEqual(dictionary["lots"][0]["spaces"], [0, 1, 2])
+        self.assertEqual(decoded[str(self.lots[-1].id)], (0, 0, []))
+        self.assertLess(len(data), len(self.client.get("/api/parking/status/").content) / 4)
+
+    def test_json_is_byte_for_byte_drf(self):
+        moment = datetime.datetime(2026, 10, 5, 8, 30, 15, 250, tzinfo=datetime.UTC)
+        data = {
+            "utc": moment,
+            "whole": moment.replace(microsecond=0),
+            "offset": moment.astimezone(datetime.timezone(datetime.timedelta(hours=2))),
+            "naive": moment.replace(tzinfo=None),
+            "date": moment.date(),
+            "time": moment.time(),
+            "id": self.lots[0].id,
+            "price": Decimal("12.50"),
+            "floats": [0.1, -17.3935, 1e16, 1e-7],
+            "keys": {1: "a"},
+            "text": "Zone\u2028B \u00e9",
+        }
+        for value in [data, [data] * 3, {"plain": [1, 2.5, "x", None, True]}]:
+            self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value))
+
+        with mock.patch.object(JSONRenderer, "render") as fallback:
+            FastJSONRenderer().render({"utc": moment, "id": self.lots[0].id})
+        fallback.assert_not_called()
+
+
+class ForecastTests(TestCase):
+    MONDAY = datetime.datetime(2026, 10, 5, tzinfo=datetime.UTC)
+
+    def setUp(self):
+        self.lot = ParkingLot.objects.create(name="Lot")
+        # Mondays are quiet at 8:30 and busy at 9:00
+        for week in range(4):
+            day = self.MONDAY - datetime.timedelta(weeks=week + 1)
+            self.add_status(day.replace(hour=8, minute=35), 8)
+            self.add_status(day.replace(hour=9, minute=5), 2)
+
+    def add_status(self, moment, free):
+        row = ParkingStatusRow.objects.create(parking_lot=self.lot, total_spaces=10, free_spaces=free)
+        ParkingStatusRow.objects.filter(id=row.id).update(timestamp=moment)
+
+    def test_profiles_only_read_new_statuses(self):
+        self.assertEqual(update_profile(self.lot.id), 8)
+        self.assertEqual(update_profile(self.lot.id), 0)
+        self.add_status(self.MONDAY.replace(hour=9, minute=10), 2)
+        self.assertEqual(update_profile(self.lot.id), 1)
+
+    def test_forecast_blends_the_live_gap_into_the_typical_level(self):
+        update_profile(self.lot.id)
+        now = self.MONDAY.replace(hour=8, minute=35)
+        # Two fewer spaces free than usual right now
+        self.add_status(now, 6)
+        self.lot.refresh_from_db()
+
+        result = forecast(self.lot, 30, now=now)
+        self.assertEqual(result["typical_free_share"], 0.2)
+        self.assertAlmostEqual(result["free_share"], 0.2 - 0.2 * np.exp(-1), places=3)
+        self.assertEqual(result["free_spaces"], 1)
+        self.assertEqual(forecast(self.lot, 0, now=now)["free_spaces"], 6)
+
+    def test_endpoint_never_reads_the_history(self):
+        update_profile(self.lot.id)
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/parking/lots/{self.lot.id}/forecast/", {"minutes": 20})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(
+            f"/api/parking/lots/{self.lot.id}/forecast/", {"minutes": -5}
+        ).status_code, 400)
+
+
+class DwellAnalyticsTests(TestCase):
+    def setUp(self):
+        self.lot = ParkingLot.objects.create(name="Lot")
+
+    def test_transitions_measure_only_seen_stays(self):
+        stats = SpaceStats()
+        # The first status only sets the state, the arrival was not seen
+        self.assertTrue(stats.transition(ParkingStatus.OCCUPIED, 0.0))
+        self.assertTrue(stats.transition(ParkingStatus.FREE, 100.0))
+        self.assertEqual((stats.arrivals, stats.sessions), (0, 0))
+
+        stats.transition(ParkingStatus.OCCUPIED, 200.0)
+        # Repeats from another camera and undetermined statuses change nothing
+        self.assertFalse(stats.transition(ParkingStatus.OCCUPIED, 210.0))
+        self.assertFalse(stats.transition(ParkingStatus.NOT_DETERMINED, 220.0))
+        stats.transition(ParkingStatus.FREE, 1400.0)
+        self.assertEqual((stats.arrivals, stats.sessions, stats.dwell_sum), (1, 1, 1200.0))
+        self.assertEqual(stats.histogram[DWELL_BUCKETS.index(1800)], 1)
+
+    def test_flush_writes_changed_spaces_and_resumes(self):
+        analytics = LotAnalytics(self.lot.id)
+        for space_id in (1, 2):
+            analytics.record(space_id, ParkingStatus.FREE, 0.0)
+            analytics.record(space_id, ParkingStatus.OCCUPIED, 60.0)
+        self.assertEqual(analytics.flush(), 2)
+        self.assertEqual(analytics.flush(), 0)
+
+        analytics.record(1, ParkingStatus.FREE, 660.0)
+        with self.assertNumQueries(1):
+            self.assertEqual(analytics.flush(), 1)
+
+        resumed = LotAnalytics.load(self.lot.id)
+        self.assertEqual(resumed.spaces[1].dwell_sum, 600.0)
+        self.assertEqual(resumed.spaces[2].since, 60.0)
+        resumed.record(2, ParkingStatus.FREE, 960.0)
+        self.assertEqual(resumed.spaces[2].sessions, 1)
+
+    def test_cameras_feed_the_fused_status(self):
+        class Camera:
+            def __init__(self, geometry):
+                self.geometry = geometry
+                self.statuses = [ParkingStatus.FREE] * len(geometry)
+
+            def get_parking_status(self):
+                return self.statuses
+
+        geometry = SpaceGeometry.from_coordinates(CoordinatesTests.SPACES)
+        space_id = int(geometry.ids[0])
+        # The first camera sees the space best
+        close, far = Camera(geometry), Camera(geometry)
+        manager = DetectorManager()
+        manager.detectors.update({"close": close, "far": far})
+        manager.cameras[self.lot.id] = [("close", 2.0), ("far", 1.0)]
+        manager.analytics[self.lot.id] = analytics = LotAnalytics(self.lot.id)
+        for registry, key in ((manager.detectors, "close"), (manager.detectors, "far"),
+                              (manager.cameras, self.lot.id), (manager.analytics, self.lot.id)):
+            self.addCleanup(registry.pop, key, None)
+
+        def change(camera, status, at):
+            camera.statuses[0] = status
+            manager._record_transition(self.lot.id, space_id, at)
+
+        change(close, ParkingStatus.FREE, 0.0)
+        change(close, ParkingStatus.OCCUPIED, 100.0)
+        change(far, ParkingStatus.OCCUPIED, 110.0)
+        # A truck hides the space from the far camera for a while
+        change(far, ParkingStatus.FREE, 500.0)
+        change(far, ParkingStatus.OCCUPIED, 560.0)
+        change(close, ParkingStatus.FREE, 1300.0)
+
+        stats = analytics.spaces[space_id]
+        self.assertEqual((stats.arrivals, stats.sessions, stats.dwell_sum), (1, 1, 1200.0))
+
+    def test_endpoint_pools_the_spaces(self):
+        analytics = LotAnalytics(self.lot.id)
+        for space_id, dwell in ((1, 600.0), (2, 1800.0)):
+            analytics.record(space_id, ParkingStatus.FREE, 0.0)
+            analytics.record(space_id, ParkingStatus.OCCUPIED, 100.0)
+            analytics.record(space_id, ParkingStatus.FREE, 100.0 + dwell)
+        analytics.flush()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/parking/lots/{self.lot.id}/analytics/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["arrivals"], data["sessions"]), (2, 2))
+        self.assertEqual(data["mean_dwell_seconds"], 1200.0)
+        self.assertEqual(data["std_dwell_seconds"], 600.0)
+        self.assertEqual([space["mean_dwell_seconds"] for space in data["spaces"]], [600.0, 1800.0])
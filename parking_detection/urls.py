@@ -1,9 +1,40 @@
 from django.urls import path
-from .views import ParkingAvailabilityView, ParkingLotListView, ParkingLotDetailView, ParkingStatusView
+from .views import (
+    CameraListView,
+    DetectorListView,
+    ForecastView,
+    LiveStreamView,
+    LotAnalyticsView,
+    NearbyLotsView,
+    ParkingAvailabilityView,
+    ParkingLotDetailView,
+    ParkingLotListView,
+    ParkingStatusView,
+    ProfileCaptureView,
+    ProfileView,
+    SnapshotView,
+    StatusDictionaryView,
+    SpaceListView,
+)
 
 urlpatterns = [
     path('lots/', ParkingLotListView.as_view(), name='parking_lot_list'),
     path('lots/<uuid:pk>/', ParkingLotDetailView.as_view(), name='parking_lot_detail'),
+    path('lots/<uuid:pk>/cameras/', CameraListView.as_view(), name='camera_list'),
+    path('lots/<uuid:pk>/spaces/', SpaceListView.as_view(), name='space_list'),
+    path('lots/<uuid:pk>/snapshot.jpg', SnapshotView.as_view(), name='lot_snapshot'),
+    path('lots/<uuid:pk>/stream.mjpg', LiveStreamView.as_view(), name='lot_stream'),
+    path('lots/<uuid:pk>/forecast/', ForecastView.as_view(), name='lot_forecast'),
+    path('lots/<uuid:pk>/analytics/', LotAnalyticsView.as_view(), name='lot_analytics'),
+    path('lots/<uuid:pk>/profile/', ProfileView.as_view(), name='lot_profile'),
+    path(
+        'lots/<uuid:pk>/profile/<int:capture_id>/',
+        ProfileCaptureView.as_view(),
+        name='lot_profile_capture'
+    ),
     path('status/', ParkingStatusView.as_view(), name='parking_status'),
+    path('status/dictionary/', StatusDictionaryView.as_view(), name='status_dictionary'),
+    path('nearby/', NearbyLotsView.as_view(), name='nearby_lots'),
     path('availability/', ParkingAvailabilityView.as_view(), name='availability'),
+    path('detectors/', DetectorListView.as_view(), name='detector_list'),
 ]
\ No newline at end of file
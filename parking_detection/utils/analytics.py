@@ -0,0 +1,205 @@
+import bisect
+import datetime
+import math
+import threading
+
+from django.utils import timezone
+
+from shared.statuses import ParkingStatus as ParkingStatusEnum
+
+from ..models import SpaceDwellStats
+
+# Upper bounds of the dwell histogram buckets in seconds, the last bucket
+# holds everything longer: 5, 15, 30 minutes, 1, 2, 4, 8 hours
+DWELL_BUCKETS = (300, 900, 1800, 3600, 7200, 14400, 28800)
+UPDATE_FIELDS = [
+    'occupied', 'occupied_since', 'arrivals', 'sessions',
+    'dwell_sum', 'dwell_sum_squares', 'dwell_histogram', 'updated_at',
+]
+
+
+def _datetime(at):
+    return None if at is None else datetime.datetime.fromtimestamp(at, tz=datetime.UTC)
+
+
+class SpaceStats:
+    """Running dwell aggregates of one space, updated in O(1) per transition"""
+
+    __slots__ = ("arrivals", "dwell_sum", "dwell_sum_squares", "histogram", "occupied", "sessions", "since")
+
+    def __init__(self, occupied=None, since=None, arrivals=0, sessions=0,
+                 dwell_sum=0.0, dwell_sum_squares=0.0, histogram=None):
+        self.occupied = occupied
+        self.since = since  # wall-clock arrival time, None when not occupied or unknown
+        self.arrivals = arrivals
+        self.sessions = sessions
+        self.dwell_sum = dwell_sum
+        self.dwell_sum_squares = dwell_sum_squares
+        self.histogram = list(histogram or [0] * (len(DWELL_BUCKETS) + 1))
+
+    @classmethod
+    def from_model(cls, row):
+        return cls(
+            row.occupied,
+            row.occupied_since.timestamp() if row.occupied_since else None,
+            row.arrivals, row.sessions, row.dwell_sum, row.dwell_sum_squares,
+            row.dwell_histogram,
+        )
+
+    def transition(self, status, at):
+        """Apply a committed status, returns whether anything changed
+
+        Undetermined statuses and repeats of the current one are ignored.
+        A stay whose arrival was not seen is not measured.
+        """
+        if status == ParkingStatusEnum.OCCUPIED:
+            if self.occupied is True:
+                return False
+            if self.occupied is False:
+                self.arrivals += 1
+                self.since = at
+            self.occupied = True
+            return True
+
+        if status == ParkingStatusEnum.FREE:
+            if self.occupied is False:
+                return False
+            if self.occupied and self.since is not None and at >= self.since:
+                self.add_dwell(at - self.since)
+            self.occupied = False
+            self.since = None
+            return True
+
+        return False
+
+    def add_dwell(self, seconds):
+        self.sessions += 1
+        self.dwell_sum += seconds
+        self.dwell_sum_squares += seconds * seconds
+        self.histogram[bisect.bisect_left(DWELL_BUCKETS, seconds)] += 1
+
+
+class LotAnalytics:
+    """Dwell aggregates of a lot's spaces, fed with their fused statuses
+
+    The manager records a space's status fused across cameras whenever
+    one of them commits a change, under `lock` so concurrent cameras are
+    recorded in order. Transitions only touch memory, flush() writes the
+    spaces changed since the last flush in one statement. Loaded from the
+    table, so the next worker holding the lot carries on where the last
+    one stopped.
+    """
+
+    def __init__(self, parking_lot_id, spaces=None):
+        self.parking_lot_id = parking_lot_id
+        self.spaces = spaces or {}
+        self.dirty = set()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, parking_lot_id):
+        rows = SpaceDwellStats.objects.filter(parking_lot_id=parking_lot_id)
+        return cls(parking_lot_id, {row.space_id: SpaceStats.from_model(row) for row in rows})
+
+    def record(self, space_id, status, at):
+        """Apply a space's status, a no-op unless it changed"""
+        with self.lock:
+            stats = self.spaces.get(space_id)
+            if stats is None:
+                stats = self.spaces[space_id] = SpaceStats()
+            if stats.transition(status, at):
+                self.dirty.add(space_id)
+
+    def flush(self):
+        """Upsert the changed spaces, returns how many were written"""
+        with self.lock:
+            if not self.dirty:
+                return 0
+            dirty, self.dirty = self.dirty, set()
+            now = timezone.now()
+            rows = []
+            for space_id in sorted(dirty):
+                stats = self.spaces[space_id]
+                rows.append(SpaceDwellStats(
+                    parking_lot_id=self.parking_lot_id,
+                    space_id=space_id,
+                    occupied=stats.occupied,
+                    occupied_since=_datetime(stats.since),
+                    arrivals=stats.arrivals,
+                    sessions=stats.sessions,
+                    dwell_sum=stats.dwell_sum,
+                    dwell_sum_squares=stats.dwell_sum_squares,
+                    dwell_histogram=list(stats.histogram),
+                    created_at=now,
+                    updated_at=now,
+                ))
+        try:
+            SpaceDwellStats.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['parking_lot', 'space_id'],
+                update_fields=UPDATE_FIELDS,
+            )
+        except Exception:
+            # Written again on the next flush
+            with self.lock:
+                self.dirty |= dirty
+            raise
+        return len(rows)
+
+
+def _dwell_summary(sessions, dwell_sum, dwell_sum_squares):
+    if not sessions:
+        return None, None
+    mean = dwell_sum / sessions
+    return round(mean, 1), round(math.sqrt(max(0.0, dwell_sum_squares / sessions - mean * mean)), 1)
+
+
+def lot_analytics(lot, now=None):
+    """Per-space and lot-wide dwell and turnover, read from the stored aggregates
+
+    Turnover is arrivals per space and day since the space was first seen.
+    """
+    now = now or timezone.now()
+    rows = list(lot.space_stats.order_by('space_id'))
+
+    spaces = []
+    histogram = [0] * (len(DWELL_BUCKETS) + 1)
+    arrivals = sessions = 0
+    dwell_sum = dwell_sum_squares = space_days = 0.0
+    for row in rows:
+        days = max((now - row.created_at).total_seconds() / 86400, 1 / 24)
+        mean, std = _dwell_summary(row.sessions, row.dwell_sum, row.dwell_sum_squares)
+        spaces.append({
+            'id': row.space_id,
+            'occupied': row.occupied,
+            'occupied_since': row.occupied_since,
+            'arrivals': row.arrivals,
+            'sessions': row.sessions,
+            'mean_dwell_seconds': mean,
+            'std_dwell_seconds': std,
+            'dwell_histogram': row.dwell_histogram,
+            'turnover_per_day': round(row.arrivals / days, 2),
+            'updated_at': row.updated_at,
+        })
+        arrivals += row.arrivals
+        sessions += row.sessions
+        dwell_sum += row.dwell_sum
+        dwell_sum_squares += row.dwell_sum_squares
+        space_days += days
+        for index, count in enumerate(row.dwell_histogram):
+            histogram[index] += count
+
+    mean, std = _dwell_summary(sessions, dwell_sum, dwell_sum_squares)
+    return {
+        'id': str(lot.id),
+        'name': lot.name,
+        'dwell_buckets': list(DWELL_BUCKETS),
+        'arrivals': arrivals,
+        'sessions': sessions,
+        'mean_dwell_seconds': mean,
+        'std_dwell_seconds': std,
+        'dwell_histogram': histogram,
+        'turnover_per_day': round(arrivals / space_days, 2) if space_days else None,
+        'spaces': spaces,
+    }
@@ -0,0 +1,162 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as open_cv
+
+from shared.statuses import ParkingStatus
+
+from .classifiers import build_classifier
+from .motion_detector import MotionDetector
+
+SEGMENT_SECONDS = 300.0
+# Enough for the debounce to commit, the warm-up must stay above DETECT_DELAY
+WARMUP_SECONDS = 5.0
+
+
+class Segment:
+    """Frames [start, end) of a video, analysed after a warm-up from `warmup`"""
+
+    __slots__ = ("end", "index", "start", "warmup")
+
+    def __init__(self, index, warmup, start, end):
+        self.index = index
+        self.warmup = warmup
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Segment({self.index}, warmup={self.warmup}, start={self.start}, end={self.end})"
+
+
+class SegmentResult:
+    """Statuses at a segment's start and the transitions within it"""
+
+    __slots__ = ("frames", "index", "initial", "start_time", "transitions")
+
+    def __init__(self, index, start_time, initial, transitions, frames):
+        self.index = index
+        self.start_time = start_time
+        self.initial = initial  # space ID -> status value
+        self.transitions = transitions  # (seconds, space ID, status value)
+        self.frames = frames
+
+
+def plan_segments(frame_count, fps, segment_seconds=SEGMENT_SECONDS, warmup_seconds=WARMUP_SECONDS):
+    """Split a video into segments, each warming up on the frames before it"""
+    segment_frames = max(1, int(segment_seconds * fps))
+    warmup_frames = math.ceil(warmup_seconds * fps)
+    return [
+        Segment(index, max(0, start - warmup_frames), start, min(start + segment_frames, frame_count))
+        for index, start in enumerate(range(0, frame_count, segment_frames))
+    ]
+
+
+def analyze_segment(video, coordinates, lot, camera, segment, fps, stride):
+    """Analyse one segment in a worker process
+
+    The warm-up frames only run the debounce, so the spaces that kept their
+    status across the seam start the segment committed, not undetermined.
+    """
+    detector = MotionDetector(video, coordinates, 0, classifier=build_classifier(lot, camera))
+    capture = open_cv.VideoCapture(video)
+    capture.set(open_cv.CAP_PROP_POS_FRAMES, segment.warmup)
+
+    initial = None
+    previous = None
+    transitions = []
+    frames = 0
+    frame = None
+    try:
+        for index in range(segment.warmup, segment.end):
+            # Skipped frames are only grabbed, decoding is most of their cost.
+            # The stride follows the whole video, so every segment analyses the
+            # frames a single pass would have.
+            if index % stride:
+                if not capture.grab():
+                    break
+                continue
+            result, frame = capture.read(frame)
+            if not result:
+                break
+
+            position = index / fps
+            statuses = [status.value for status in detector.analyze_frame(frame, position)]
+            frames += 1
+            if index < segment.start:
+                continue
+
+            if initial is None:
+                initial = dict(zip(detector.geometry.ids.tolist(), statuses))
+                previous = statuses
+                continue
+
+            for space_id, old, new in zip(detector.geometry.ids.tolist(), previous, statuses):
+                if old != new:
+                    transitions.append((position, space_id, new))
+            previous = statuses
+    finally:
+        capture.release()
+
+    return SegmentResult(segment.index, segment.start / fps, initial or {}, transitions, frames)
+
+
+def merge_timelines(results):
+    """Transitions of the whole video, in order, from the segments' results
+
+    A space whose status at a segment's start differs from where the
+    previous segment left it changed at the seam.
+    """
+    current = {}
+    transitions = []
+    for result in sorted(results, key=lambda result: result.index):
+        for space_id, status in result.initial.items():
+            if current.get(space_id, ParkingStatus.NOT_DETERMINED.value) != status:
+                transitions.append((result.start_time, space_id, status))
+                current[space_id] = status
+        for position, space_id, status in result.transitions:
+            if current.get(space_id) != status:
+                transitions.append((position, space_id, status))
+                current[space_id] = status
+    return transitions
+
+
+def _init_worker():
+    """Keep every worker process to one OpenCV thread, the pool is the parallelism"""
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+    django.setup()
+    open_cv.setNumThreads(1)
+
+
+def analyze_video(
+    video, coordinates, lot, camera=None, workers=None, segment_seconds=SEGMENT_SECONDS,
+    warmup_seconds=WARMUP_SECONDS, stride=MotionDetector.FRAME_STRIDE, on_segment=None,
+):
+    """Analyse a recorded video in parallel segments, returns the merged transitions
+
+    `lot` (and `camera`) only configure the classifier and may be unsaved.
+    `on_segment(result)` is called for every segment, in order.
+    """
+    capture = open_cv.VideoCapture(video)
+    frame_count = int(capture.get(open_cv.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(open_cv.CAP_PROP_FPS) or MotionDetector.DEFAULT_FPS
+    capture.release()
+    if frame_count <= 0:
+        raise ValueError(f"Could not read the length of {video}")
+
+    segments = plan_segments(frame_count, fps, segment_seconds, warmup_seconds)
+    results = []
+    with ProcessPoolExecutor(workers or os.cpu_count(), initializer=_init_worker) as pool:
+        futures = [
+            pool.submit(analyze_segment, video, coordinates, lot, camera, segment, fps, stride)
+            for segment in segments
+        ]
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            if on_segment is not None:
+                on_segment(result)
+
+    return merge_timelines(results), frame_count / fps
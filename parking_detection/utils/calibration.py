@@ -0,0 +1,91 @@
+import os
+
+import cv2 as open_cv
+import numpy as np
+import yaml
+
+LETTERBOX_FILL = 114
+
+
+def sample_frames(video, count, start_frame=0):
+    """Yield `count` frames spread evenly over a video"""
+    capture = open_cv.VideoCapture(video)
+    total = int(capture.get(open_cv.CAP_PROP_FRAME_COUNT))
+    if total <= start_frame:
+        capture.release()
+        return
+
+    positions = np.linspace(start_frame, total - 1, num=min(count, total - start_frame))
+    for position in positions.astype(int):
+        capture.set(open_cv.CAP_PROP_POS_FRAMES, int(position))
+        result, frame = capture.read()
+        if result and frame is not None:
+            yield frame
+
+    capture.release()
+
+
+def space_crops(frame, coordinates_data):
+    """Crop the bounding rect of every space, as the detector feeds the model"""
+    for p in coordinates_data:
+        x, y, w, h = open_cv.boundingRect(np.array(p["coordinates"]))
+        yield frame[y : y + h, x : x + w]
+
+
+def sample_space_crops(lot, coordinates_data, frames):
+    """Space crops from frames of a lot's own footage"""
+    for frame in sample_frames(lot.video_path, frames, lot.start_frame):
+        yield from space_crops(frame, coordinates_data)
+
+
+def letterbox(image, size):
+    """Resize keeping the aspect ratio and pad to a square model input"""
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    resized = open_cv.resize(
+        image, (max(1, round(width * scale)), max(1, round(height * scale)))
+    )
+
+    boxed = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    boxed[top : top + resized.shape[0], left : left + resized.shape[1]] = resized
+    return boxed
+
+
+def write_calibration_dataset(crops, directory, names):
+    """Write crops as an ultralytics dataset, used by OpenVINO INT8 export"""
+    images = os.path.join(directory, "images")
+    os.makedirs(images, exist_ok=True)
+
+    count = 0
+    for count, crop in enumerate(crops, start=1):
+        open_cv.imwrite(os.path.join(images, f"{count:06d}.jpg"), crop)
+
+    data_path = os.path.join(directory, "data.yaml")
+    with open(data_path, "w") as file:
+        yaml.safe_dump(
+            {"path": directory, "train": "images", "val": "images", "names": names},
+            file,
+        )
+
+    return data_path, count
+
+
+class CalibrationReader:
+    """Feeds letterboxed crops to ONNX Runtime static quantization"""
+
+    def __init__(self, crops, input_name, size):
+        self.input_name = input_name
+        self.size = size
+        self.crops = iter(crops)
+
+    def get_next(self):
+        crop = next(self.crops, None)
+        if crop is None:
+            return None
+
+        # BGR HWC uint8 -> RGB CHW float in [0, 1], the layout ultralytics exports
+        image = letterbox(crop, self.size)[:, :, ::-1].transpose(2, 0, 1)
+        tensor = np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+        return {self.input_name: tensor}
@@ -0,0 +1,333 @@
+import os
+import time
+
+import cv2 as open_cv
+import numpy as np
+from django.conf import settings
+
+from shared.statuses import ParkingStatus
+
+from .model_registry import WARMUP_SIZE, ModelRegistry
+from .tiling import assign_to_spaces, clip_tiles, merge_detections, plan_tiles
+
+LAPLACIAN = 1.2
+VEHICLE_CLASSES = (2, 3, 5, 7)  # car, motorcycle, bus, truck
+PATCH_SIZE = 16
+PATCH_WEIGHTS_NAME = "patch_classifier.npz"
+
+
+class OccupancyClassifier:
+    """Decides the status of every parking space of a frame"""
+
+    name = None
+
+    def prepare(self, geometry):
+        """Precompute per-space data and buffers from the lot's geometry"""
+        self.geometry = geometry
+
+    def load(self):
+        """Load anything expensive, called from the detection thread"""
+
+    def classify(self, frame, grayed):
+        """Return one ParkingStatus per space"""
+        raise NotImplementedError
+
+    @staticmethod
+    def observe(stage, seconds):
+        """Timing of the laplacian and inference parts, hooked up by the detector"""
+
+
+class LaplacianClassifier(OccupancyClassifier):
+    """Free when the space shows few edges, no model involved"""
+
+    name = "laplacian"
+
+    def __init__(self, threshold=LAPLACIAN):
+        self.threshold = threshold
+
+    def prepare(self, geometry):
+        super().prepare(geometry)
+        self.frame_shape = None
+
+    def fit(self, frame_shape):
+        """Clip the spaces' rects to the frame, with one Laplacian buffer per space
+
+        Spaces reaching past the frame edge are measured over their visible
+        part, a space with no visible pixel is an error.
+        """
+        height, width = frame_shape[:2]
+        self.rects, self.masks, self.mask_ratios, self.laplacians = [], [], [], []
+        for space_id, (x, y, w, h), mask in zip(
+            self.geometry.ids.tolist(), self.geometry.bounds.tolist(), self.geometry.masks
+        ):
+            left, top = max(x, 0), max(y, 0)
+            right, bottom = min(x + w, width), min(y + h, height)
+            visible = mask[top - y : bottom - y, left - x : right - x]
+            if right <= left or bottom <= top or not np.any(visible):
+                raise ValueError(f"Space {space_id} lies outside the {width}x{height} frame")
+
+            self.rects.append((left, top, right - left, bottom - top))
+            self.masks.append(np.ascontiguousarray(visible))
+            self.mask_ratios.append(np.count_nonzero(visible) / visible.size)
+            self.laplacians.append(np.empty(visible.shape, dtype=np.float32))
+        self.frame_shape = (height, width)
+
+    def edges(self, grayed, index):
+        """Mean absolute Laplacian over the space's bounding rect"""
+        if grayed.shape[:2] != self.frame_shape:
+            self.fit(grayed.shape)
+        x, y, w, h = self.rects[index]
+        # Same shape as the buffer, so it is written in place
+        laplacian = open_cv.Laplacian(
+            grayed[y : y + h, x : x + w], open_cv.CV_32F, dst=self.laplacians[index]
+        )
+        np.abs(laplacian, out=laplacian)
+        # Averaged over the polygon, then scaled to the whole rect, which is
+        # what the mean of the masked Laplacian used to be
+        masked_mean = open_cv.mean(laplacian, mask=self.masks[index])[0]
+        return masked_mean * self.mask_ratios[index]
+
+    def is_clear(self, grayed, index):
+        return self.edges(grayed, index) < self.threshold
+
+    def classify(self, frame, grayed):
+        started = time.perf_counter()
+        statuses = [
+            ParkingStatus.FREE if self.is_clear(grayed, index) else ParkingStatus.OCCUPIED
+            for index in range(len(self.geometry))
+        ]
+        self.observe("laplacian", time.perf_counter() - started)
+        return statuses
+
+
+class HybridClassifier(LaplacianClassifier):
+    """Laplacian edges confirmed by a vehicle detector on every space"""
+
+    name = "hybrid"
+
+    def __init__(self, model_name=None, threshold=LAPLACIAN):
+        super().__init__(threshold)
+        self.model_name = model_name
+        self.yolo = None
+
+    def load(self):
+        if self.yolo is None:
+            self.yolo = ModelRegistry().get(self.model_name)
+
+    def vehicle_found(self, frame, index):
+        results = self.yolo(self.geometry.roi(frame, index), verbose=False)[0]
+        return any(int(cls.item()) in VEHICLE_CLASSES for cls in results.boxes.cls)
+
+    def classify(self, frame, grayed):
+        spaces = range(len(self.geometry))
+        started = time.perf_counter()
+        clear = [self.is_clear(grayed, index) for index in spaces]
+        inference_started = time.perf_counter()
+        vehicles = [self.vehicle_found(frame, index) for index in spaces]
+
+        self.observe("laplacian", inference_started - started)
+        self.observe("inference", time.perf_counter() - inference_started)
+        return [self.combine(*signals) for signals in zip(clear, vehicles)]
+
+    @staticmethod
+    def combine(clear, vehicle_found):
+        """Occupied or free when both signals agree, undetermined otherwise"""
+        if not clear and vehicle_found:
+            return ParkingStatus.OCCUPIED
+        elif not clear or vehicle_found:
+            return ParkingStatus.NOT_DETERMINED
+        return ParkingStatus.FREE
+
+
+class TiledClassifier(HybridClassifier):
+    """Hybrid mode for wide, high-resolution cameras
+
+    Instead of one inference per space, the frame is cut into overlapping
+    tiles of the model's input size, planned once so every space lies
+    fully inside a tile and as few tiles as possible are used. The tiles
+    run as one batch and their detections are merged with NMS before being
+    assigned to spaces.
+    """
+
+    name = "tiled"
+    OVERLAP = 64
+    SCORE_THRESHOLD = 0.25
+    NMS_THRESHOLD = 0.5
+    MIN_OVERLAP = 0.4
+
+    def __init__(self, model_name=None, threshold=LAPLACIAN, tile_size=WARMUP_SIZE):
+        super().__init__(model_name, threshold)
+        self.tile_size = tile_size
+        self.frame_tiles = None
+
+    def prepare(self, geometry):
+        super().prepare(geometry)
+        self.tiles, self.assignment = plan_tiles(geometry.bounds, self.tile_size, self.OVERLAP)
+        self.frame_tiles = None
+
+    def vehicles(self, frame):
+        """Spaces covered by a vehicle detected in any tile"""
+        if self.frame_tiles is None:
+            self.frame_tiles = clip_tiles(self.tiles, *frame.shape[:2])
+
+        crops = [frame[y : y + h, x : x + w] for x, y, w, h in self.frame_tiles]
+        boxes, scores = [], []
+        for (x, y, _, _), result in zip(self.frame_tiles, self.yolo(crops, verbose=False)):
+            classes = result.boxes.cls.cpu().numpy().astype(int)
+            vehicles = np.isin(classes, VEHICLE_CLASSES)
+            boxes.append(result.boxes.xyxy.cpu().numpy()[vehicles] + (x, y, x, y))
+            scores.append(result.boxes.conf.cpu().numpy()[vehicles])
+
+        boxes = np.concatenate(boxes) if boxes else np.empty((0, 4))
+        scores = np.concatenate(scores) if scores else np.empty(0)
+        kept = merge_detections(boxes, scores, self.SCORE_THRESHOLD, self.NMS_THRESHOLD)
+        return assign_to_spaces(boxes[kept], self.geometry.bounds, self.MIN_OVERLAP)
+
+    def classify(self, frame, grayed):
+        started = time.perf_counter()
+        vehicles = self.vehicles(frame)
+        laplacian_started = time.perf_counter()
+        statuses = [
+            self.combine(self.is_clear(grayed, index), bool(vehicles[index]))
+            for index in range(len(self.geometry))
+        ]
+
+        self.observe("inference", laplacian_started - started)
+        self.observe("laplacian", time.perf_counter() - laplacian_started)
+        return statuses
+
+
+class PatchClassifier(OccupancyClassifier):
+    """Logistic model over every space rectified to a small gray patch
+
+    All spaces are sampled with a single remap and scored with a single
+    matrix product, so a whole frame costs microseconds.
+    """
+
+    name = "patch"
+    UNCERTAIN = (0.35, 0.65)
+
+    def __init__(self, weights_path):
+        self.weights_path = weights_path
+        self.weights = None
+        self.bias = 0.0
+
+    def prepare(self, geometry):
+        super().prepare(geometry)
+        self.map_x, self.map_y = patch_maps(geometry.transforms)
+
+        count = len(geometry)
+        self.patches = np.empty(self.map_x.shape, dtype=np.uint8)
+        self.features_buffer = np.empty((count, PATCH_SIZE * PATCH_SIZE), dtype=np.float32)
+        self.row_stats = np.empty((count, 1), dtype=np.float32)
+        self.logits = np.empty(count, dtype=np.float32)
+
+    def load(self):
+        if self.weights is None:
+            with np.load(self.weights_path) as data:
+                self.weights = data["weights"].astype(np.float32)
+                self.bias = float(data["bias"])
+
+    def features(self, grayed):
+        """One standardized row of PATCH_SIZE**2 pixels per space
+
+        The returned array is a buffer reused by the next call.
+        """
+        open_cv.remap(grayed, self.map_x, self.map_y, open_cv.INTER_LINEAR, dst=self.patches)
+        features = self.features_buffer
+        np.copyto(features, self.patches.reshape(features.shape))
+
+        np.mean(features, axis=1, keepdims=True, out=self.row_stats)
+        features -= self.row_stats
+        np.std(features, axis=1, keepdims=True, out=self.row_stats)
+        self.row_stats += 1e-6
+        features /= self.row_stats
+        return features
+
+    def probabilities(self, grayed):
+        """Probability of each space being occupied"""
+        logits = np.dot(self.features(grayed), self.weights, out=self.logits)
+        logits += self.bias
+        np.negative(logits, out=logits)
+        np.exp(logits, out=logits)
+        logits += 1.0
+        return np.reciprocal(logits, out=logits)
+
+    def classify(self, frame, grayed):
+        low, high = self.UNCERTAIN
+        started = time.perf_counter()
+        probabilities = self.probabilities(grayed)
+        self.observe("inference", time.perf_counter() - started)
+
+        statuses = []
+        for probability in probabilities:
+            if probability >= high:
+                statuses.append(ParkingStatus.OCCUPIED)
+            elif probability <= low:
+                statuses.append(ParkingStatus.FREE)
+            else:
+                statuses.append(ParkingStatus.NOT_DETERMINED)
+        return statuses
+
+
+CLASSIFIERS = {
+    HybridClassifier.name: HybridClassifier,
+    TiledClassifier.name: TiledClassifier,
+    LaplacianClassifier.name: LaplacianClassifier,
+    PatchClassifier.name: PatchClassifier,
+}
+
+# Classifiers that run the lot's vehicle model
+MODEL_CLASSIFIERS = (HybridClassifier.name, TiledClassifier.name)
+
+
+def patch_weights_path(parking_lot_id, camera_id=None):
+    """Where the patch model trained for a lot, or one of its cameras, is stored"""
+    directory = os.path.join(settings.MEDIA_ROOT, str(parking_lot_id))
+    if camera_id is not None:
+        directory = os.path.join(directory, str(camera_id))
+    return os.path.join(directory, PATCH_WEIGHTS_NAME)
+
+
+def build_classifier(lot, camera=None):
+    """Create the classifier configured for a parking lot, per camera"""
+    if lot.classifier == PatchClassifier.name:
+        return PatchClassifier(patch_weights_path(lot.id, camera.id if camera else None))
+    if lot.classifier == LaplacianClassifier.name:
+        return LaplacianClassifier()
+    if lot.classifier == TiledClassifier.name:
+        return TiledClassifier(lot.model_name or None)
+    return HybridClassifier(lot.model_name or None)
+
+
+def patch_maps(transforms, size=PATCH_SIZE):
+    """Remap tables rectifying every quadrilateral space to a size x size patch
+
+    `transforms` map the unit square onto each space, as compiled in the
+    geometry. The patches are stacked vertically, so one remap samples all
+    spaces.
+    """
+    grid_x, grid_y = np.meshgrid(np.arange(size, dtype=np.float64), np.arange(size, dtype=np.float64))
+    unit_points = np.stack([grid_x.ravel(), grid_y.ravel()]) / (size - 1)
+    unit_points = np.vstack([unit_points, np.ones(size * size)])
+
+    # Every space's patch points at once, N x 3 x size**2
+    mapped = np.asarray(transforms, dtype=np.float64) @ unit_points
+    map_x = (mapped[:, 0] / mapped[:, 2]).astype(np.float32).reshape(-1, size)
+    map_y = (mapped[:, 1] / mapped[:, 2]).astype(np.float32).reshape(-1, size)
+    return map_x, map_y
+
+
+def train_logistic(features, labels, epochs=500, learning_rate=0.1, l2=1e-3):
+    """Fit a logistic regression with batch gradient descent"""
+    weights = np.zeros(features.shape[1], dtype=np.float32)
+    bias = 0.0
+    labels = labels.astype(np.float32)
+
+    for _ in range(epochs):
+        probabilities = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+        error = probabilities - labels
+        weights -= learning_rate * (features.T @ error / len(labels) + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+
+    return weights, bias
@@ -0,0 +1,141 @@
+import hashlib
+import os
+
+import numpy as np
+import yaml
+from django.conf import settings
+
+from .geometry import SpaceGeometry
+
+# Bumped when the compiled geometry files change, older caches are then ignored
+GEOMETRY_FORMAT = b"geometry-v1"
+CORNERS = 4
+MIN_AREA = 4.0  # square pixels
+
+
+class CoordinatesError(ValueError):
+    """Coordinates data that does not follow the schema"""
+
+
+def validate_spaces(data, size=None):
+    """Spaces in the coordinates schema, checked from parsed YAML or JSON
+
+    Each space is {"id": int, "coordinates": [[x, y], ...]} with four
+    corners, IDs are unique and corners are non-negative pixels of a simple
+    (not self-intersecting) quadrilateral with an area. Given the (width,
+    height) `size` of the frames, corners must also lie inside them. Raises
+    CoordinatesError naming the first offending space.
+    """
+    if not isinstance(data, list) or not data:
+        raise CoordinatesError("Coordinates must be a non-empty list of spaces")
+
+    spaces = []
+    seen = set()
+    for index, space in enumerate(data):
+        if not isinstance(space, dict) or "id" not in space or "coordinates" not in space:
+            raise CoordinatesError(f"Space {index} needs an id and coordinates")
+
+        space_id = space["id"]
+        if isinstance(space_id, bool) or not isinstance(space_id, int) or space_id < 0:
+            raise CoordinatesError(f"Space {index} has an invalid id {space_id!r}")
+        if space_id in seen:
+            raise CoordinatesError(f"Space id {space_id} is used twice")
+        seen.add(space_id)
+
+        corners = space["coordinates"]
+        if not isinstance(corners, list) or len(corners) != CORNERS:
+            raise CoordinatesError(f"Space {space_id} needs {CORNERS} [x, y] corners")
+        if not all(_is_point(corner) for corner in corners):
+            raise CoordinatesError(f"Space {space_id} has corners that are not [x, y] pixels")
+        corners = [[int(x), int(y)] for x, y in corners]
+        if size and any(x >= size[0] or y >= size[1] for x, y in corners):
+            raise CoordinatesError(
+                f"Space {space_id} has corners outside the {size[0]}x{size[1]} frame"
+            )
+
+        if _area(corners) < MIN_AREA:
+            raise CoordinatesError(f"Space {space_id} has no area")
+        if _self_intersecting(corners):
+            raise CoordinatesError(f"Space {space_id} crosses itself, list its corners in order")
+
+        spaces.append({"id": space_id, "coordinates": corners})
+    return spaces
+
+
+def _is_point(corner):
+    return (
+        isinstance(corner, (list, tuple))
+        and len(corner) == 2
+        and all(
+            not isinstance(value, bool) and isinstance(value, (int, float))
+            and value >= 0 and float(value).is_integer()
+            for value in corner
+        )
+    )
+
+
+def _area(corners):
+    """Shoelace area of a polygon"""
+    x, y = np.array(corners, dtype=np.float64).T
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def _self_intersecting(corners):
+    """Whether opposite edges of a quadrilateral cross"""
+    edges = [(corners[i], corners[(i + 1) % CORNERS]) for i in range(CORNERS)]
+    return _crosses(*edges[0], *edges[2]) or _crosses(*edges[1], *edges[3])
+
+
+def _crosses(a, b, c, d):
+    def side(p, q, r):
+        return np.sign((q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0]))
+
+    return side(a, b, c) * side(a, b, d) < 0 and side(c, d, a) * side(c, d, b) < 0
+
+
+def parse_coordinates(text, size=None):
+    """Validated spaces from YAML or JSON text, JSON being a subset of YAML"""
+    try:
+        data = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise CoordinatesError(f"Coordinates are not valid YAML or JSON: {e}")
+    return validate_spaces(data, size)
+
+
+def load_coordinates(path, size=None):
+    """Validated spaces of a coordinates file"""
+    with open(path, "rb") as file:
+        return parse_coordinates(file.read(), size)
+
+
+def format_coordinates(spaces):
+    """Coordinates file contents of some spaces, one space per line pair"""
+    return yaml.safe_dump(spaces, default_flow_style=None, sort_keys=False)
+
+
+def dump_coordinates(spaces, path):
+    """Write spaces as a coordinates file"""
+    with open(path, "w") as file:
+        file.write(format_coordinates(spaces))
+
+
+def geometry_cache_path(content, cache_dir=None):
+    """Where the geometry compiled from some coordinates file contents lives"""
+    key = hashlib.sha256(GEOMETRY_FORMAT + b"\0" + content).hexdigest()
+    return os.path.join(cache_dir or settings.PARKING_GEOMETRY_CACHE, key)
+
+
+def load_geometry(path, cache_dir=None):
+    """Compiled geometry of a coordinates file, memory-mapped from the cache
+
+    The cache is keyed by the hash of the file's contents, so a hit skips
+    parsing the YAML and drawing the masks altogether. A miss validates the
+    file, compiles it and stores it. Raises CoordinatesError when invalid.
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+
+    directory = geometry_cache_path(content, cache_dir)
+    if not os.path.isdir(directory):
+        SpaceGeometry.from_coordinates(parse_coordinates(content)).save(directory)
+    return SpaceGeometry.load(directory)
@@ -4,6 +4,8 @@ import numpy as np
 from shared.colors import Color
 from utils.drawing import draw_contours
 
+from .coordinates import format_coordinates, validate_spaces
+
 
 class CoordinatesGenerator:
     KEY_RESET = ord("r")
@@ -18,6 +20,7 @@ class CoordinatesGenerator:
         self.click_count = 0
         self.ids = 0
         self.coordinates = []
+        self.spaces = []
 
         open_cv.namedWindow(self.caption, open_cv.WINDOW_GUI_EXPANDED)
         open_cv.setMouseCallback(self.caption, self.__mouse_callback)
@@ -33,6 +36,9 @@ class CoordinatesGenerator:
                 break
         open_cv.destroyWindow(self.caption)
 
+        # Written once done, in the validated schema the detectors load
+        self.output.write(format_coordinates(validate_spaces(self.spaces)))
+
     def __mouse_callback(self, event, x, y, flags, params):
         if event == open_cv.EVENT_LBUTTONDOWN:
             self.coordinates.append((x, y))
@@ -62,32 +68,7 @@ class CoordinatesGenerator:
         self.click_count = 0
 
         coordinates = np.array(self.coordinates)
-
-        self.output.write(
-            "-\n          id: "
-            + str(self.ids)
-            + "\n          coordinates: ["
-            + "["
-            + str(self.coordinates[0][0])
-            + ","
-            + str(self.coordinates[0][1])
-            + "],"
-            + "["
-            + str(self.coordinates[1][0])
-            + ","
-            + str(self.coordinates[1][1])
-            + "],"
-            + "["
-            + str(self.coordinates[2][0])
-            + ","
-            + str(self.coordinates[2][1])
-            + "],"
-            + "["
-            + str(self.coordinates[3][0])
-            + ","
-            + str(self.coordinates[3][1])
-            + "]]\n"
-        )
+        self.spaces.append({"id": self.ids, "coordinates": coordinates.tolist()})
 
         draw_contours(self.image, coordinates, str(self.ids + 1), Color.WHITE)
 
@@ -2,7 +2,17 @@ import threading
 import time
 from ..models import ParkingLot, ParkingStatus
 from .motion_detector import MotionDetector
-import yaml
+from .model_registry import ModelRegistry
+from .classifiers import MODEL_CLASSIFIERS, build_classifier
+from .scheduler import AnalysisScheduler
+from .fusion import BEST_VIEW, CameraView, fuse, fuse_votes
+from .supervisor import DetectorSupervisor
+from .metrics import DB_WRITE_SECONDS, STATUS_AGE
+from .coordinates import CoordinatesError, load_geometry
+from .forecast import update_profile
+from .analytics import LotAnalytics
+from .snapshots import SNAPSHOTS
+from django.conf import settings
 import os
 from shared.statuses import ParkingStatus as ParkingStatusEnum
 import logging
@@ -18,14 +28,30 @@ class DetectorManager:
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(DetectorManager, cls).__new__(cls)
+                # Detectors by camera, and the cameras and fusion rule of each lot
                 cls._instance.detectors = {}
+                cls._instance.cameras = {}
+                cls._instance.fusion = {}
+                # Lot and camera IDs of every detector, to rebuild it on restart
+                cls._instance.origins = {}
+                # Dwell analytics of every lot, fed with the fused status of its spaces
+                cls._instance.analytics = {}
+                cls._instance.supervisor = DetectorSupervisor(cls._instance)
+                cls._instance.scheduler = AnalysisScheduler(
+                    settings.PARKING_CPU_BUDGET, settings.PARKING_MAX_ANALYSIS_RATE
+                )
                 cls._instance.status_update_thread = None
+                cls._instance.forecasts_updated_at = float("-inf")
                 cls._instance.running = False
 
         return cls._instance
 
-    def initialize(self):
-        """Initialize the detector manager"""
+    def initialize(self, start_all=True):
+        """Initialize the detector manager
+
+        With `start_all` off, detectors are only started for the lots a
+        LeaseCoordinator claims.
+        """
         if not self.running:
             self.running = True
             self.status_update_thread = threading.Thread(
@@ -33,70 +59,195 @@ class DetectorManager:
                 daemon=True
             )
             self.status_update_thread.start()
+            threading.Thread(target=self.supervisor.run, daemon=True).start()
 
             # Start detectors for all active parking lots
-            self._start_all_detectors()
+            if start_all:
+                self._start_all_detectors()
 
     def _start_all_detectors(self):
         """Start detectors for all active parking lots in the database"""
         try:
             active_lots = ParkingLot.objects.filter(is_active=True)
+
+            # Load and warm up every model in use before the first frame
+            ModelRegistry().preload(
+                lot.model_name or None
+                for lot in active_lots
+                if lot.classifier in MODEL_CLASSIFIERS
+            )
+
             for lot in active_lots:
                 self.start_detector(lot.id)
         except Exception as e:
             logger.error(f"Error starting detectors: {e}")
 
     def start_detector(self, parking_lot_id):
-        """Start a detector for a specific parking lot"""
+        """Start a detector for every camera of a specific parking lot"""
         try:
             # Don't start if already running
-            if parking_lot_id in self.detectors:
+            if parking_lot_id in self.cameras:
                 return
 
             # Get parking lot info
             lot = ParkingLot.objects.get(id=parking_lot_id)
 
-            # Check if files exist
-            if not (lot.video_path and os.path.exists(lot.video_path) and
-                    lot.data_path and os.path.exists(lot.data_path)):
-                logger.error(f"Missing files for parking lot {parking_lot_id}")
+            # Lots without cameras are watched through their own video and coordinates
+            cameras = list(lot.cameras.filter(is_active=True)) or [None]
+            self.analytics[parking_lot_id] = LotAnalytics.load(parking_lot_id)
+            sources = []
+            for camera in cameras:
+                key = (camera or lot).id
+                try:
+                    self._start_camera(lot, camera)
+                except Exception as e:
+                    # Once registered, the supervisor keeps retrying it with backoff
+                    logger.error(f"Error starting detector {key} of parking lot {parking_lot_id}: {e}")
+                if key in self.origins:
+                    sources.append((key, camera.weight if camera else 1.0))
+
+            if not sources:
+                self.analytics.pop(parking_lot_id, None)
                 return
 
-            # Load coordinates data
-            with open(lot.data_path, 'r') as file:
-                coordinates_data = yaml.safe_load(file)
+            self.fusion[parking_lot_id] = lot.fusion
+            self.cameras[parking_lot_id] = sources
+            STATUS_AGE.labels(parking_lot_id).set_function(lambda: self._status_age(parking_lot_id))
+            logger.info(f"Started {len(sources)} detector(s) for parking lot {parking_lot_id}")
 
-            # Create detector
-            detector = MotionDetector(lot.video_path, coordinates_data, lot.start_frame)
+        except Exception as e:
+            logger.error(f"Error starting detector for parking lot {parking_lot_id}: {e}")
 
-            # Store detector
-            self.detectors[parking_lot_id] = detector
+    def _start_camera(self, lot, camera, initial_statuses=None):
+        """Start the detector of one camera, returns its key or None on failure"""
+        source = camera or lot
+        key = source.id
 
-            # Start detection in headless mode
-            detector.detect_motion_headless(
-                callback=lambda statuses: self._status_callback(parking_lot_id, statuses)
-            )
+        # Check if files exist
+        if not (source.video_path and os.path.exists(source.video_path) and
+                source.data_path and os.path.exists(source.data_path)):
+            logger.error(f"Missing files for {'camera' if camera else 'parking lot'} {key}")
+            return None
 
-            logger.info(f"Started detector for parking lot {parking_lot_id}")
+        # Load the compiled geometry, memory-mapped from the cache after the first start
+        try:
+            geometry = load_geometry(source.data_path)
+        except CoordinatesError as e:
+            logger.error(f"Invalid coordinates for {'camera' if camera else 'parking lot'} {key}: {e}")
+            return None
 
-        except Exception as e:
-            logger.error(f"Error starting detector for parking lot {parking_lot_id}: {e}")
+        # Resume from the last statuses instead of starting every space undetermined
+        if initial_statuses is None:
+            initial_statuses = self.supervisor.resume(key)
+
+        # Create detector, sharing the analysis budget with the other cameras and lots
+        self.scheduler.register(key, lot.priority, lot.max_staleness)
+        detector = MotionDetector(
+            source.video_path, geometry, source.start_frame,
+            classifier=build_classifier(lot, camera),
+            scheduler=self.scheduler,
+            schedule_key=key,
+            initial_statuses=initial_statuses
+        )
+        detector.on_transition = lambda space_id, _, at: self._record_transition(lot.id, space_id, at)
+
+        # Store detector, from now on the supervisor watches it
+        self.detectors[key] = detector
+        self.origins[key] = (lot.id, camera.id if camera else None)
+
+        # Start detection in headless mode
+        detector.detect_motion_headless(
+            callback=lambda statuses: self._status_callback(lot.id, statuses)
+        )
+        return key
 
     def stop_detector(self, parking_lot_id):
-        """Stop a specific detector"""
-        if parking_lot_id in self.detectors:
+        """Stop the detectors of a specific parking lot"""
+        for key, _ in self.cameras.pop(parking_lot_id, []):
             try:
-                self.detectors[parking_lot_id].stop_detection()
-                del self.detectors[parking_lot_id]
-                logger.info(f"Stopped detector for parking lot {parking_lot_id}")
+                self.origins.pop(key, None)
+                self._stop_camera(key)
             except Exception as e:
-                logger.error(f"Error stopping detector for parking lot {parking_lot_id}: {e}")
+                logger.error(f"Error stopping detector {key} of parking lot {parking_lot_id}: {e}")
+        STATUS_AGE.remove(parking_lot_id)
+        self._flush_analytics(parking_lot_id)
+        self.analytics.pop(parking_lot_id, None)
+        if self.fusion.pop(parking_lot_id, None) is not None:
+            logger.info(f"Stopped detectors for parking lot {parking_lot_id}")
+
+    def _stop_camera(self, key):
+        """Stop one camera's detector, returns its last statuses"""
+        self.scheduler.unregister(key)
+        SNAPSHOTS.discard(key)
+        detector = self.detectors.pop(key, None)
+        if detector is None:
+            return None
+        detector.stop_detection()
+        return detector.checkpoint()
+
+    def restart_camera(self, key):
+        """Restart one camera's detector, resuming from its last statuses"""
+        origin = self.origins.get(key)
+        if origin is None:
+            return
+
+        parking_lot_id, camera_id = origin
+        try:
+            statuses = self._stop_camera(key)
+            lot = ParkingLot.objects.get(id=parking_lot_id)
+            camera = lot.cameras.get(id=camera_id) if camera_id else None
+            self._start_camera(lot, camera, statuses)
+            logger.info(f"Restarted detector {key} of parking lot {parking_lot_id}")
+        except Exception as e:
+            logger.error(f"Error restarting detector {key} of parking lot {parking_lot_id}: {e}")
+
+    def restart_detector(self, parking_lot_id):
+        """Restart a parking lot's detectors, picking up camera changes"""
+        self.stop_detector(parking_lot_id)
+        self.start_detector(parking_lot_id)
+
+    def get_detector(self, parking_lot_id, camera_id=None):
+        """The detector of a lot's camera in this process, its first one by default"""
+        sources = self.cameras.get(parking_lot_id, [])
+        for key, _ in sources:
+            if camera_id is None or str(key) == str(camera_id):
+                return key, self.detectors.get(key)
+        return None, None
 
     def get_status(self, parking_lot_id):
-        """Get the current status for a specific parking lot"""
-        if parking_lot_id in self.detectors:
-            return self.detectors[parking_lot_id].get_parking_status()
-        return None
+        """Get the fused status of every space of a parking lot, by space ID"""
+        sources = self.cameras.get(parking_lot_id)
+        if sources is None:
+            return None
+
+        views = []
+        for key, weight in sources:
+            detector = self.detectors.get(key)
+            view = CameraView.from_detector(detector, weight) if detector else None
+            if view is not None:
+                views.append(view)
+        return fuse(views, self.fusion.get(parking_lot_id, BEST_VIEW))
+
+    def _status_age(self, parking_lot_id):
+        """Seconds since any camera of a lot finished an analysis"""
+        heartbeats = [
+            self.detectors[key].heartbeat
+            for key, _ in self.cameras.get(parking_lot_id, [])
+            if key in self.detectors
+        ]
+        return time.monotonic() - max(heartbeats) if heartbeats else float("nan")
+
+    def get_schedule(self):
+        """Get the analysis rate and lag of every running detector, with its lot"""
+        owners = {
+            key: parking_lot_id
+            for parking_lot_id, sources in list(self.cameras.items())
+            for key, _ in sources
+        }
+        return {
+            key: {'parking_lot': owners.get(key), **stats, **self.supervisor.stats(key)}
+            for key, stats in self.scheduler.stats().items()
+        }
 
     def _status_callback(self, parking_lot_id, statuses):
         """Called when a detector updates its status"""
@@ -118,35 +269,100 @@ class DetectorManager:
         """Update the database with status information periodically"""
         while self.running:
             try:
-                # Update status for each active detector
-                for parking_lot_id, detector in list(self.detectors.items()):
-                    statuses = detector.get_parking_status()
-                    if statuses:
+                # Update status for each lot, fusing its cameras
+                for parking_lot_id in list(self.cameras):
+                    fused = self.get_status(parking_lot_id)
+                    if fused:
+                        statuses = list(fused.values())
                         total = len(statuses)
                         free = statuses.count(ParkingStatusEnum.FREE)
                         occupied = statuses.count(ParkingStatusEnum.OCCUPIED)
                         unknown = statuses.count(ParkingStatusEnum.NOT_DETERMINED)
 
                         # Update in database
+                        started = time.perf_counter()
                         ParkingStatus.objects.create(
                             parking_lot_id=parking_lot_id,
                             total_spaces=total,
                             free_spaces=free,
                             occupied_spaces=occupied,
                             unknown_spaces=unknown,
-                            raw_statuses=statuses
+                            raw_statuses=[
+                                {'id': space_id, 'status': space_status.value}
+                                for space_id, space_status in fused.items()
+                            ]
                         )
+                        DB_WRITE_SECONDS.labels("status").observe(time.perf_counter() - started)
 
                         logger.debug(f"Updated status for {parking_lot_id}: {free}/{total} free")
 
             except Exception as e:
                 logger.error(f"Error updating statuses: {e}")
 
+            for parking_lot_id in list(self.analytics):
+                self._flush_analytics(parking_lot_id)
+            self._update_forecasts()
+
             # Sleep for a while before next update
             time.sleep(10)  # Update database every 10 seconds to reduce load
 
+    def _record_transition(self, parking_lot_id, space_id, at):
+        """Feed the fused status of a space one of the lot's cameras changed to its analytics
+
+        A camera disagreeing with a better one, e.g. while a truck blocks
+        its view, then changes nothing, as in the statuses stored.
+        """
+        analytics = self.analytics.get(parking_lot_id)
+        if analytics is None:
+            return
+        # The lot's cameras are registered once they all started
+        sources = self.cameras.get(parking_lot_id) or [
+            (key, 1.0) for key, origin in list(self.origins.items()) if origin[0] == parking_lot_id
+        ]
+        with analytics.lock:
+            votes = []
+            for key, weight in sources:
+                detector = self.detectors.get(key)
+                geometry = detector.geometry if detector else None
+                index = geometry.positions.get(space_id) if geometry is not None else None
+                statuses = detector.get_parking_status() if index is not None else ()
+                if index is not None and index < len(statuses):
+                    votes.append((statuses[index], geometry.areas[index] * weight))
+            if votes:
+                analytics.record(space_id, fuse_votes(votes, self.fusion.get(parking_lot_id, BEST_VIEW)), at)
+
+    def _flush_analytics(self, parking_lot_id):
+        """Write the dwell aggregates of the spaces that changed since the last flush"""
+        analytics = self.analytics.get(parking_lot_id)
+        if analytics is None:
+            return
+        try:
+            started = time.perf_counter()
+            if analytics.flush():
+                DB_WRITE_SECONDS.labels("analytics").observe(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Error writing the dwell analytics of {parking_lot_id}: {e}")
+
+    def _update_forecasts(self):
+        """Fold the new statuses of the lots run here into their forecast profiles"""
+        interval = settings.PARKING_FORECAST_UPDATE_SECONDS
+        now = time.monotonic()
+        if not interval or now - self.forecasts_updated_at < interval:
+            return
+        self.forecasts_updated_at = now
+
+        for parking_lot_id in list(self.cameras):
+            try:
+                update_profile(parking_lot_id)
+            except Exception as e:
+                logger.error(f"Error updating the forecast profile of {parking_lot_id}: {e}")
+
     def shutdown(self):
         """Shutdown the detector manager"""
         self.running = False
-        for parking_lot_id in list(self.detectors.keys()):
+        try:
+            self.supervisor.checkpoint()
+        except Exception as e:
+            logger.error(f"Error checkpointing detectors: {e}")
+        for parking_lot_id in list(self.cameras.keys()):
             self.stop_detector(parking_lot_id)
\ No newline at end of file
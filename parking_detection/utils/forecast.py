@@ -0,0 +1,132 @@
+import datetime
+import math
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import OccupancyProfile, ParkingStatus
+
+BUCKET_MINUTES = 15
+MINUTES_PER_WEEK = 7 * 24 * 60
+# How long the gap between now and the usual level takes to fade by 1/e,
+# a lot emptier than usual now stays emptier for the next minutes
+DEVIATION_MINUTES = 30.0
+MAX_MINUTES = 7 * 24 * 60
+UPDATE_BATCH = 5000
+
+
+def bucket_of(moment, bucket_minutes=BUCKET_MINUTES):
+    """Time-of-week bucket of a moment, in the TIME_ZONE of the site"""
+    local = timezone.localtime(moment)
+    return (local.weekday() * 24 * 60 + local.hour * 60 + local.minute) // bucket_minutes
+
+
+class Profile:
+    """Running mean of a lot's free share in every time-of-week bucket"""
+
+    __slots__ = ("bucket_minutes", "counts", "sums")
+
+    def __init__(self, sums, counts, bucket_minutes=BUCKET_MINUTES):
+        self.sums = sums
+        self.counts = counts
+        self.bucket_minutes = bucket_minutes
+
+    @classmethod
+    def empty(cls, bucket_minutes=BUCKET_MINUTES):
+        buckets = MINUTES_PER_WEEK // bucket_minutes
+        return cls(np.zeros(buckets), np.zeros(buckets, dtype=np.uint32), bucket_minutes)
+
+    @classmethod
+    def from_model(cls, profile):
+        return cls(
+            np.frombuffer(profile.sums, dtype=np.float64).copy(),
+            np.frombuffer(profile.counts, dtype=np.uint32).copy(),
+            profile.bucket_minutes,
+        )
+
+    def to_model(self, profile):
+        profile.sums = self.sums.tobytes()
+        profile.counts = self.counts.tobytes()
+        profile.bucket_minutes = self.bucket_minutes
+
+    def add(self, moment, free_share):
+        bucket = bucket_of(moment, self.bucket_minutes)
+        self.sums[bucket] += free_share
+        self.counts[bucket] += 1
+
+    def typical(self, moment):
+        """Mean free share at a moment's time of week, over all history if never seen"""
+        bucket = bucket_of(moment, self.bucket_minutes)
+        if self.counts[bucket]:
+            return self.sums[bucket] / self.counts[bucket], int(self.counts[bucket])
+        total = int(self.counts.sum())
+        return (self.sums.sum() / total if total else None), 0
+
+
+def update_profile(parking_lot_id):
+    """Fold the statuses stored since the last update into a lot's profile
+
+    Only reads the new rows, so the cost follows what was added, not the
+    length of the history. Returns how many statuses were added.
+    """
+    with transaction.atomic():
+        model, _ = OccupancyProfile.objects.select_for_update().get_or_create(
+            parking_lot_id=parking_lot_id,
+            defaults={'sums': b"", 'counts': b"", 'bucket_minutes': BUCKET_MINUTES},
+        )
+        profile = Profile.from_model(model) if model.counts else Profile.empty(model.bucket_minutes)
+
+        added = 0
+        rows = ParkingStatus.objects.filter(
+            parking_lot_id=parking_lot_id, id__gt=model.last_status_id, total_spaces__gt=0
+        ).order_by('id').values_list('id', 'timestamp', 'free_spaces', 'total_spaces')
+        for status_id, moment, free, total in rows.iterator(chunk_size=UPDATE_BATCH):
+            profile.add(moment, free / total)
+            model.last_status_id = status_id
+            added += 1
+
+        if added or not model.counts:
+            profile.to_model(model)
+            model.save()
+    return added
+
+
+def forecast(lot, minutes, now=None):
+    """Free spaces expected in `minutes`, the typical level blended with the live one
+
+    Reads the lot's profile and latest status only, never the history.
+    Returns None when neither exists.
+    """
+    now = now or timezone.now()
+    target = now + datetime.timedelta(minutes=minutes)
+
+    try:
+        profile = Profile.from_model(lot.occupancy_profile)
+    except OccupancyProfile.DoesNotExist:
+        profile = None
+    latest = lot.statuses.defer('raw_statuses').first()
+    if latest is None or not latest.total_spaces:
+        return None
+
+    current = latest.free_spaces / latest.total_spaces
+    typical_now, _ = profile.typical(now) if profile else (None, 0)
+    typical, samples = profile.typical(target) if profile else (None, 0)
+    if typical is None:
+        share = current
+    else:
+        # The live gap to the usual level fades as the target moves away
+        gap = current - typical_now if typical_now is not None else 0.0
+        share = typical + gap * math.exp(-minutes / DEVIATION_MINUTES)
+    share = min(1.0, max(0.0, share))
+
+    return {
+        'minutes': minutes,
+        'at': target,
+        'free_spaces': round(share * latest.total_spaces),
+        'total_spaces': latest.total_spaces,
+        'free_share': round(share, 3),
+        'typical_free_share': None if typical is None else round(typical, 3),
+        'current_free_spaces': latest.free_spaces,
+        'samples': samples,
+    }
@@ -0,0 +1,159 @@
+import errno
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Header fields, stored as int64 at the start of the shared block
+WRITE_SEQUENCE, SLOTS, PINS, HEIGHT, WIDTH, CHANNELS = range(6)
+HEADER_SIZE = 8
+# Where Linux keeps POSIX shared memory, a 64 MB tmpfs in containers by default
+SHM_DIR = "/dev/shm"
+
+
+def ring_size(shape, slots, pins):
+    """Bytes of shared memory a ring takes"""
+    return 8 * (HEADER_SIZE + 2 * slots + pins) + slots * int(np.prod(shape))
+
+
+def shm_available():
+    """Free bytes for shared memory, None where it does not live in SHM_DIR"""
+    try:
+        stats = os.statvfs(SHM_DIR)
+    except OSError:
+        return None
+    return stats.f_bavail * stats.f_frsize
+
+
+class SharedFrameRing:
+    """Fixed ring of preallocated frame slots in shared memory
+
+    The decoder writes every frame in place into the oldest slot nobody is
+    reading, then publishes it under a new sequence number. Readers, in this
+    process or another one attached by name, pin a sequence number while
+    they use the slot as a NumPy view, so it's never overwritten under them
+    and frames are never copied or pickled.
+
+    Layout: header | sequence number per slot | position per slot |
+    pinned sequence number per reader | frames. Slot and pin bookkeeping
+    happens under a lock, frames are written and read without it.
+    """
+
+    def __init__(self, memory, lock, owner):
+        self.memory = memory
+        self.lock = lock
+        self.owner = owner
+
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=memory.buf)
+        slots, pins = int(header[SLOTS]), int(header[PINS])
+        shape = (int(header[HEIGHT]), int(header[WIDTH]), int(header[CHANNELS]))
+
+        offset = header.nbytes
+        self.header = header
+        self.sequences = np.ndarray((slots,), dtype=np.int64, buffer=memory.buf, offset=offset)
+        offset += self.sequences.nbytes
+        self.positions = np.ndarray((slots,), dtype=np.float64, buffer=memory.buf, offset=offset)
+        offset += self.positions.nbytes
+        self.pins = np.ndarray((pins,), dtype=np.int64, buffer=memory.buf, offset=offset)
+        offset += self.pins.nbytes
+        self.frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=memory.buf, offset=offset)
+
+    @classmethod
+    def create(cls, shape, slots, pins, lock=None):
+        """Allocate a ring for frames of `shape` (height, width, channels)"""
+        if pins >= slots:
+            raise ValueError("A ring needs more slots than pins so the writer never blocks")
+
+        size = ring_size(shape, slots, pins)
+        # The block is sparse, a full tmpfs would only show as SIGBUS on write
+        available = shm_available()
+        if available is not None and size > available:
+            raise OSError(
+                errno.ENOSPC,
+                f"A {size / 2**20:.0f} MB frame ring does not fit the {available / 2**20:.0f} MB "
+                f"free in {SHM_DIR}, raise the container's shm_size or lower PARKING_FRAME_RING_MB",
+            )
+        memory = shared_memory.SharedMemory(create=True, size=size)
+
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=memory.buf)
+        header[:] = 0
+        header[SLOTS], header[PINS] = slots, pins
+        header[HEIGHT], header[WIDTH], header[CHANNELS] = shape
+        del header
+
+        ring = cls(memory, lock or multiprocessing.Lock(), owner=True)
+        ring.sequences[:] = 0
+        ring.pins[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, lock):
+        """Open a ring created by another process, sharing its lock"""
+        return cls(shared_memory.SharedMemory(name=name), lock, owner=False)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    def begin_write(self):
+        """Claim the oldest unpinned slot, returns its index and frame view"""
+        with self.lock:
+            pinned = set(self.pins[self.pins > 0].tolist())
+            candidates = [i for i in range(len(self.sequences)) if self.sequences[i] not in pinned]
+            index = min(candidates, key=lambda i: self.sequences[i])
+            # Zero marks the slot as being written, readers can't pin it
+            self.sequences[index] = 0
+        return index, self.frames[index]
+
+    def commit(self, index, position):
+        """Publish a written slot, returns its sequence number"""
+        with self.lock:
+            self.header[WRITE_SEQUENCE] += 1
+            sequence = int(self.header[WRITE_SEQUENCE])
+            self.positions[index] = position
+            self.sequences[index] = sequence
+        return sequence
+
+    def latest(self):
+        """Sequence number of the newest frame, 0 before the first one"""
+        return int(self.header[WRITE_SEQUENCE])
+
+    def pin(self, sequence):
+        """Keep a frame from being overwritten
+
+        Returns (pin, frame view, position), or None when the frame has been
+        overwritten already or every pin is taken.
+        """
+        with self.lock:
+            matches = np.flatnonzero(self.sequences == sequence)
+            free = np.flatnonzero(self.pins == 0)
+            if sequence <= 0 or not len(matches) or not len(free):
+                return None
+
+            index, pin = int(matches[0]), int(free[0])
+            self.pins[pin] = sequence
+            return pin, self.frames[index], float(self.positions[index])
+
+    def unpin(self, pin):
+        if pin is not None:
+            with self.lock:
+                if self.pins is not None:
+                    self.pins[pin] = 0
+
+    def release(self):
+        """Detach from the ring, the creator also frees the shared block"""
+        with self.lock:
+            for name in ("header", "sequences", "positions", "pins", "frames"):
+                setattr(self, name, None)
+        try:
+            self.memory.close()
+        except BufferError:
+            # Views handed to readers keep the mapping alive until collected
+            pass
+        if self.owner:
+            self.memory.unlink()
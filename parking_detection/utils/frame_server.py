@@ -0,0 +1,155 @@
+import hmac
+import json
+import logging
+import re
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+from . import metrics
+from .detector_manager import DetectorManager
+from .snapshots import SNAPSHOTS, frame_params
+from .streams import CONTENT_TYPE as STREAM_CONTENT_TYPE
+from .streams import STREAMS
+
+logger = logging.getLogger(__name__)
+
+FRAME_PATH = re.compile(r"/lots/([0-9a-fA-F-]{36})/(snapshot\.jpg|stream\.mjpg)")
+# Seconds the web tier waits on a worker, streams send a part at least
+# every streams.KEEPALIVE_SECONDS
+PROXY_TIMEOUT = 10.0
+CHUNK_SIZE = 64 * 1024
+FORWARDED_HEADERS = ("Content-Type", "ETag", "X-Frame-Version", "Cache-Control")
+
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    """/metrics, and the snapshots and live streams of the lots a worker runs
+
+    The same paths as the API's below /api/parking/, which proxies them here
+    for the lots other processes run. With a shared secret, requests must
+    carry it as a bearer token, as the API's and Prometheus' can.
+    """
+
+    def do_GET(self):
+        secret = self.server.secret
+        if secret and not hmac.compare_digest(
+            self.headers.get("Authorization", "").encode(), f"Bearer {secret}".encode()
+        ):
+            return self._error(403, "Missing or wrong worker secret")
+
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/metrics" and metrics.REGISTRY.enabled:
+            return self._send(200, metrics.CONTENT_TYPE, metrics.REGISTRY.render().encode())
+
+        match = FRAME_PATH.fullmatch(url.path)
+        if match is None:
+            return self._error(404, "Not found")
+        params = {name: values[0] for name, values in urllib.parse.parse_qs(url.query).items()}
+        try:
+            camera, width, since = frame_params(params)
+        except ValueError as e:
+            return self._error(400, str(e))
+
+        key, detector = self.server.manager.get_detector(uuid.UUID(match[1]), camera)
+        if detector is None:
+            return self._error(404, "This worker is not running the parking lot")
+        if match[2] == "snapshot.jpg":
+            self._snapshot(key, detector, width, since)
+        else:
+            self._stream(key, width)
+
+    def _snapshot(self, key, detector, width, since):
+        snapshot = SNAPSHOTS.get(key, detector, width)
+        if snapshot is None:
+            return self._error(503, "No frame analysed yet")
+        headers = {
+            "ETag": snapshot.etag,
+            "X-Frame-Version": str(snapshot.version),
+            "Cache-Control": "no-cache",
+        }
+        if since == snapshot.version or self.headers.get("If-None-Match") == snapshot.etag:
+            self._send(304, None, b"", headers)
+        else:
+            self._send(200, "image/jpeg", snapshot.jpeg, headers)
+
+    def _stream(self, key, width):
+        manager = self.server.manager
+        stream, mailbox = STREAMS.attach(key, lambda: manager.detectors.get(key), width)
+        frames = stream.frames(mailbox)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", STREAM_CONTENT_TYPE)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            for part in frames:
+                self.wfile.write(part)
+                self.wfile.flush()
+        except OSError:
+            pass  # the viewer went away
+        finally:
+            frames.close()
+
+    def _error(self, code, message):
+        self._send(code, "application/json", json.dumps({"error": message}).encode())
+
+    def _send(self, code, content_type, body, headers=None):
+        self.send_response(code)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, address=None, manager=None):
+    """Serve /metrics and the frames of a detector worker's lots, returns the server
+
+    Listens on PARKING_WORKER_HTTP_ADDRESS unless given an address.
+    """
+    if address is None:
+        address = settings.PARKING_WORKER_HTTP_ADDRESS
+    server = ThreadingHTTPServer((address, port), WorkerHandler)
+    server.daemon_threads = True
+    server.secret = settings.PARKING_WORKER_SECRET
+    server.manager = manager or DetectorManager()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def open_upstream(worker_url, path, query="", headers=None):
+    """GET a path of a worker's frame server, error statuses are returned too
+
+    Sends the workers' shared secret when there is one. Raises OSError when
+    the worker cannot be reached.
+    """
+    url = f"{worker_url.rstrip('/')}/{path}" + (f"?{query}" if query else "")
+    headers = dict(headers or {})
+    if settings.PARKING_WORKER_SECRET:
+        headers["Authorization"] = f"Bearer {settings.PARKING_WORKER_SECRET}"
+    try:
+        return urllib.request.urlopen(
+            urllib.request.Request(url, headers=headers), timeout=PROXY_TIMEOUT
+        )
+    except urllib.error.HTTPError as e:
+        return e
+
+
+def relay(upstream):
+    """Body chunks of a streamed upstream response, closing it when done"""
+    try:
+        while chunk := upstream.read1(CHUNK_SIZE):
+            yield chunk
+    except OSError as e:
+        logger.info(f"Proxied stream ended: {e}")
+    finally:
+        upstream.close()
@@ -0,0 +1,80 @@
+from shared.statuses import ParkingStatus
+
+BEST_VIEW = "best_view"
+MAJORITY = "majority"
+CONFIDENCE = "confidence"
+
+DETERMINED = (ParkingStatus.FREE, ParkingStatus.OCCUPIED)
+
+
+class CameraView:
+    """Statuses one camera sees, with how well it sees each space
+
+    The quality of a view is the space's area in pixels scaled by the
+    camera's weight: the closer and less oblique the camera, the larger the
+    space appears and the more its status is trusted.
+    """
+
+    __slots__ = ("qualities", "space_ids", "statuses")
+
+    def __init__(self, space_ids, statuses, qualities):
+        self.space_ids = space_ids
+        self.statuses = statuses
+        self.qualities = qualities
+
+    @classmethod
+    def from_detector(cls, detector, weight=1.0):
+        """Snapshot of a running detector, None before it has a geometry"""
+        geometry = detector.geometry
+        statuses = detector.get_parking_status()
+        if geometry is None or len(statuses) != len(geometry):
+            return None
+        return cls(geometry.ids.tolist(), list(statuses), (geometry.areas * weight).tolist())
+
+
+def fuse(views, rule=BEST_VIEW):
+    """One status per global space ID, ordered by ID, from every camera seeing it"""
+    votes = {}
+    for view in views:
+        for space_id, status, quality in zip(view.space_ids, view.statuses, view.qualities):
+            votes.setdefault(space_id, []).append((status, quality))
+
+    return {space_id: fuse_votes(votes[space_id], rule) for space_id in sorted(votes)}
+
+
+def fuse_votes(votes, rule=BEST_VIEW):
+    """Status of one space from the (status, quality) of every camera seeing it"""
+    return RULES.get(rule, best_view)(votes)
+
+
+def best_view(votes):
+    """Status of the camera seeing the space best among those that decided"""
+    decided = [(quality, status) for status, quality in votes if status in DETERMINED]
+    if not decided:
+        return ParkingStatus.NOT_DETERMINED
+    return max(decided, key=lambda vote: vote[0])[1]
+
+
+def majority(votes):
+    """Status most cameras agree on, undetermined on a tie"""
+    free = sum(1 for status, _ in votes if status == ParkingStatus.FREE)
+    occupied = sum(1 for status, _ in votes if status == ParkingStatus.OCCUPIED)
+    if free == occupied:
+        return ParkingStatus.NOT_DETERMINED
+    return ParkingStatus.FREE if free > occupied else ParkingStatus.OCCUPIED
+
+
+def confidence_weighted(votes):
+    """Status with the largest total view quality, undetermined on a tie"""
+    free = sum(quality for status, quality in votes if status == ParkingStatus.FREE)
+    occupied = sum(quality for status, quality in votes if status == ParkingStatus.OCCUPIED)
+    if free == occupied:
+        return ParkingStatus.NOT_DETERMINED
+    return ParkingStatus.FREE if free > occupied else ParkingStatus.OCCUPIED
+
+
+RULES = {
+    BEST_VIEW: best_view,
+    MAJORITY: majority,
+    CONFIDENCE: confidence_weighted,
+}
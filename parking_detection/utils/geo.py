@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+
+from django.db.models.signals import post_delete, post_save
+
+from ..models import ParkingLot
+from .status_feed import latest_statuses, with_latest_status
+
+EARTH_RADIUS = 6371008.8  # meters, mean radius
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+CELL_DEGREES = 0.05  # about 5.5 km of latitude
+# Other processes change lots too, the index is rebuilt at least this often
+REBUILD_SECONDS = 60.0
+MAX_RADIUS = 50_000  # meters
+MAX_RESULTS = 50
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters, with the haversine formula"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    half_dphi = (phi2 - phi1) / 2
+    half_dlambda = math.radians(lon2 - lon1) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LotIndex:
+    """Active lots with a location, bucketed in a grid of CELL_DEGREES cells
+
+    A query only measures the lots in the cells its radius overlaps. The
+    index is rebuilt on the next query after a lot is saved or deleted in
+    this process, and every REBUILD_SECONDS for changes made elsewhere.
+    """
+
+    def __init__(self, cell=CELL_DEGREES, rebuild_seconds=REBUILD_SECONDS):
+        self.cell = cell
+        self.columns = round(360 / cell)
+        self.rebuild_seconds = rebuild_seconds
+        self.lock = threading.Lock()
+        # (row, column) -> [(lot ID, name, latitude, longitude)]
+        self.buckets = {}
+        self.built_at = None
+
+    def invalidate(self, **kwargs):
+        """Rebuild on the next query, connected to the lot signals"""
+        self.built_at = None
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell), math.floor(longitude / self.cell) % self.columns
+
+    def build(self, lots):
+        buckets = {}
+        for lot_id, name, latitude, longitude in lots:
+            buckets.setdefault(self._cell(latitude, longitude), []).append(
+                (lot_id, name, latitude, longitude)
+            )
+        self.buckets = buckets
+
+    def ensure_built(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.built_at is None or now - self.built_at > self.rebuild_seconds:
+                self.build(
+                    ParkingLot.objects.filter(
+                        is_active=True, latitude__isnull=False, longitude__isnull=False
+                    ).values_list('id', 'name', 'latitude', 'longitude')
+                )
+                self.built_at = now
+
+    def _buckets_near(self, latitude, longitude, radius):
+        span = radius / METERS_PER_DEGREE
+        rows = range(
+            math.floor(max(-90.0, latitude - span) / self.cell),
+            math.floor(min(90.0, latitude + span) / self.cell) + 1,
+        )
+        # Longitude degrees shrink towards the poles
+        shrink = math.cos(math.radians(min(89.0, abs(latitude) + span)))
+        columns = min(self.columns, 2 * math.ceil(span / shrink / self.cell) + 1)
+
+        buckets = self.buckets
+        if len(rows) * columns >= len(buckets):
+            return list(buckets.values())
+        first = math.floor(longitude / self.cell) - columns // 2
+        return [
+            bucket
+            for row in rows
+            for column in range(first, first + columns)
+            if (bucket := buckets.get((row, column % self.columns))) is not None
+        ]
+
+    def near(self, latitude, longitude, radius):
+        """(distance, lot ID, name, latitude, longitude) within radius meters, nearest first"""
+        self.ensure_built()
+        found = []
+        for bucket in self._buckets_near(latitude, longitude, radius):
+            for lot_id, name, lot_latitude, lot_longitude in bucket:
+                meters = distance(latitude, longitude, lot_latitude, lot_longitude)
+                if meters <= radius:
+                    found.append((meters, lot_id, name, lot_latitude, lot_longitude))
+        found.sort(key=lambda lot: lot[0])
+        return found
+
+
+def nearby_lots(latitude, longitude, radius, min_free=0, limit=10, index=None):
+    """The nearest lots with at least `min_free` free spaces, with their live counts
+
+    Candidates are checked nearest first in batches, so a query reads the
+    statuses of about as many lots as it returns.
+    """
+    candidates = (index or LOTS).near(latitude, longitude, radius)
+    results = []
+    batch = max(2 * limit, 20)
+    for start in range(0, len(candidates), batch):
+        chunk = candidates[start : start + batch]
+        lots = ParkingLot.objects.filter(id__in=[lot_id for _, lot_id, *_ in chunk]).only('id')
+        statuses = latest_statuses(with_latest_status(lots), raw=False)
+        for meters, lot_id, name, lot_latitude, lot_longitude in chunk:
+            latest = statuses.get(lot_id)
+            free = latest.free_spaces if latest else 0
+            if free < min_free:
+                continue
+            results.append({
+                'id': str(lot_id),
+                'name': name,
+                'latitude': lot_latitude,
+                'longitude': lot_longitude,
+                'distance': round(meters, 1),
+                'free_spaces': free,
+                'total_spaces': latest.total_spaces if latest else 0,
+                'status_updated_at': latest.timestamp if latest else None,
+            })
+            if len(results) == limit:
+                return results
+    return results
+
+
+LOTS = LotIndex()
+
+
+def connect_signals():
+    post_save.connect(LOTS.invalidate, sender=ParkingLot, dispatch_uid="lot_index_save")
+    post_delete.connect(LOTS.invalidate, sender=ParkingLot, dispatch_uid="lot_index_delete")
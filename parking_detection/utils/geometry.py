@@ -0,0 +1,126 @@
+import os
+import tempfile
+
+import cv2 as open_cv
+import numpy as np
+
+# Corners of the unit square, in the order of the coordinates schema
+UNIT_SQUARE = np.float32([[0, 0], [1, 0], [1, 1], [0, 1]])
+
+
+class SpaceGeometry:
+    """Per-space geometry of a lot, computed once when a detector starts
+
+    Contours, bounding rects and masks are kept in arrays indexed by space
+    so the hot loop never goes back to the coordinates data. A compiled
+    geometry is saved as .npy files and loaded memory-mapped, the masks
+    then being views into one flat array.
+    """
+
+    __slots__ = ("areas", "bounds", "contours", "ids", "mask_ratios", "masks", "positions", "transforms")
+
+    ARRAYS = ("ids", "contours", "bounds", "mask_data", "mask_offsets", "areas", "transforms")
+
+    def __init__(self, ids, contours, bounds, masks, areas=None, transforms=None):
+        self.ids = ids
+        # Index of each space ID in the arrays
+        self.positions = {space_id: index for index, space_id in enumerate(ids.tolist())}
+        self.contours = contours
+        self.bounds = bounds
+        self.masks = masks
+        # Pixels covered by each space polygon, and their share of its rect
+        if areas is None:
+            areas = np.array([np.count_nonzero(mask) for mask in masks], dtype=np.float64)
+        self.areas = areas
+        self.mask_ratios = np.array(
+            [area / mask.size for area, mask in zip(self.areas, masks)], dtype=np.float64
+        )
+        # Perspective transforms from the unit square onto each space
+        if transforms is None:
+            transforms = np.array(
+                [open_cv.getPerspectiveTransform(UNIT_SQUARE, np.float32(c[:4])) for c in contours],
+                dtype=np.float64,
+            ).reshape(-1, 3, 3)
+        self.transforms = transforms
+
+    @classmethod
+    def from_coordinates(cls, coordinates_data):
+        """Build the geometry from parsed coordinates YAML"""
+        ids = np.array([p["id"] for p in coordinates_data], dtype=np.int32)
+        contours = [np.array(p["coordinates"], dtype=np.int32) for p in coordinates_data]
+        bounds = np.array(
+            [open_cv.boundingRect(coordinates) for coordinates in contours],
+            dtype=np.int32,
+        ).reshape(-1, 4)
+
+        masks = []
+        for coordinates, (x, y, w, h) in zip(contours, bounds):
+            mask = np.zeros((h, w), dtype=np.uint8)
+            open_cv.drawContours(
+                mask,
+                [coordinates - (x, y)],
+                contourIdx=-1,
+                color=255,
+                thickness=-1,
+                lineType=open_cv.LINE_8,
+            )
+            masks.append(mask)
+
+        return cls(ids, contours, bounds, masks)
+
+    def save(self, directory):
+        """Write the geometry as .npy files into a new directory
+
+        The files go to a temporary sibling directory renamed into place, so
+        processes compiling the same geometry at once never see a partial one.
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+
+        sizes = [mask.size for mask in self.masks]
+        arrays = {
+            "ids": self.ids,
+            "contours": np.array(self.contours, dtype=np.int32).reshape(len(self), -1, 2),
+            "bounds": self.bounds,
+            "mask_data": np.concatenate([mask.ravel() for mask in self.masks])
+            if self.masks else np.empty(0, dtype=np.uint8),
+            "mask_offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            "areas": self.areas,
+            "transforms": self.transforms,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Somebody else compiled it first
+            for name in arrays:
+                os.remove(os.path.join(staging, f"{name}.npy"))
+            os.rmdir(staging)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Geometry saved by `save`, memory-mapped read-only by default"""
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in cls.ARRAYS
+        }
+        offsets = arrays["mask_offsets"]
+        masks = [
+            arrays["mask_data"][offsets[index] : offsets[index + 1]].reshape(h, w)
+            for index, (_, _, w, h) in enumerate(arrays["bounds"])
+        ]
+        return cls(
+            arrays["ids"], list(arrays["contours"]), arrays["bounds"], masks,
+            areas=arrays["areas"], transforms=arrays["transforms"],
+        )
+
+    def __len__(self):
+        return len(self.contours)
+
+    def roi(self, image, index):
+        """View of an image cropped to a space's bounding rect"""
+        x, y, w, h = self.bounds[index]
+        return image[y : y + h, x : x + w]
@@ -0,0 +1,154 @@
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import DetectorLease, DetectorWorker, ParkingLot
+from .metrics import DB_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseCoordinator:
+    """Splits the active lots between detector workers through lease rows
+
+    Every worker beats in the workers table and holds a lease per lot it
+    runs, renewed every third of the lease TTL. Each worker aims for a fair
+    share of the lots (active lots over live workers, rounded up): it
+    releases its extra leases and claims free or expired ones up to its
+    share. A worker that dies stops renewing, its leases expire and the
+    others take its lots over. Claims are single conditional writes, so two
+    workers never win the same lot. Expiry compares the clocks of different
+    machines, keep them in sync.
+    """
+
+    def __init__(self, manager, name=None, ttl=None, url=""):
+        self.manager = manager
+        # Where the web tier fetches the frames of this worker's lots
+        self.url = url
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.ttl = timedelta(seconds=ttl or settings.PARKING_LEASE_TTL)
+        # Lots this worker runs, with the lot version its detectors were built from
+        self.held = {}
+
+    @property
+    def renew_interval(self):
+        return self.ttl.total_seconds() / 3
+
+    def run(self):
+        """Hold leases and run their detectors until the manager shuts down"""
+        self.manager.initialize(start_all=False)
+        logger.info(f"Detector worker {self.name} started")
+        try:
+            while self.manager.running:
+                try:
+                    self.tick()
+                except Exception as e:
+                    logger.error(f"Error renewing detector leases: {e}")
+                time.sleep(self.renew_interval)
+        finally:
+            self.release_all()
+
+    def tick(self):
+        """Beat, renew held leases, then release or claim lots towards a fair share"""
+        now = timezone.now()
+        started = time.perf_counter()
+        DetectorWorker.objects.update_or_create(
+            name=self.name, defaults={'heartbeat_at': now, 'url': self.url}
+        )
+        DetectorWorker.objects.filter(heartbeat_at__lt=now - 10 * self.ttl).delete()
+
+        lots = {lot.id: lot for lot in ParkingLot.objects.filter(is_active=True)}
+        self._renew(now, lots)
+        DB_WRITE_SECONDS.labels("lease").observe(time.perf_counter() - started)
+
+        workers = DetectorWorker.objects.filter(heartbeat_at__gte=now - self.ttl).count()
+        share = math.ceil(len(lots) / max(workers, 1))
+
+        # Give the lots picked up last back first
+        for parking_lot_id in list(self.held)[share:]:
+            self.release(parking_lot_id)
+
+        self._claim(now, lots, share)
+
+    def _renew(self, now, lots):
+        """Extend held leases, dropping lots deactivated or taken over"""
+        schedule = self.manager.get_schedule()
+        for parking_lot_id, version in list(self.held.items()):
+            lot = lots.get(parking_lot_id)
+            renewed = lot is not None and DetectorLease.objects.filter(
+                parking_lot_id=parking_lot_id, owner=self.name
+            ).update(expires_at=now + self.ttl, health=self._health(parking_lot_id, schedule))
+
+            if not renewed:
+                logger.info(f"Worker {self.name} lost parking lot {parking_lot_id}")
+                self.release(parking_lot_id)
+            elif lot.updated_at != version:
+                # Cameras or settings changed, rebuild the detectors
+                self.held[parking_lot_id] = lot.updated_at
+                self.manager.restart_detector(parking_lot_id)
+
+    def _claim(self, now, lots, share):
+        """Take free or expired leases, most important lots first"""
+        if len(self.held) >= share:
+            return
+
+        taken = set(
+            DetectorLease.objects.filter(expires_at__gte=now).values_list('parking_lot_id', flat=True)
+        )
+        candidates = sorted(
+            (lot for lot in lots.values() if lot.id not in taken and lot.id not in self.held),
+            key=lambda lot: -lot.priority,
+        )
+
+        for lot in candidates:
+            if len(self.held) >= share:
+                break
+            if self._acquire(lot.id, now):
+                self.held[lot.id] = lot.updated_at
+                self.manager.start_detector(lot.id)
+                logger.info(f"Worker {self.name} claimed parking lot {lot.id}")
+
+    def _acquire(self, parking_lot_id, now):
+        """Create the lot's lease, or take it over once expired"""
+        expires_at = now + self.ttl
+        try:
+            with transaction.atomic():
+                DetectorLease.objects.create(
+                    parking_lot_id=parking_lot_id, owner=self.name,
+                    acquired_at=now, expires_at=expires_at
+                )
+            return True
+        except IntegrityError:
+            return DetectorLease.objects.filter(
+                parking_lot_id=parking_lot_id, expires_at__lt=now
+            ).update(owner=self.name, acquired_at=now, expires_at=expires_at, health={}) == 1
+
+    def release(self, parking_lot_id):
+        """Stop a lot's detectors and give its lease back"""
+        self.held.pop(parking_lot_id, None)
+        self.manager.stop_detector(parking_lot_id)
+        DetectorLease.objects.filter(parking_lot_id=parking_lot_id, owner=self.name).delete()
+
+    def release_all(self):
+        """Give every lease back so other workers take over right away"""
+        self.manager.shutdown()
+        DetectorLease.objects.filter(owner=self.name).delete()
+        DetectorWorker.objects.filter(name=self.name).delete()
+        self.held.clear()
+        logger.info(f"Detector worker {self.name} stopped")
+
+    def _health(self, parking_lot_id, schedule):
+        """Schedule and health of the lot's detectors, for the web tier to read"""
+        return {
+            str(key): {name: value for name, value in stats.items() if name != 'parking_lot'}
+            for key, stats in schedule.items()
+            if stats['parking_lot'] == parking_lot_id
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import collections
+import random
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.db import connection
+from django.test import Client
+
+API_PREFIX = "/api/parking"
+ENDPOINTS = {
+    "status": lambda lot_ids, rng: f"{API_PREFIX}/status/",
+    "lots": lambda lot_ids, rng: f"{API_PREFIX}/lots/",
+    "lot": lambda lot_ids, rng: f"{API_PREFIX}/lots/{rng.choice(lot_ids)}/",
+    "availability": lambda lot_ids, rng: f"{API_PREFIX}/availability/",
+}
+DEFAULT_MIX = "status=6,lots=2,lot=1,availability=1"
+
+
+class Result:
+    """Outcome of one request"""
+
+    __slots__ = ("latency", "queries", "status")
+
+    def __init__(self, latency, status, queries):
+        self.latency = latency
+        self.status = status
+        self.queries = queries
+
+
+class HttpSession:
+    """Keep-alive HTTP/1.1 GETs over one asyncio connection, for live servers"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.prefix = parts.path.rstrip("/")
+        self.streams = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.streams is not None:
+            self.streams[1].close()
+            self.streams = None
+
+    async def get(self, path):
+        """Status code of a GET, queries are unknown from outside the server"""
+        if self.streams is None:
+            self.streams = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        reader, writer = self.streams
+
+        writer.write(
+            f"GET {self.prefix}{path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Accept: application/json\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            # The server dropped the idle connection, retry on a new one
+            await self.close()
+            return await self.get(path)
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        else:
+            await reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, None
+
+
+class ClientSession:
+    """GETs through the Django test client in worker threads, counting queries"""
+
+    async def __aenter__(self):
+        self.client = Client()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get(self, path):
+        return await asyncio.to_thread(self._get, path)
+
+    def _get(self, path):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.client.get(path)
+        return response.status_code, len(queries)
+
+
+def parse_mix(mix):
+    """Endpoint weights from "status=6,lots=2"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name}, use {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def run_load(session_factory, lot_ids, mix, concurrency, requests=None, duration=None, seed=0):
+    """Drive the API from `concurrency` concurrent sessions
+
+    Runs until `requests` requests were sent or `duration` seconds went by.
+    Returns the results by endpoint and the wall time taken.
+    """
+    return asyncio.run(_run(session_factory, lot_ids, mix, concurrency, requests, duration, seed))
+
+
+async def _run(session_factory, lot_ids, mix, concurrency, requests, duration, seed):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency))
+    names, weights = zip(*mix.items())
+    results = collections.defaultdict(list)
+    remaining = [requests if requests is not None else float("inf")]
+    deadline = time.monotonic() + duration if duration else float("inf")
+
+    async def worker(index):
+        rng = random.Random(seed + index)
+        async with session_factory() as session:
+            while remaining[0] > 0 and time.monotonic() < deadline:
+                remaining[0] -= 1
+                name = rng.choices(names, weights)[0]
+                path = ENDPOINTS[name](lot_ids, rng)
+
+                started = time.perf_counter()
+                try:
+                    status, queries = await session.get(path)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    status, queries = None, None
+                results[name].append(Result(time.perf_counter() - started, status, queries))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """Throughput, latency percentiles, errors and queries per endpoint"""
+    summary = {}
+    for name, endpoint_results in sorted(results.items()):
+        latencies = np.array([result.latency for result in endpoint_results]) * 1000
+        queries = [result.queries for result in endpoint_results if result.queries is not None]
+        p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+        summary[name] = {
+            "requests": len(endpoint_results),
+            "errors": sum(1 for r in endpoint_results if r.status is None or r.status >= 500),
+            "throughput": len(endpoint_results) / elapsed,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "queries": float(np.mean(queries)) if queries else None,
+        }
+    return summary
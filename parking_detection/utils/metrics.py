@@ -0,0 +1,273 @@
+import bisect
+import logging
+import math
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class NullChild:
+    """Stands in for every series while metrics are disabled"""
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_function(self, function):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NULL_CHILD = NullChild()
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        yield "", (), self.value
+
+
+class GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Compute the value when scraped instead of on every change"""
+        self.function = function
+
+    def samples(self):
+        yield "", (), self.function() if self.function else self.value
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            yield "_bucket", (("le", format_value(bound)),), cumulative
+        yield "_sum", (), total
+        yield "_count", (), cumulative
+
+
+class Metric:
+    """A named family of series, one per combination of label values"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def labels(self, *values):
+        """Series for these label values, resolve it once outside hot loops"""
+        if not self.registry.enabled:
+            return NULL_CHILD
+
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values):
+        """Drop a series, e.g. once its detector stops"""
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in values), None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self.lock:
+            children = list(self.children.items())
+
+        for values, child in children:
+            for suffix, extra, value in child.samples():
+                pairs = [*zip(self.labelnames, values), *extra]
+                labels = ",".join(f'{name}="{escape_label(str(v))}"' for name, v in pairs)
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+
+class MetricsRegistry:
+    """Every metric of the process, rendered in the Prometheus text format"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Error rendering metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    return repr(float(value))
+
+
+def escape_label(value):
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def escape_help(value):
+    return value.replace("\\", r"\\").replace("\n", r"\n")
+
+
+REGISTRY = MetricsRegistry(settings.PARKING_METRICS_ENABLED)
+
+STAGE_SECONDS = Histogram(
+    "parking_detector_stage_seconds",
+    "Time spent on one frame in each detector stage",
+    ("detector", "stage"),
+)
+FRAMES = Counter(
+    "parking_detector_frames_total",
+    "Frames read, skipped before decoding, dropped between stages and analysed",
+    ("detector", "outcome"),
+)
+QUEUE_DEPTH = Gauge(
+    "parking_detector_queue_depth",
+    "Frames waiting between two detector stages",
+    ("detector", "queue"),
+)
+STATUS_AGE = Gauge(
+    "parking_lot_status_age_seconds",
+    "Seconds since the freshest analysis of any of the lot's cameras",
+    ("lot",),
+)
+DB_WRITE_SECONDS = Histogram(
+    "parking_db_write_seconds",
+    "Time spent writing detector results to the database",
+    ("operation",),
+)
+
+
+class DetectorMetrics:
+    """Series of one detector, resolved once so the hot loop skips label lookups"""
+
+    STAGES = ("decode", "preprocess", "laplacian", "inference", "classify", "debounce", "callback")
+    OUTCOMES = ("read", "skipped", "dropped", "analysed")
+
+    def __init__(self, detector):
+        self.detector = str(detector)
+        self.queues = ()
+        self.stages = {stage: STAGE_SECONDS.labels(self.detector, stage) for stage in self.STAGES}
+        self.frames = {outcome: FRAMES.labels(self.detector, outcome) for outcome in self.OUTCOMES}
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def count(self, outcome, amount=1):
+        self.frames[outcome].inc(amount)
+
+    def track_queues(self, **queues):
+        """Report the depth of the stage queues when scraped"""
+        self.queues = tuple(queues)
+        for name, stage_queue in queues.items():
+            QUEUE_DEPTH.labels(self.detector, name).set_function(stage_queue.qsize)
+
+    def remove(self):
+        for stage in self.STAGES:
+            STAGE_SECONDS.remove(self.detector, stage)
+        for outcome in self.OUTCOMES:
+            FRAMES.remove(self.detector, outcome)
+        for name in self.queues:
+            QUEUE_DEPTH.remove(self.detector, name)
@@ -0,0 +1,329 @@
+import hashlib
+import importlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import yaml
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "models.yaml"
+WARMUP_BATCH = 2
+WARMUP_SIZE = 640
+
+# Export formats the detectors can run on CPU, see ModelRegistry.export
+EXPORT_FORMATS = ("onnx", "openvino")
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+class SharedModel:
+    """A loaded model shared by every detector of the process"""
+
+    def __init__(self, name, version, model):
+        self.name = name
+        self.version = version
+        self.model = model
+        self._lock = threading.Lock()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def __call__(self, source, **kwargs):
+        # Ultralytics predictors keep per-call state, so detectors take turns
+        with self._lock:
+            return self.model(source, **kwargs)
+
+
+class ModelRegistry:
+    """Loads versioned weights from the local models directory, once per process"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.models = {}
+                cls._instance.load_lock = threading.Lock()
+
+        return cls._instance
+
+    @property
+    def directory(self):
+        return Path(settings.PARKING_MODELS_DIR)
+
+    def manifest(self):
+        """Read the manifest describing the available weights"""
+        manifest_path = self.directory / MANIFEST_NAME
+        if not manifest_path.exists():
+            return {}
+
+        with open(manifest_path, "r") as file:
+            return yaml.safe_load(file) or {}
+
+    def get(self, name=None):
+        """Get a loaded model, loading and warming it up on first use"""
+        name = name or settings.PARKING_DEFAULT_MODEL
+        model = self.models.get(name)
+        if model is not None:
+            return model
+
+        with self.load_lock:
+            if name not in self.models:
+                self.models[name] = self._load(name)
+
+        return self.models[name]
+
+    def preload(self, names):
+        """Load several models up front so detectors start without delay"""
+        for name in set(names):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Error preloading model {name}: {e}")
+
+    def register(self, source, name, version, backend="torch"):
+        """Copy weights into the models directory and record their checksum"""
+        source = Path(source)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        file_name = f"{name}-{version}{source.suffix}"
+        if source.is_dir():
+            # OpenVINO exports are a directory of xml/bin/metadata files, and
+            # ultralytics recognizes them by the directory name suffix
+            file_name = f"{name}-{version}_{backend}_model"
+            shutil.copytree(source, self.directory / file_name, dirs_exist_ok=True)
+        else:
+            shutil.copyfile(source, self.directory / file_name)
+
+        manifest = self.manifest()
+        manifest[name] = {
+            "version": str(version),
+            "file": file_name,
+            "backend": backend,
+            "sha256": file_checksum(self.directory / file_name),
+        }
+        with open(self.directory / MANIFEST_NAME, "w") as file:
+            yaml.safe_dump(manifest, file, sort_keys=True)
+
+        # Drop a stale copy so the next get picks up the new version
+        self.models.pop(name, None)
+        return manifest[name]
+
+    def export(self, name, format, int8=False, calibration_crops=None):
+        """Export a registered PyTorch model to a CPU runtime and register it
+
+        INT8 quantization is calibrated on `calibration_crops`, space crops
+        from our own lots, so the quantized model keeps its accuracy on them.
+        """
+        if format not in EXPORT_FORMATS:
+            raise ModelRegistryError(f"Unsupported export format {format!r}")
+        if int8 and calibration_crops is None:
+            raise ModelRegistryError("INT8 export needs calibration crops")
+
+        entry = self.manifest().get(name)
+        if entry is None or entry.get("backend", "torch") != "torch":
+            raise ModelRegistryError(f"Model {name!r} is not a registered PyTorch model")
+
+        # ultralytics would otherwise try to pip install them mid-export
+        import_runtime("onnx")
+        import_runtime("openvino" if format == "openvino" else "onnxruntime")
+        os.environ.setdefault("YOLO_OFFLINE", "1")
+        from ultralytics import YOLO
+
+        from .calibration import write_calibration_dataset
+
+        export_name = f"{name}-{format}" + ("-int8" if int8 else "")
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Export from a scratch copy so ultralytics writes next to it
+            weights = Path(work_dir) / entry["file"]
+            shutil.copyfile(self.directory / entry["file"], weights)
+            model = YOLO(str(weights))
+
+            if format == "openvino":
+                options = {"format": "openvino", "imgsz": WARMUP_SIZE}
+                if int8:
+                    data, _ = write_calibration_dataset(
+                        calibration_crops, os.path.join(work_dir, "calibration"), model.names
+                    )
+                    options.update(int8=True, data=data)
+                exported = model.export(**options)
+            else:
+                exported = model.export(format="onnx", imgsz=WARMUP_SIZE)
+                if int8:
+                    exported = self._quantize_onnx(exported, calibration_crops)
+
+            return self.register(exported, export_name, entry["version"], backend=format)
+
+    @staticmethod
+    def _quantize_onnx(path, calibration_crops):
+        """Static INT8 quantization of an ONNX export with ONNX Runtime"""
+        onnxruntime = import_runtime("onnxruntime")
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        from .calibration import CalibrationReader
+
+        input_name = onnxruntime.InferenceSession(
+            path, providers=["CPUExecutionProvider"]
+        ).get_inputs()[0].name
+        quantized = str(Path(path).with_suffix("")) + "-int8.onnx"
+        quantize_static(
+            path,
+            quantized,
+            CalibrationReader(calibration_crops, input_name, WARMUP_SIZE),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+        return quantized
+
+    def _load(self, name):
+        entry = self.manifest().get(name)
+        if entry is None:
+            raise ModelRegistryError(
+                f"Model {name!r} is not registered in {self.directory / MANIFEST_NAME}"
+            )
+
+        path = self.directory / entry["file"]
+        if not path.exists():
+            raise ModelRegistryError(f"Weights for model {name!r} not found at {path}")
+
+        checksum = file_checksum(path)
+        if checksum != entry["sha256"]:
+            raise ModelRegistryError(
+                f"Checksum mismatch for model {name!r}: expected {entry['sha256']}, got {checksum}"
+            )
+
+        # Never let ultralytics reach out for weights or update checks
+        os.environ.setdefault("YOLO_OFFLINE", "1")
+        threads = settings.PARKING_INFERENCE_THREADS
+        limit_threads(threads)
+
+        backend = entry.get("backend", "torch")
+        # Exports may take a fixed batch and size only, reading it also checks
+        # their runtime is installed before anything loads
+        shape = exported_input_shape(path, backend)
+
+        import torch
+        from ultralytics import YOLO
+
+        if threads:
+            torch.set_num_threads(threads)
+
+        device = inference_device(backend, torch.cuda.is_available())
+        model = YOLO(str(path), task="detect")
+        if backend == "torch":
+            model.fuse()
+            model.to(device)
+
+        self._warm_up(model, shape)
+        if backend == "onnx" and threads:
+            self._limit_onnx_threads(model, path, threads, shape)
+
+        logger.info(f"Loaded model {name} {entry['version']} ({backend}) on {device}")
+
+        return SharedModel(name, entry["version"], model)
+
+    @staticmethod
+    def _limit_onnx_threads(model, path, threads, shape=None):
+        """Recreate the ONNX Runtime session with a bounded intra-op pool"""
+        onnxruntime = import_runtime("onnxruntime")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+
+        backend = model.predictor.model
+        backend.session = onnxruntime.InferenceSession(
+            str(path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        ModelRegistry._warm_up(model, shape)
+
+    @staticmethod
+    def _warm_up(model, shape=None):
+        """Run a dummy batch so the first real frame doesn't pay for setup"""
+        batch, size = warmup_shape(shape)
+        model([np.zeros((size, size, 3), dtype=np.uint8)] * batch, verbose=False, imgsz=size)
+
+
+def limit_threads(threads):
+    """Bound the OpenMP pools used by torch and OpenMP builds of the runtimes
+
+    Only takes effect before they are imported, an explicit OMP_NUM_THREADS wins.
+    """
+    if threads:
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+
+
+def inference_device(backend, cuda_available):
+    """Device a model runs on, exported models always run on the CPU runtimes"""
+    if backend != "torch":
+        return "cpu"
+    return os.getenv("PYTORCH_DEVICE") or ("cuda" if cuda_available else "cpu")
+
+
+def import_runtime(module):
+    """A CPU runtime of the cpu-runtimes extra, ModelRegistryError when it is missing"""
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ModelRegistryError(
+            f"{module} is not installed, install the cpu-runtimes extra for exported models"
+        ) from e
+
+
+def exported_input_shape(path, backend):
+    """Input shape (batch, channels, height, width) of an exported model, None for PyTorch
+
+    Dynamic dimensions are None.
+    """
+    if backend == "onnx":
+        onnxruntime = import_runtime("onnxruntime")
+        session = onnxruntime.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        shape = session.get_inputs()[0].shape
+    elif backend == "openvino":
+        openvino = import_runtime("openvino")
+        model = openvino.Core().read_model(next(Path(path).glob("*.xml")))
+        shape = [
+            dimension.get_length() if dimension.is_static else None
+            for dimension in model.inputs[0].get_partial_shape()
+        ]
+    else:
+        return None
+    return [dimension if isinstance(dimension, int) and dimension > 0 else None for dimension in shape]
+
+
+def warmup_shape(shape):
+    """Batch and square size to warm a model up with, within what its input allows"""
+    if shape is None or len(shape) != 4:
+        return WARMUP_BATCH, WARMUP_SIZE
+    batch, _, height, width = shape
+    size = height or width or WARMUP_SIZE
+    return batch or WARMUP_BATCH, size
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of a file, or of every file of a directory in name order"""
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+
+    digest = hashlib.sha256()
+    for file_path in files:
+        if path.is_dir():
+            digest.update(str(file_path.relative_to(path)).encode())
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
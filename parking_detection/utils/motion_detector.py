@@ -1,32 +1,88 @@
 import cv2 as open_cv
 import numpy as np
-from utils.drawing import draw_contours
-from shared.colors import Color
+from django.conf import settings
+from utils.drawing import draw_statuses
 from shared.statuses import ParkingStatus
-from ultralytics import YOLO
-import torch
+from .classifiers import LAPLACIAN, VEHICLE_CLASSES, HybridClassifier
+from .pipeline import SlotPool, drain, get_next, put_latest
+from .frame_ring import SharedFrameRing, ring_size
+from .geometry import SpaceGeometry
+from .metrics import DetectorMetrics
+from .profiler import frame_trace_logger
+import itertools
+import logging
+import queue
 import threading
 import time
 
+logger = logging.getLogger(__name__)
+
+# Process-wide, so a restarted detector never reuses a version of the old one
+FRAME_VERSIONS = itertools.count(1)
+
 
 class MotionDetector:
-    LAPLACIAN = 1.2
+    LAPLACIAN = LAPLACIAN
     DETECT_DELAY = 1
-
-    def __init__(self, video, coordinates, start_frame):
+    VEHICLE_CLASSES = VEHICLE_CLASSES
+    FRAME_STRIDE = 3  # analyse every third frame when no scheduler is set
+    DEFAULT_FPS = 25
+    QUEUE_SIZE = 2
+    # Frames alive at once: one per stage, the queues and the published frame
+    POOL_SIZE = 2 * QUEUE_SIZE + 4
+    # Fewest the stages run with, the queues then drop more frames
+    MIN_POOL_SIZE = 4
+    # Every pooled frame may pin a ring slot, the decoder needs a spare one
+    SPARE_SLOTS = 2
+    # Frames in a row the classifier may fail on before the detector gives up
+    MAX_CONSECUTIVE_ERRORS = 5
+    FPS_SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        video,
+        coordinates,
+        start_frame,
+        model_name=None,
+        classifier=None,
+        scheduler=None,
+        schedule_key=None,
+        initial_statuses=None,
+    ):
         self.video = video
         self.coordinates_data = coordinates
         self.start_frame = start_frame
-        self.contours = []
-        self.bounds = []
-        self.mask = []
+        self.geometry = None
         self.current_frame = None
+        # Bumped whenever current_frame changes, None until the first frame
+        self.frame_version = None
         self.running = True
         self.callback = None
+        # Called with (space ID, status, wall-clock time) on every committed change
+        self.on_transition = None
         self.current_statuses = None
-        # Dynamically set device based on CUDA availability
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.yolo = YOLO("yolov8n.pt").to(device)
+        self.classifier = classifier or HybridClassifier(model_name)
+        self.scheduler = scheduler
+        self.schedule_key = schedule_key
+        self.threads = []
+        self.ring = None
+        self.ring_lock = threading.Lock()
+        # Space ID -> (status value, wall-clock time it was committed)
+        self.initial_statuses = initial_statuses or {}
+        self.changed_at = None
+
+        self.metrics = None
+        self.trace = None
+        self.decode_time = 0.0
+        # Preprocessing buffers of analyze_frame
+        self.blurred = None
+        self.grayed = None
+
+        # Health, watched by the detector supervisor
+        self.heartbeat = time.monotonic()
+        self.fps = 0.0
+        self.errors = 0
+        self.failure = None
 
     def detect_motion_headless(self, callback=None):
         """Run detection in background without UI display, for server usage"""
@@ -36,131 +92,365 @@ class MotionDetector:
         # Initialize contours, bounds, and masks
         self._initialize_detection()
 
-        # Start detection in a separate thread
-        threading.Thread(target=self._detection_loop, daemon=True).start()
+        # Decode, preprocess and classify in separate threads, so decoding
+        # overlaps with inference (OpenCV and torch release the GIL)
+        self.pool = None  # sized with the frame ring by the decoder
+        self.decoded = queue.Queue(MotionDetector.QUEUE_SIZE)
+        self.prepared = queue.Queue(MotionDetector.QUEUE_SIZE)
+        self.metrics = DetectorMetrics(self.schedule_key or self.video)
+        self.metrics.track_queues(decoded=self.decoded, prepared=self.prepared)
+        self.classifier.observe = self.metrics.observe
+        self.trace = frame_trace_logger()
+        self.heartbeat = time.monotonic()
+        self.threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(stage,),
+                name=f"{stage.__name__.strip('_')}:{self.schedule_key or self.video}",
+                daemon=True,
+            )
+            for stage in (self._decode_stage, self._preprocess_stage, self._detection_loop)
+        ]
+        for thread in self.threads:
+            thread.start()
 
         return self.current_statuses
 
     def stop_detection(self):
         """Stop the running detection"""
         self.running = False
+        for thread in self.threads:
+            thread.join(timeout=1)
+        if any(thread.is_alive() for thread in self.threads):
+            # Still inside a slow read or inference, the last stage out releases the ring
+            logger.warning(f"Detector for {self.video} is still stopping, leaving it the frame ring")
+        else:
+            self._release_ring()
+        if self.metrics is not None:
+            self.metrics.remove()
 
     def _initialize_detection(self):
         """Initialize detection parameters"""
-        coordinates_data = self.coordinates_data
-        for p in coordinates_data:
-            coordinates = self._coordinates(p)
-            rect = open_cv.boundingRect(coordinates)
-
-            new_coordinates = coordinates.copy()
-            new_coordinates[:, 0] = coordinates[:, 0] - rect[0]
-            new_coordinates[:, 1] = coordinates[:, 1] - rect[1]
-
-            self.contours.append(coordinates)
-            self.bounds.append(rect)
-
-            mask = open_cv.drawContours(
-                np.zeros((rect[3], rect[2]), dtype=np.uint8),
-                [new_coordinates],
-                contourIdx=-1,
-                color=255,
-                thickness=-1,
-                lineType=open_cv.LINE_8,
+        if isinstance(self.coordinates_data, SpaceGeometry):
+            # Compiled ahead, usually memory-mapped from the geometry cache
+            self.geometry = self.coordinates_data
+        else:
+            self.geometry = SpaceGeometry.from_coordinates(self.coordinates_data)
+        self.classifier.prepare(self.geometry)
+
+        # Initialize statuses array, resuming from a checkpoint when there is one
+        self.current_statuses = [ParkingStatus.NOT_DETERMINED] * len(self.geometry)
+        self.times = [None] * len(self.geometry)
+        self.changed_at = [None] * len(self.geometry)
+        for index, space_id in enumerate(self.geometry.ids.tolist()):
+            if space_id in self.initial_statuses:
+                status, changed_at = self.initial_statuses[space_id]
+                self.current_statuses[index] = ParkingStatus(status)
+                self.changed_at[index] = changed_at
+
+    def is_alive(self):
+        """Whether every pipeline stage is still running"""
+        return bool(self.threads) and all(thread.is_alive() for thread in self.threads)
+
+    def checkpoint(self):
+        """Debounced status of every space, by space ID, to resume from"""
+        if self.geometry is None or self.current_statuses is None:
+            return {}
+        return {
+            space_id: (status.value, changed_at)
+            for space_id, status, changed_at in zip(
+                self.geometry.ids.tolist(), self.current_statuses, self.changed_at
             )
+            if status != ParkingStatus.NOT_DETERMINED
+        }
 
-            mask = mask == 255
-            self.mask.append(mask)
+    @staticmethod
+    def preprocess(frame, blurred=None, grayed=None):
+        """Blurred grayscale frame the classifiers work on
 
-        # Initialize statuses array
-        self.current_statuses = [ParkingStatus.NOT_DETERMINED] * len(coordinates_data)
+        Pass `blurred` and `grayed` buffers to reuse them across frames.
+        """
+        blurred = open_cv.GaussianBlur(frame, (5, 5), 3, dst=blurred)
+        return open_cv.cvtColor(blurred, open_cv.COLOR_BGR2GRAY, dst=grayed)
 
-    def _detection_loop(self):
-        """Main detection loop running in background thread"""
-        capture = open_cv.VideoCapture(self.video)
+    def _debounce(self, new_statuses, position_in_seconds):
+        """Commit a status once it has held for DETECT_DELAY seconds"""
+        statuses = self.current_statuses
+        times = self.times
+
+        for index, status in enumerate(new_statuses):
+            if times[index] is not None and self.same_status(statuses, index, status):
+                times[index] = None
+                continue
+
+            if times[index] is not None and self.status_changed(statuses, index, status):
+                if position_in_seconds - times[index] >= MotionDetector.DETECT_DELAY:
+                    statuses[index] = status
+                    times[index] = None
+                    self.changed_at[index] = time.time()
+                    if self.on_transition is not None:
+                        self.on_transition(int(self.geometry.ids[index]), status, self.changed_at[index])
+                continue
+
+            if times[index] is None and self.status_changed(statuses, index, status):
+                times[index] = position_in_seconds
+
+        return statuses
+
+    def _restart_source(self, capture):
+        """Rewind the video and restart its real-time clock"""
         capture.set(open_cv.CAP_PROP_POS_FRAMES, self.start_frame)
+        self.source_started = time.monotonic()
+        self.frames_read = 0
 
-        coordinates_data = self.coordinates_data
-        statuses = self.current_statuses
-        times = [None] * len(coordinates_data)
+    def _read_frame(self, capture, image=None):
+        """Read the next frame to analyse
 
-        frame_index = 0
-        while capture.isOpened() and self.running:
+        With a scheduler the source plays in real time like a live camera,
+        frames produced while waiting for the next slot are skipped.
+        """
+        if self.scheduler is None:
+            # Sleep briefly to avoid hogging CPU
+            time.sleep(0.01)
+            skipped = MotionDetector.FRAME_STRIDE - 1
+        else:
+            if not self.scheduler.wait(self.schedule_key, lambda: self.running):
+                return False, None
+            produced = int((time.monotonic() - self.source_started) * self.source_fps)
+            skipped = max(produced - self.frames_read - 1, 0)
+            self.frames_read += skipped + 1
+
+        started = time.perf_counter()
+        for _ in range(skipped):
+            capture.grab()
+        result = capture.read(image)
+        self.decode_time = time.perf_counter() - started
+
+        if self.metrics is not None:
+            self.metrics.observe("decode", self.decode_time)
+            self.metrics.count("skipped", skipped)
+            self.metrics.count("read")
+        return result
+
+    def _is_running(self):
+        return self.running
+
+    def _run_stage(self, stage):
+        """Run a pipeline stage, a crash stops the whole detector for the supervisor"""
+        try:
+            stage()
+        except Exception as e:
+            self.errors += 1
+            self.failure = f"{stage.__name__}: {e}"
+            logger.exception(f"Detector for {self.video} failed in {stage.__name__}")
+            self.running = False
+        finally:
+            current = threading.current_thread()
+            if not self.running and not any(
+                thread.is_alive() for thread in self.threads if thread is not current
+            ):
+                self._release_ring()
+
+    def _release_ring(self):
+        """Free the frame ring once no stage uses it, only ever once"""
+        with self.ring_lock:
+            ring, self.ring = self.ring, None
+        if ring is not None:
+            ring.release()
+
+    def _open_ring(self, capture):
+        """Allocate the shared frame ring for the source's frame size, and its pool
+
+        The ring holds as many frames as fit PARKING_FRAME_RING_MB, fewer
+        frames in flight only means more dropped ones.
+        """
+        height = int(capture.get(open_cv.CAP_PROP_FRAME_HEIGHT))
+        width = int(capture.get(open_cv.CAP_PROP_FRAME_WIDTH))
+        if not (height and width):
+            # Some streams only tell their size by sending a frame
             result, frame = capture.read()
-            frame_index += 1
+            if not result:
+                return None
+            height, width = frame.shape[:2]
+
+        shape = (height, width, 3)
+        budget = settings.PARKING_FRAME_RING_MB * 2**20
+        pool_size = MotionDetector.pool_size(shape, budget)
+        slots = pool_size + MotionDetector.SPARE_SLOTS
+        if ring_size(shape, slots, pool_size) > budget:
+            logger.warning(
+                f"The {width}x{height} frame ring of {self.video} needs "
+                f"{ring_size(shape, slots, pool_size) / 2**20:.0f} MB, over PARKING_FRAME_RING_MB"
+            )
+        self.pool = SlotPool(pool_size)
+        return SharedFrameRing.create(shape, slots, pool_size)
 
-            if frame_index % 3 != 0:
-                continue
+    @staticmethod
+    def pool_size(shape, budget):
+        """Frames in flight whose ring fits `budget` bytes, within what the stages need"""
+        fitting = budget // int(np.prod(shape)) - MotionDetector.SPARE_SLOTS
+        return int(max(MotionDetector.MIN_POOL_SIZE, min(MotionDetector.POOL_SIZE, fitting)))
+
+    def _dropped(self, slot):
+        """A frame a later stage had no time for"""
+        self.metrics.count("dropped")
+        self._drop(slot)
+
+    def _drop(self, slot):
+        """Unpin a slot's frame and return the slot to the pool"""
+        if slot is not None:
+            ring = self.ring
+            if ring is not None:
+                ring.unpin(slot.pin)
+            slot.pin = None
+            self.pool.release(slot)
+
+    def _decode_stage(self):
+        """Decode frames in place into the shared ring as analysis slots come up"""
+        capture = open_cv.VideoCapture(self.video)
+        self.source_fps = capture.get(open_cv.CAP_PROP_FPS) or MotionDetector.DEFAULT_FPS
+        self.ring = self._open_ring(capture)
+        self._restart_source(capture)
+
+        while self.ring is not None and capture.isOpened() and self.running:
+            slot = self.pool.acquire(self._is_running)
+            if slot is None:
+                break
+
+            index, view = self.ring.begin_write()
+            result, frame = self._read_frame(capture, view)
+            if not self.running:
+                self.pool.release(slot)
+                break
 
             if frame is None or not result:
                 # If we reach the end of video, loop back to start
-                capture.set(open_cv.CAP_PROP_POS_FRAMES, self.start_frame)
+                self.pool.release(slot)
+                self._restart_source(capture)
                 continue
 
-            self.current_frame = frame.copy()
-            blurred = open_cv.GaussianBlur(frame.copy(), (5, 5), 3)
-            grayed = open_cv.cvtColor(blurred, open_cv.COLOR_BGR2GRAY)
-            position_in_seconds = capture.get(open_cv.CAP_PROP_POS_MSEC) / 1000.0
+            if frame is not view:
+                # The source changed size, keep what fits the ring
+                open_cv.resize(frame, (view.shape[1], view.shape[0]), dst=view)
 
-            # Process each parking space
-            for index, c in enumerate(coordinates_data):
-                status = self.__apply(grayed, index, c)
+            if self.scheduler is not None:
+                self.scheduler.started(self.schedule_key)
 
-                if times[index] is not None and self.same_status(statuses, index, status):
-                    times[index] = None
-                    continue
+            sequence = self.ring.commit(index, capture.get(open_cv.CAP_PROP_POS_MSEC) / 1000.0)
+            pinned = self.ring.pin(sequence)
+            if pinned is None:
+                self.pool.release(slot)
+                continue
+
+            slot.pin, slot.frame, slot.position = pinned
+            slot.sequence = sequence
+            slot.decode_time = self.decode_time
+            put_latest(self.decoded, slot, self._dropped)
+
+        capture.release()
+        drain(self.decoded, self._drop)
+
+    def _preprocess_stage(self):
+        """Blur and gray frames into the slot's reusable buffers"""
+        while self.running:
+            slot = get_next(self.decoded, self._is_running)
+            if slot is None:
+                break
+
+            started = time.perf_counter()
+            slot.ensure_buffers()
+            self.preprocess(slot.frame, slot.blurred, slot.grayed)
+            slot.preprocess_time = time.perf_counter() - started
+            self.metrics.observe("preprocess", slot.preprocess_time)
+            put_latest(self.prepared, slot, self._dropped)
+
+        drain(self.prepared, self._drop)
 
-                if times[index] is not None and self.status_changed(statuses, index, status):
-                    if position_in_seconds - times[index] >= MotionDetector.DETECT_DELAY:
-                        statuses[index] = status
-                        times[index] = None
-                    continue
+    def _detection_loop(self):
+        """Classification stage, classify, debounce and publish statuses"""
+        self.classifier.load()
+
+        previous = list(self.current_statuses)
+        published = None
+        consecutive_errors = 0
+        last_analysis = None
 
-                if times[index] is None and self.status_changed(statuses, index, status):
-                    times[index] = position_in_seconds
+        while self.running:
+            slot = get_next(self.prepared, self._is_running)
+            if slot is None:
+                break
+
+            started = time.perf_counter()
+
+            # The slot stays pinned while it is the published frame, readers
+            # copying it check the version did not move on meanwhile
+            self.current_frame = slot.frame
+            self.frame_version = next(FRAME_VERSIONS)
+            self._drop(published)
+            published = slot
+
+            # Classify every parking space, then debounce the changes
+            try:
+                classified = self.__apply(slot.grayed)
+            except Exception as e:
+                self.errors += 1
+                consecutive_errors += 1
+                if consecutive_errors >= MotionDetector.MAX_CONSECUTIVE_ERRORS:
+                    raise
+                logger.warning(f"Skipping frame of {self.video} after classifier error: {e}")
+                continue
+            consecutive_errors = 0
+            classified_at = time.perf_counter()
+            statuses = self._debounce(classified, slot.position)
 
             # Update current statuses
             self.current_statuses = statuses
+            debounced_at = time.perf_counter()
 
             # Call the callback if provided
             if self.callback:
                 self.callback(statuses)
 
-            # Sleep briefly to avoid hogging CPU
-            time.sleep(0.01)
+            finished_at = time.perf_counter()
+            metrics = self.metrics
+            metrics.observe("classify", classified_at - started)
+            metrics.observe("debounce", debounced_at - classified_at)
+            metrics.observe("callback", finished_at - debounced_at)
+            metrics.count("analysed")
+
+            if self.trace is not None:
+                self.trace.info(
+                    f"{metrics.detector} frame={slot.sequence} position={slot.position:.3f} "
+                    f"decode={slot.decode_time * 1000:.2f}ms "
+                    f"preprocess={slot.preprocess_time * 1000:.2f}ms "
+                    f"classify={(classified_at - started) * 1000:.2f}ms "
+                    f"debounce={(debounced_at - classified_at) * 1000:.2f}ms "
+                    f"callback={(finished_at - debounced_at) * 1000:.2f}ms"
+                )
 
-        capture.release()
+            if self.scheduler is not None:
+                churn = sum(a != b for a, b in zip(classified, previous)) / max(len(classified), 1)
+                self.scheduler.finished(self.schedule_key, churn, time.perf_counter() - started)
+            previous = classified
+
+            now = time.monotonic()
+            if last_analysis is not None:
+                rate = 1.0 / max(now - last_analysis, 1e-6)
+                self.fps += MotionDetector.FPS_SMOOTHING * (rate - self.fps)
+            last_analysis = self.heartbeat = now
+
+        self._drop(published)
 
     def detect_motion(self):
         """Original method with UI display, kept for compatibility"""
+        self._initialize_detection()
+        self.classifier.load()
+
         capture = open_cv.VideoCapture(self.video)
         capture.set(open_cv.CAP_PROP_POS_FRAMES, self.start_frame)
 
-        coordinates_data = self.coordinates_data
-        for p in coordinates_data:
-            coordinates = self._coordinates(p)
-            rect = open_cv.boundingRect(coordinates)
-
-            new_coordinates = coordinates.copy()
-            new_coordinates[:, 0] = coordinates[:, 0] - rect[0]
-            new_coordinates[:, 1] = coordinates[:, 1] - rect[1]
-
-            self.contours.append(coordinates)
-            self.bounds.append(rect)
-
-            mask = open_cv.drawContours(
-                np.zeros((rect[3], rect[2]), dtype=np.uint8),
-                [new_coordinates],
-                contourIdx=-1,
-                color=255,
-                thickness=-1,
-                lineType=open_cv.LINE_8,
-            )
-
-            mask = mask == 255
-            self.mask.append(mask)
-
-        statuses = [ParkingStatus.NOT_DETERMINED] * len(coordinates_data)
-        times = [None] * len(coordinates_data)
+        geometry = self.geometry
+        blurred = grayed = None
 
         frame_index = 0
         while capture.isOpened():
@@ -175,51 +465,18 @@ class MotionDetector:
             if not result:
                 raise CaptureReadError("Error reading video capture on frame")
 
-            self.current_frame = frame.copy()
-            blurred = open_cv.GaussianBlur(frame.copy(), (5, 5), 3)
-            grayed = open_cv.cvtColor(blurred, open_cv.COLOR_BGR2GRAY)
-            new_frame = frame.copy()
+            self.current_frame = frame
+            if blurred is None or blurred.shape != frame.shape:
+                blurred, grayed = frame.copy(), frame[:, :, 0].copy()
+            self.preprocess(frame, blurred, grayed)
             position_in_seconds = capture.get(open_cv.CAP_PROP_POS_MSEC) / 1000.0
 
-            for index, c in enumerate(coordinates_data):
-                status = self.__apply(grayed, index, c)
+            statuses = self._debounce(self.__apply(grayed), position_in_seconds)
 
-                if times[index] is not None and self.same_status(
-                    statuses, index, status
-                ):
-                    times[index] = None
-                    continue
-
-                if times[index] is not None and self.status_changed(
-                    statuses, index, status
-                ):
-                    if (
-                        position_in_seconds - times[index]
-                        >= MotionDetector.DETECT_DELAY
-                    ):
-                        statuses[index] = status
-                        times[index] = None
-                    continue
-
-                if times[index] is None and self.status_changed(
-                    statuses, index, status
-                ):
-                    times[index] = position_in_seconds
-
-            for index, p in enumerate(coordinates_data):
-                coordinates = self._coordinates(p)
-                status = statuses[index]
-                color = Color.YELLOW
-                if status == ParkingStatus.FREE:
-                    color = Color.COLOR_GREEN
-                elif status == ParkingStatus.OCCUPIED:
-                    color = Color.COLOR_RED
-
-                draw_contours(
-                    new_frame, coordinates, str(p["id"] + 1), Color.WHITE, color
-                )
+            # Classification is done, so the overlay can go on the frame itself
+            draw_statuses(frame, geometry, statuses)
 
-            open_cv.imshow(str(self.video), new_frame)
+            open_cv.imshow(str(self.video), frame)
             k = open_cv.waitKey(1)
             if k == ord("q"):
                 break
@@ -227,42 +484,42 @@ class MotionDetector:
         capture.release()
         open_cv.destroyAllWindows()
 
+    def analyze_frame(self, frame, position_in_seconds, observe=None):
+        """Classify and debounce one frame synchronously, without any threads
+
+        For offline analysis and benchmarks. The first call sets the
+        detector up. `observe(stage, seconds)` gets the preprocess, classify
+        and debounce times when given. Returns the debounced statuses.
+        """
+        if self.geometry is None:
+            self._initialize_detection()
+            self.classifier.load()
+        if self.blurred is None or self.blurred.shape != frame.shape:
+            self.blurred, self.grayed = frame.copy(), frame[:, :, 0].copy()
+
+        started = time.perf_counter()
+        self.current_frame = frame
+        self.frame_version = next(FRAME_VERSIONS)
+        self.preprocess(frame, self.blurred, self.grayed)
+        preprocessed_at = time.perf_counter()
+        classified = self.__apply(self.grayed)
+        classified_at = time.perf_counter()
+        statuses = self._debounce(classified, position_in_seconds)
+
+        if observe is not None:
+            observe("preprocess", preprocessed_at - started)
+            observe("classify", classified_at - preprocessed_at)
+            observe("debounce", time.perf_counter() - classified_at)
+        return statuses
+
     def get_parking_status(self):
         """Get the current status of all parking spaces"""
         if self.current_statuses is None:
             return []
         return self.current_statuses
 
-    def __apply(self, grayed, index, p):
-        coordinates = self._coordinates(p)
-        rect = self.bounds[index]
-
-        roi_gray = grayed[rect[1] : (rect[1] + rect[3]), rect[0] : (rect[0] + rect[2])]
-        laplacian = open_cv.Laplacian(roi_gray, open_cv.CV_64F)
-
-        coordinates[:, 0] = coordinates[:, 0] - rect[0]
-        coordinates[:, 1] = coordinates[:, 1] - rect[1]
-
-        laplacian_status = (
-            np.mean(np.abs(laplacian * self.mask[index])) < MotionDetector.LAPLACIAN
-        )
-
-        roi_color = self.current_frame[
-            rect[1] : (rect[1] + rect[3]), rect[0] : (rect[0] + rect[2])
-        ]
-        results = self.yolo(roi_color, verbose=False)[0]
-
-        vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
-        vehicle_found = any(
-            int(cls.item()) in vehicle_classes for cls in results.boxes.cls
-        )
-
-        if not laplacian_status and vehicle_found:
-            return ParkingStatus.OCCUPIED
-        elif not laplacian_status or vehicle_found:
-            return ParkingStatus.NOT_DETERMINED
-        else:
-            return ParkingStatus.FREE
+    def __apply(self, grayed):
+        return self.classifier.classify(self.current_frame, grayed)
 
     @staticmethod
     def _coordinates(p):
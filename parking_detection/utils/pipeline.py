@@ -0,0 +1,91 @@
+import queue
+
+WAIT_STEP = 0.1
+
+
+class FrameSlot:
+    """Reusable buffers for one frame travelling through the pipeline"""
+
+    __slots__ = (
+        "blurred",
+        "decode_time",
+        "frame",
+        "grayed",
+        "pin",
+        "position",
+        "preprocess_time",
+        "sequence"
+    )
+
+    def __init__(self):
+        self.frame = None
+        self.blurred = None
+        self.grayed = None
+        self.position = 0.0
+        self.sequence = 0
+        self.pin = None
+        # Seconds the earlier stages spent on this frame
+        self.decode_time = 0.0
+        self.preprocess_time = 0.0
+
+    def ensure_buffers(self):
+        """(Re)allocate the preprocessing buffers when the frame size changes"""
+        shape = self.frame.shape
+        if self.blurred is None or self.blurred.shape != shape:
+            self.blurred = self.frame.copy()
+            self.grayed = self.frame[:, :, 0].copy()
+
+
+class SlotPool:
+    """Fixed set of frame slots handed out and returned by the stages"""
+
+    def __init__(self, size):
+        self.size = size
+        self.free = queue.Queue()
+        for _ in range(size):
+            self.free.put(FrameSlot())
+
+    def acquire(self, running):
+        """Wait for a free slot, returns None once stopped"""
+        while running():
+            try:
+                return self.free.get(timeout=WAIT_STEP)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, slot):
+        if slot is not None:
+            self.free.put(slot)
+
+
+def put_latest(stage_queue, item, on_drop):
+    """Put into a bounded queue, dropping the oldest item when it is full"""
+    while True:
+        try:
+            stage_queue.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                on_drop(stage_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+
+def get_next(stage_queue, running):
+    """Wait for the next item of a stage queue, returns None once stopped"""
+    while running():
+        try:
+            return stage_queue.get(timeout=WAIT_STEP)
+        except queue.Empty:
+            continue
+    return None
+
+
+def drain(stage_queue, on_drop):
+    """Empty a stage queue, returning its items to the pool"""
+    while True:
+        try:
+            on_drop(stage_queue.get_nowait())
+        except queue.Empty:
+            return
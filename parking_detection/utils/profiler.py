@@ -0,0 +1,153 @@
+import collections
+import datetime
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import ProfileCapture
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005  # seconds between two samples of the detector threads
+MAX_SECONDS = 60
+MAX_DEPTH = 128
+
+
+def sample_stacks(threads, seconds, interval=SAMPLE_INTERVAL):
+    """Sample the Python stacks of some threads, counted by collapsed stack
+
+    Every sample walks the current frame of each thread, which costs tens
+    of microseconds while holding the GIL, so the overhead stays bounded by
+    the interval whatever the threads are doing. Returns a Counter of
+    "thread;module:function:line;..." stacks, root first.
+    """
+    names = {thread.ident: thread.name for thread in threads if thread.ident is not None}
+    counts = collections.Counter()
+    deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+
+    while time.monotonic() < deadline and names:
+        frames = sys._current_frames()
+        for ident, name in names.items():
+            frame = frames.get(ident)
+            if frame is not None:
+                counts[collapse_frame(name, frame)] += 1
+        del frames
+        time.sleep(interval)
+    return counts
+
+
+def collapse_frame(thread_name, frame):
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", code.co_filename)
+        stack.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    stack.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(stack))
+
+
+def folded(counts):
+    """Collapsed-stack text, the input of flamegraph.pl, speedscope and friends"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def run_pending_captures(manager):
+    """Start the captures requested for lots this process runs, called by the supervisor"""
+    pending = ProfileCapture.objects.filter(
+        status=ProfileCapture.PENDING, parking_lot_id__in=list(manager.cameras)
+    )
+    for capture in pending:
+        # Claim it, other processes only see it running
+        claimed = ProfileCapture.objects.filter(
+            id=capture.id, status=ProfileCapture.PENDING
+        ).update(status=ProfileCapture.RUNNING)
+        if claimed:
+            threading.Thread(target=_capture, args=(manager, capture), daemon=True).start()
+
+
+def _capture(manager, capture):
+    threads = [
+        thread
+        for key, _ in manager.cameras.get(capture.parking_lot_id, [])
+        if key in manager.detectors
+        for thread in manager.detectors[key].threads
+    ]
+    try:
+        counts = sample_stacks(threads, capture.seconds)
+        capture.stacks = folded(counts)
+        capture.status = ProfileCapture.DONE
+        logger.info(f"Captured {sum(counts.values())} samples for parking lot {capture.parking_lot_id}")
+    except Exception as e:
+        capture.status = ProfileCapture.FAILED
+        capture.stacks = str(e)
+        logger.error(f"Error profiling parking lot {capture.parking_lot_id}: {e}")
+
+    capture.completed_at = timezone.now()
+    capture.save(update_fields=["status", "stacks", "completed_at"])
+
+
+def request_capture(lot, seconds):
+    """Ask the process running a lot for a profile, returns the pending capture
+
+    The lot's worker picks the request up within a supervisor round, poll
+    the capture with refresh_capture() or wait_for_capture().
+    """
+    seconds = max(1, min(int(seconds), MAX_SECONDS))
+    return ProfileCapture.objects.create(parking_lot=lot, seconds=seconds)
+
+
+def refresh_capture(capture, pickup_timeout=None):
+    """Reload a capture, failing it when its worker did not answer in time
+
+    A capture must be picked up within `pickup_timeout`, the lease TTL by
+    default, and then takes its seconds.
+    """
+    capture.refresh_from_db()
+    pickup = datetime.timedelta(seconds=capture.seconds + (pickup_timeout or settings.PARKING_LEASE_TTL))
+    now = timezone.now()
+    # Make sure nobody runs it late
+    if capture.status == ProfileCapture.PENDING and now > capture.requested_at + pickup:
+        error = "No detector process picked the capture up"
+    elif capture.status == ProfileCapture.RUNNING and now > capture.requested_at + pickup * 2:
+        error = "The detector process stopped answering during the capture"
+    else:
+        return capture
+
+    ProfileCapture.objects.filter(id=capture.id, status=capture.status).update(
+        status=ProfileCapture.FAILED, stacks=error, completed_at=now
+    )
+    capture.refresh_from_db()
+    return capture
+
+
+def wait_for_capture(capture, pickup_timeout=None, poll=0.5):
+    """Poll a capture until it is done or failed"""
+    while capture.status not in (ProfileCapture.DONE, ProfileCapture.FAILED):
+        time.sleep(poll)
+        refresh_capture(capture, pickup_timeout)
+    return capture
+
+
+def frame_trace_logger():
+    """Logger writing one line per analysed frame to a rotating file, None when disabled"""
+    if not settings.PARKING_FRAME_TRACE:
+        return None
+
+    trace = logging.getLogger("parking_detection.frame_trace")
+    if not trace.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            settings.PARKING_FRAME_TRACE,
+            maxBytes=settings.PARKING_FRAME_TRACE_BYTES,
+            backupCount=settings.PARKING_FRAME_TRACE_BACKUPS,
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        trace.addHandler(handler)
+        trace.setLevel(logging.INFO)
+        trace.propagate = False
+    return trace
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LotSchedule:
+    """Scheduling state of one detector"""
+
+    __slots__ = (
+        "achieved_rate",
+        "analyses",
+        "churn",
+        "cost",
+        "lag",
+        "last_started",
+        "max_rate",
+        "max_staleness",
+        "next_due",
+        "priority",
+        "target_rate",
+    )
+
+    def __init__(self, priority, max_staleness, max_rate, default_cost):
+        self.priority = priority
+        self.max_staleness = max_staleness
+        self.max_rate = max_rate
+        self.target_rate = 1.0 / max_staleness
+        self.next_due = time.monotonic()
+        self.last_started = None
+        self.churn = 0.0
+        self.cost = default_cost
+        self.achieved_rate = 0.0
+        self.lag = 0.0
+        self.analyses = 0
+
+
+class AnalysisScheduler:
+    """Spreads a global CPU budget over the detectors of all lots
+
+    Every lot gets at least the rate its freshness requires (one analysis per
+    `max_staleness` seconds). The rest of the budget goes to lots in
+    proportion to their priority and recent churn, so busy lots are analysed
+    more often than idle ones. Rates are expressed in analyses per second and
+    the budget in CPU seconds per second, using the measured cost of each
+    lot's analyses.
+    """
+
+    SMOOTHING = 0.2
+    CHURN_BASE = 0.05
+    DEFAULT_COST = 0.05  # seconds, until a lot has been measured
+    REBALANCE_INTERVAL = 1.0
+    WAIT_STEP = 0.1
+
+    def __init__(self, budget, max_rate):
+        self.budget = budget
+        self.max_rate = max_rate
+        self.lots = {}
+        self.lock = threading.Lock()
+        self.last_rebalance = 0.0
+        self.degraded = False
+
+    def register(self, key, priority=1, max_staleness=5.0, max_rate=None):
+        """Add a detector to the schedule"""
+        with self.lock:
+            self.lots[key] = LotSchedule(
+                max(priority, 0.01),
+                max(max_staleness, 0.01),
+                min(max_rate or self.max_rate, self.max_rate),
+                self.DEFAULT_COST,
+            )
+            self._rebalance()
+
+    def unregister(self, key):
+        with self.lock:
+            if self.lots.pop(key, None) is not None:
+                self._rebalance()
+
+    def wait(self, key, running=lambda: True):
+        """Block until the lot's next analysis slot, returns False if stopped"""
+        while running():
+            with self.lock:
+                schedule = self.lots.get(key)
+                if schedule is None:
+                    return False
+                remaining = schedule.next_due - time.monotonic()
+
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, self.WAIT_STEP))
+        return False
+
+    def started(self, key):
+        """Record the start of an analysis and book the next slot"""
+        now = time.monotonic()
+        with self.lock:
+            schedule = self.lots.get(key)
+            if schedule is None:
+                return
+
+            schedule.lag = self._smooth(schedule.lag, max(0.0, now - schedule.next_due))
+            if schedule.last_started is not None:
+                interval = max(now - schedule.last_started, 1e-6)
+                schedule.achieved_rate = self._smooth(schedule.achieved_rate, 1.0 / interval)
+
+            schedule.last_started = now
+            schedule.next_due = max(schedule.next_due + 1.0 / schedule.target_rate, now)
+
+    def finished(self, key, churn, cost):
+        """Feed back how much the lot changed and what the analysis cost"""
+        with self.lock:
+            schedule = self.lots.get(key)
+            if schedule is None:
+                return
+
+            schedule.churn = self._smooth(schedule.churn, churn)
+            schedule.cost = self._smooth(schedule.cost, cost)
+            schedule.analyses += 1
+
+            if time.monotonic() - self.last_rebalance >= self.REBALANCE_INTERVAL:
+                self._rebalance()
+
+    def stats(self):
+        """Target and achieved analysis rate of every lot"""
+        with self.lock:
+            return {
+                key: {
+                    "priority": schedule.priority,
+                    "max_staleness": schedule.max_staleness,
+                    "target_rate": schedule.target_rate,
+                    "achieved_rate": schedule.achieved_rate,
+                    "lag": schedule.lag,
+                    "churn": schedule.churn,
+                    "cost": schedule.cost,
+                    "analyses": schedule.analyses,
+                }
+                for key, schedule in self.lots.items()
+            }
+
+    def _rebalance(self):
+        """Recompute every lot's rate, the lock must be held"""
+        self.last_rebalance = time.monotonic()
+        if not self.lots:
+            return
+
+        schedules = self.lots.values()
+        floors = {id(s): min(1.0 / s.max_staleness, s.max_rate) for s in schedules}
+        floor_cost = sum(floors[id(s)] * s.cost for s in schedules)
+
+        if floor_cost >= self.budget:
+            # Not even freshness fits, degrade every lot by the same factor
+            scale = self.budget / floor_cost
+            if not self.degraded:
+                logger.warning(
+                    f"Analysis budget of {self.budget} CPU s/s can't keep "
+                    f"{len(self.lots)} lots fresh, running at {scale:.0%}"
+                )
+            self.degraded = True
+            for schedule in schedules:
+                schedule.target_rate = floors[id(schedule)] * scale
+            return
+
+        self.degraded = False
+        spare = self.budget - floor_cost
+        weights = {id(s): s.priority * (self.CHURN_BASE + s.churn) for s in schedules}
+        total_weight = sum(weights.values())
+
+        for schedule in schedules:
+            share = spare * weights[id(schedule)] / total_weight
+            rate = floors[id(schedule)] + share / schedule.cost
+            schedule.target_rate = min(rate, schedule.max_rate)
+
+    def _smooth(self, current, value):
+        return current + self.SMOOTHING * (value - current)
@@ -0,0 +1,137 @@
+import bisect
+import collections
+import threading
+
+import cv2 as open_cv
+
+from utils.drawing import draw_statuses
+
+JPEG_QUALITY = 80
+MIN_WIDTH = 16
+# Widths snapshots and streams are scaled to, requests are rounded up to
+# one of them so clients share encodes and the caches stay small
+WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+# Encoded snapshots kept, a few widths of every detector of the process
+MAX_ENTRIES = 64
+COPY_ATTEMPTS = 3
+
+
+class Snapshot:
+    """One encoded frame version of a detector"""
+
+    __slots__ = ("jpeg", "version", "width")
+
+    def __init__(self, version, width, jpeg):
+        self.version = version
+        self.width = width
+        self.jpeg = jpeg
+
+    @property
+    def etag(self):
+        return f'"{self.version}-{self.width}"'
+
+
+def snap_width(width):
+    """The smallest of WIDTHS at least `width` wide, None (full size) above them"""
+    if width is None:
+        return None
+    return WIDTHS[index] if (index := bisect.bisect_left(WIDTHS, width)) < len(WIDTHS) else None
+
+
+def frame_params(params):
+    """Camera, rounded width and since of a snapshot or stream query, raises ValueError"""
+    try:
+        width = int(params['width']) if 'width' in params else None
+        since = int(params['since']) if 'since' in params else None
+    except ValueError:
+        raise ValueError("width and since must be integers") from None
+    if width is not None and width < MIN_WIDTH:
+        raise ValueError(f"width must be at least {MIN_WIDTH}")
+    return params.get('camera'), snap_width(width), since
+
+
+def latest_frame(detector):
+    """Copy of a detector's latest frame, its statuses and its version
+
+    The frame is a ring slot the detector recycles once it moves on, so
+    the copy is retried if the version changed while copying. Returns
+    None before the first frame, or when the detector kept overwriting
+    the frame through every attempt, rather than a torn copy.
+    """
+    for _ in range(COPY_ATTEMPTS):
+        version = detector.frame_version
+        frame = detector.current_frame
+        if version is None or frame is None:
+            return None
+        copy = frame.copy()
+        statuses = list(detector.current_statuses)
+        if detector.frame_version == version:
+            return copy, statuses, version
+    return None
+
+
+def render(detector, width=None, quality=JPEG_QUALITY):
+    """Latest frame of a detector with its spaces outlined by status, as a JPEG"""
+    latest = latest_frame(detector)
+    if latest is None:
+        return None
+    frame, statuses, version = latest
+
+    draw_statuses(frame, detector.geometry, statuses)
+    height, full_width = frame.shape[:2]
+    if width and width < full_width:
+        frame = open_cv.resize(
+            frame, (width, max(1, round(height * width / full_width))), interpolation=open_cv.INTER_AREA
+        )
+    result, jpeg = open_cv.imencode(".jpg", frame, [open_cv.IMWRITE_JPEG_QUALITY, quality])
+    if not result:
+        return None
+    return Snapshot(version, frame.shape[1], jpeg.tobytes())
+
+
+class SnapshotCache:
+    """Annotated JPEGs of the detectors, encoded at most once per frame version
+
+    Concurrent requests for the same detector and width wait on one
+    encoder and share its result, so the cost does not grow with clients.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # (detector key, width) -> [lock, Snapshot or None], least recently used first
+        self.entries = collections.OrderedDict()
+        self.encodes = 0
+
+    def get(self, key, detector, width=None):
+        """Snapshot of a detector's latest frame, None before its first frame
+
+        The previous snapshot is returned when the new frame could not be copied.
+        """
+        with self.lock:
+            entry = self.entries.get((key, width))
+            if entry is None:
+                entry = self.entries[(key, width)] = [threading.Lock(), None]
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end((key, width))
+
+        with entry[0]:
+            snapshot = entry[1]
+            if snapshot is None or snapshot.version != detector.frame_version:
+                rendered = render(detector, width)
+                # Without an intact copy of the new frame the last one is served
+                if rendered is not None:
+                    snapshot = entry[1] = rendered
+                    self.encodes += 1
+            return snapshot
+
+    def discard(self, key):
+        """Forget the snapshots of a stopped detector"""
+        with self.lock:
+            for entry in [entry for entry in self.entries if entry[0] == key]:
+                del self.entries[entry]
+
+
+SNAPSHOTS = SnapshotCache()
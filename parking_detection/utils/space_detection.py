@@ -0,0 +1,285 @@
+import itertools
+import math
+
+import cv2 as open_cv
+import numpy as np
+
+CANNY_THRESHOLDS = (50, 150)
+HOUGH_VOTES = 30
+MIN_LINE_SHARE = 0.03  # shortest segment, as a share of the image's smaller side
+MERGE_SHARE = 0.006  # pieces this close, as a share of the smaller side, are one painted line
+MERGE_SLOPE = 0.1
+# Stall lines fan out under perspective, they may be this far off the lot's direction
+ANGLE_TOLERANCE = math.radians(30)
+CANDIDATE_DIRECTIONS = 3
+ROW_COVERAGE = 0.3  # lines side by side in a row, as a share of the busiest rows'
+# Width over depth of a space: between-space gaps are narrower, aisles wider
+MIN_ASPECT = 0.25
+MAX_ASPECT = 1.0
+
+
+class Line:
+    """A stall line segment in the lot's frame
+
+    `along` runs with the stall lines, `across` from one line to the next.
+    The segment spans [start, end] along and sits at `offset + slope * t`
+    across at position t.
+    """
+
+    __slots__ = ("end", "offset", "slope", "start")
+
+    def __init__(self, offset, slope, start, end):
+        self.offset = offset
+        self.slope = slope
+        self.start = start
+        self.end = end
+
+    @property
+    def length(self):
+        return self.end - self.start
+
+    def at(self, position):
+        return self.offset + self.slope * position
+
+    def overlap(self, start, end):
+        return min(self.end, end) - max(self.start, start)
+
+
+def find_segments(image):
+    """Line segments of an image as an N x 4 array of x1, y1, x2, y2"""
+    gray = image if image.ndim == 2 else open_cv.cvtColor(image, open_cv.COLOR_BGR2GRAY)
+    blurred = open_cv.GaussianBlur(gray, (5, 5), 0)
+    edges = open_cv.Canny(blurred, *CANNY_THRESHOLDS, apertureSize=3)
+
+    min_length = max(15, int(min(gray.shape) * MIN_LINE_SHARE))
+    segments = open_cv.HoughLinesP(
+        edges, 1, np.pi / 180, HOUGH_VOTES, minLineLength=min_length, maxLineGap=min_length // 3
+    )
+    if segments is None:
+        return np.empty((0, 4), dtype=np.float64)
+    return segments.reshape(-1, 4).astype(np.float64)
+
+
+def candidate_directions(segments, count=CANDIDATE_DIRECTIONS):
+    """The strongest segment directions in [0, pi), weighted by length
+
+    Peaks are at least twice the tolerance apart, so the stall lines and
+    the aisle lines across them come out as different candidates.
+    """
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    angles = np.mod(np.arctan2(dy, dx), np.pi)
+    histogram, _ = np.histogram(angles, bins=180, range=(0, np.pi), weights=np.hypot(dx, dy))
+    # Votes within 5 degrees add up, wrapping around pi
+    window = np.ones(11)
+    smoothed = np.convolve(np.concatenate([histogram[-5:], histogram, histogram[:5]]), window, "valid")
+
+    lengths = np.hypot(dx, dy)
+    directions = []
+    blocked = np.zeros(180, dtype=bool)
+    separation = round(math.degrees(2 * ANGLE_TOLERANCE))
+    for peak in np.argsort(smoothed)[::-1]:
+        if len(directions) == count or smoothed[peak] <= 0:
+            break
+        if blocked[peak]:
+            continue
+        blocked[np.arange(peak - separation + 1, peak + separation) % 180] = True
+
+        # Refine to the length-weighted mean of the segments in the peak's window
+        rough = math.radians(peak + 0.5)
+        deviations = np.mod(angles - rough + np.pi / 2, np.pi) - np.pi / 2
+        near = np.abs(deviations) <= math.radians(5.5)
+        refined = rough + float(np.average(deviations[near], weights=lengths[near]))
+        directions.append(refined % np.pi)
+    return directions
+
+
+def to_lines(segments, direction):
+    """Segments within the tolerance of `direction`, in the frame it defines"""
+    along = np.array([math.cos(direction), math.sin(direction)])
+    across = np.array([-math.sin(direction), math.cos(direction)])
+    starts, ends = segments[:, :2], segments[:, 2:]
+
+    t1, t2 = starts @ along, ends @ along
+    o1, o2 = starts @ across, ends @ across
+    run = t2 - t1
+    # Also drops segments square to the direction, which have no run along it
+    kept = np.abs(o2 - o1) <= math.tan(ANGLE_TOLERANCE) * np.abs(run)
+    kept &= np.abs(run) > 1e-6
+
+    pieces = []
+    for a, b, c, d in zip(t1[kept], t2[kept], o1[kept], o2[kept]):
+        if a > b:
+            a, b, c, d = b, a, d, c
+        slope = (d - c) / (b - a)
+        pieces.append(Line(c - slope * a, slope, a, b))
+    return pieces
+
+
+def merge_pieces(pieces, distance):
+    """Join the broken pieces and both edges of every painted line, longest first"""
+    lines = []
+    weights = []
+    for piece in sorted(pieces, key=lambda piece: -piece.length):
+        middle = (piece.start + piece.end) / 2
+        for index, line in enumerate(lines):
+            if (
+                abs(line.slope - piece.slope) <= MERGE_SLOPE
+                and abs(line.at(middle) - piece.at(middle)) <= distance
+                and piece.start - line.end <= distance
+                and line.start - piece.end <= distance
+            ):
+                # Both are linear in position, so their weighted means are too
+                total = weights[index] + piece.length
+                line.offset = (line.offset * weights[index] + piece.offset * piece.length) / total
+                line.slope = (line.slope * weights[index] + piece.slope * piece.length) / total
+                line.start = min(line.start, piece.start)
+                line.end = max(line.end, piece.end)
+                weights[index] = total
+                break
+        else:
+            lines.append(Line(piece.offset, piece.slope, piece.start, piece.end))
+            weights.append(piece.length)
+    return lines
+
+
+def find_rows(lines, depth):
+    """Extents of the rows of spaces along the lines, as (start, end)
+
+    Rows are where lines run side by side, at least a fraction as many as
+    along the busiest rows, so stray segments do not bridge the aisles. Runs
+    much longer than a line, such as rows parked head to head, are split
+    evenly.
+    """
+    low = math.floor(min(line.start for line in lines))
+    coverage = np.zeros(math.ceil(max(line.end for line in lines)) - low + 2, dtype=np.int32)
+    for line in lines:
+        coverage[int(line.start) - low] += 1
+        coverage[int(line.end) - low + 1] -= 1
+    coverage = np.cumsum(coverage)
+    minimum = max(2, ROW_COVERAGE * np.percentile(coverage[coverage > 0], 90))
+    covered = np.concatenate([[False], coverage >= minimum, [False]])
+    edges = np.flatnonzero(np.diff(covered.astype(np.int8)))
+
+    rows = []
+    for start, end in zip(edges[::2] + low, edges[1::2] + low):
+        if end - start < depth / 2:
+            continue
+        parts = max(1, round((end - start) / depth))
+        bounds = np.linspace(start, end, parts + 1)
+        rows.extend(itertools.pairwise(bounds))
+    return rows
+
+
+def pair_spaces(lines, start, end):
+    """Spaces of a row between neighbouring lines covering most of it
+
+    Returns (left, right) pairs of each side's offsets at the row's start
+    and end, so spaces follow lines slanted by perspective.
+    """
+    depth = end - start
+    middle = (start + end) / 2
+    # Spaces are at least MIN_ASPECT deep wide, anything closer is the same
+    # painted line: both its edges, its broken pieces or a doubled line
+    same_line = MIN_ASPECT * depth / 2
+    pieces = sorted(
+        ((line.at(middle), line) for line in lines if line.overlap(start, end) > 0),
+        key=lambda piece: piece[0],
+    )
+
+    sides = []
+    group = []
+    for index, (offset, line) in enumerate(pieces):
+        group.append(line)
+        if index + 1 == len(pieces) or pieces[index + 1][0] - offset > same_line:
+            weights = np.array([line.overlap(start, end) for line in group])
+            if weights.sum() >= depth / 2:
+                sides.append(tuple(
+                    float(np.average([line.at(position) for line in group], weights=weights))
+                    for position in (middle, start, end)
+                ))
+            group = []
+
+    return [
+        (left[1:], right[1:])
+        for left, right in itertools.pairwise(sides)
+        if MIN_ASPECT * depth <= right[0] - left[0] <= MAX_ASPECT * depth
+    ]
+
+
+def order_corners(corners):
+    """Top-left, top-right, bottom-right, bottom-left, clockwise on screen"""
+    center = corners.mean(axis=0)
+    clockwise = corners[np.argsort(np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0]))]
+    first = int(np.argmin(clockwise.sum(axis=1)))
+    return np.roll(clockwise, -first, axis=0)
+
+
+def spaces_along(segments, direction, merge_distance, size):
+    """Quadrilaterals of the spaces whose stall lines run along `direction`
+
+    Corners are clipped to the image of `size` (width, height), spaces
+    mostly outside of it are dropped.
+    """
+    lines = merge_pieces(to_lines(segments, direction), merge_distance)
+    if len(lines) < 2:
+        return []
+
+    along = np.array([math.cos(direction), math.sin(direction)])
+    across = np.array([-math.sin(direction), math.cos(direction)])
+    # Broken lines are shorter, the longer ones tell the depth of a space
+    depth = float(np.percentile([line.length for line in lines], 75))
+
+    quads = []
+    for start, end in find_rows(lines, depth):
+        for (left_start, left_end), (right_start, right_end) in pair_spaces(lines, start, end):
+            corners = np.array([
+                left_start * across + start * along,
+                right_start * across + start * along,
+                right_end * across + end * along,
+                left_end * across + end * along,
+            ])
+            quad = order_corners(np.rint(corners).astype(int))
+            clipped = np.clip(quad, 0, np.subtract(size, 1))
+            if open_cv.contourArea(clipped) >= open_cv.contourArea(quad) / 2 > 0:
+                quads.append(clipped)
+    return quads
+
+
+def detect_spaces(image):
+    """Parking spaces of an empty-lot image, in the coordinates schema
+
+    Finds the painted lines with Canny and a probabilistic Hough transform.
+    For each of the strongest line directions, it finds rows where lines
+    run side by side, merges the edges and pieces of each painted line and
+    turns neighbouring lines of a row into quadrilaterals when they are as
+    far apart as a space is wide. The direction giving the most spaces is
+    the stall lines'. Spaces are numbered in reading order.
+
+    Works best on overhead views, where the spaces of a row line up; check
+    the result and correct it through the lot's spaces endpoint.
+    """
+    segments = find_segments(image)
+    if not len(segments):
+        return []
+
+    height, width = image.shape[:2]
+    merge_distance = max(3.0, min(height, width) * MERGE_SHARE)
+    quads = max(
+        (
+            spaces_along(segments, direction, merge_distance, (width, height))
+            for direction in candidate_directions(segments)
+        ),
+        key=len,
+        default=[],
+    )
+    if not quads:
+        return []
+
+    # Reading order: rows of spaces top to bottom, then left to right
+    row_height = float(np.median([np.ptp(quad[:, 1]) for quad in quads])) / 2 or 1.0
+    quads.sort(key=lambda quad: (round(quad[:, 1].mean() / row_height), quad[:, 0].mean()))
+    return [
+        {"id": index, "coordinates": quad.tolist()}
+        for index, quad in enumerate(quads)
+    ]
@@ -0,0 +1,162 @@
+"""Compact binary feed of the latest status of every active lot
+
+Media type application/x-parking-status, or ?format=bin. All integers
+are unsigned LEB128 varints (7 bits per byte, low bits first, high bit
+set on every byte but the last)::
+
+    "PS"                magic
+    u8                  format version, 1
+    varint              dictionary revision
+    varint              number of lots
+    per lot:
+        varint          lot index in the dictionary
+        varint          total spaces
+        varint          free spaces
+        varint          occupied spaces
+        varint          status time, Unix seconds, 0 when there is none
+        varint          number of spaces n, as in the dictionary
+        ceil(n / 4) B   space statuses, 2 bits each, first space in the low
+                        bits: 0 undetermined, 1 free, 2 occupied, 3 unknown
+
+Lot IDs and names, and every lot's space IDs in feed order, come from the
+dictionary at /api/parking/status/dictionary/. Clients cache it and fetch
+it again when the feed's revision differs from the cached one.
+"""
+import zlib
+
+from django.db.models import OuterRef, Subquery
+
+from shared.statuses import ParkingStatus as ParkingStatusEnum
+
+from ..models import ParkingLot, ParkingStatus
+
+MAGIC = b"PS"
+FORMAT_VERSION = 1
+STATUS_CODES = {
+    ParkingStatusEnum.NOT_DETERMINED.value: 0,
+    ParkingStatusEnum.FREE.value: 1,
+    ParkingStatusEnum.OCCUPIED.value: 2,
+}
+MISSING = 3
+
+
+def varint(value, out):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """Decode a varint, returns it and the offset after it"""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def pack_statuses(codes):
+    """2-bit codes, four to a byte, first code in the low bits"""
+    packed = bytearray((len(codes) + 3) // 4)
+    for index, code in enumerate(codes):
+        packed[index >> 2] |= code << ((index & 3) * 2)
+    return packed
+
+
+def with_latest_status(lots):
+    """Lots annotated with the ID of their latest status, as latest_status_id"""
+    latest = ParkingStatus.objects.filter(parking_lot=OuterRef('pk')).order_by('-timestamp')
+    return lots.annotate(latest_status_id=Subquery(latest.values('id')[:1]))
+
+
+def latest_statuses(lots, raw=True):
+    """Latest status of lots from with_latest_status, by lot ID, in one query
+
+    Leave `raw` off to skip loading the per-space statuses.
+    """
+    ids = [lot.latest_status_id for lot in lots if lot.latest_status_id is not None]
+    statuses = ParkingStatus.objects.filter(id__in=ids).order_by()
+    if not raw:
+        statuses = statuses.defer('raw_statuses')
+    return {status.parking_lot_id: status for status in statuses}
+
+
+class StatusFeed:
+    """Active lots and their latest statuses, as JSON rows, dictionary or binary"""
+
+    def __init__(self, lots=None, raw=True):
+        """`raw` loads the per-space statuses, only the dictionary and binary need them"""
+        lots = lots if lots is not None else ParkingLot.objects.filter(is_active=True)
+        self.lots = list(with_latest_status(lots.order_by('created_at', 'id').only('id', 'name')))
+        self.statuses = latest_statuses(self.lots, raw)
+        self.spaces = [
+            sorted(space['id'] for space in self.statuses[lot.id].raw_statuses)
+            if raw and lot.id in self.statuses else []
+            for lot in self.lots
+        ]
+
+    @property
+    def revision(self):
+        """Changes whenever the lots or their spaces do"""
+        key = ";".join(
+            f"{lot.id}:{','.join(map(str, spaces))}" for lot, spaces in zip(self.lots, self.spaces)
+        )
+        return zlib.crc32(key.encode())
+
+    def dictionary(self):
+        return {
+            'revision': self.revision,
+            'lots': [
+                {'index': index, 'id': str(lot.id), 'name': lot.name, 'spaces': spaces}
+                for index, (lot, spaces) in enumerate(zip(self.lots, self.spaces))
+            ],
+        }
+
+    def rows(self):
+        """The verbose JSON representation"""
+        rows = []
+        for lot in self.lots:
+            row = {'id': str(lot.id), 'name': lot.name}
+            latest = self.statuses.get(lot.id)
+            if latest is not None:
+                row.update({
+                    'total_spaces': latest.total_spaces,
+                    'free_spaces': latest.free_spaces,
+                    'occupied_spaces': latest.occupied_spaces,
+                    'updated_at': latest.timestamp,
+                })
+            else:
+                row.update({
+                    'total_spaces': 0,
+                    'free_spaces': 0,
+                    'occupied_spaces': 0,
+                    'status': 'No status available'
+                })
+            rows.append(row)
+        return rows
+
+    def encode(self):
+        out = bytearray(MAGIC)
+        out.append(FORMAT_VERSION)
+        varint(self.revision, out)
+        varint(len(self.lots), out)
+        for index, (lot, spaces) in enumerate(zip(self.lots, self.spaces)):
+            latest = self.statuses.get(lot.id)
+            varint(index, out)
+            if latest is None:
+                out.extend(b"\0\0\0\0\0")
+                continue
+            varint(latest.total_spaces, out)
+            varint(latest.free_spaces, out)
+            varint(latest.occupied_spaces, out)
+            varint(int(latest.timestamp.timestamp()), out)
+
+            by_id = {space['id']: space['status'] for space in latest.raw_statuses}
+            varint(len(spaces), out)
+            out.extend(pack_statuses([STATUS_CODES.get(by_id[space_id], MISSING) for space_id in spaces]))
+        return bytes(out)
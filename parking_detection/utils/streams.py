@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from .pipeline import get_next, put_latest
+from .snapshots import SNAPSHOTS
+
+BOUNDARY = "frame"
+CONTENT_TYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+# A viewer gets the last frame again after this long without a new one, so
+# a client that went away is noticed even when the detector is stalled
+KEEPALIVE_SECONDS = 5.0
+
+
+def multipart(snapshot):
+    """One part of the MJPEG stream"""
+    return (
+        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+        f"Content-Length: {len(snapshot.jpeg)}\r\n"
+        f"X-Frame-Version: {snapshot.version}\r\n\r\n"
+    ).encode() + snapshot.jpeg + b"\r\n"
+
+
+class LiveStream:
+    """A detector's annotated frames, encoded once and broadcast to every viewer
+
+    The encoder thread runs only while somebody watches, at most `fps`
+    times a second whatever the analysis rate. Every viewer has a mailbox
+    holding the latest frame only, so a slow client skips frames instead
+    of queueing them, and does not hold the others back.
+    """
+
+    def __init__(self, key, detector, width=None, fps=None, on_idle=None):
+        self.key = key
+        self.detector = detector  # callable returning the current detector or None
+        self.width = width
+        self.interval = 1.0 / (fps or settings.PARKING_STREAM_FPS)
+        self.on_idle = on_idle  # called with the stream when its last viewer leaves
+        self.lock = threading.Lock()
+        self.viewers = set()
+        self.thread = None
+        self.dropped = 0
+
+    def attach(self):
+        """Register a viewer, starting the encoder if it is the first, returns its mailbox"""
+        mailbox = queue.Queue(1)
+        with self.lock:
+            self.viewers.add(mailbox)
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._encode_loop, name=f"stream:{self.key}", daemon=True
+                )
+                self.thread.start()
+        return mailbox
+
+    def detach(self, mailbox):
+        """Unregister a viewer, the encoder stops after the last one"""
+        with self.lock:
+            self.viewers.discard(mailbox)
+            idle = not self.viewers
+        if idle and self.on_idle is not None:
+            self.on_idle(self)
+
+    def _watched(self):
+        with self.lock:
+            if not self.viewers:
+                self.thread = None
+                return False
+            return True
+
+    def _on_drop(self, snapshot):
+        self.dropped += 1
+
+    def _encode_loop(self):
+        version = None
+        while self._watched():
+            started = time.monotonic()
+            detector = self.detector()
+            snapshot = SNAPSHOTS.get(self.key, detector, self.width) if detector else None
+            if snapshot is not None and snapshot.version != version:
+                version = snapshot.version
+                with self.lock:
+                    mailboxes = list(self.viewers)
+                for mailbox in mailboxes:
+                    put_latest(mailbox, snapshot, self._on_drop)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def frames(self, mailbox, running=lambda: True):
+        """Multipart chunks for one viewer, detaching it when the response closes"""
+        last = None
+        try:
+            while running():
+                deadline = time.monotonic() + KEEPALIVE_SECONDS
+                snapshot = get_next(mailbox, lambda deadline=deadline: time.monotonic() < deadline) or last
+                if snapshot is not None:
+                    last = snapshot
+                    yield multipart(snapshot)
+        finally:
+            self.detach(mailbox)
+
+
+class StreamHub:
+    """The live streams of this process, one per detector and width while watched
+
+    A stream is dropped with its last viewer, so the hub only holds the
+    streams somebody is watching.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}
+
+    def attach(self, key, detector, width=None):
+        """A new viewer of a detector at a width, returns the stream and its mailbox
+
+        Pass widths through snap_width, every distinct width is another encoder.
+        """
+        with self.lock:
+            stream = self.streams.get((key, width))
+            if stream is None:
+                stream = self.streams[(key, width)] = LiveStream(key, detector, width, on_idle=self._evict)
+            return stream, stream.attach()
+
+    def _evict(self, stream):
+        with self.lock:
+            # A viewer may have joined since the last one left
+            with stream.lock:
+                idle = not stream.viewers
+            if idle and self.streams.get((stream.key, stream.width)) is stream:
+                del self.streams[(stream.key, stream.width)]
+
+
+STREAMS = StreamHub()
@@ -0,0 +1,163 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import DetectorCheckpoint
+from .metrics import DB_WRITE_SECONDS
+from .profiler import run_pending_captures
+
+logger = logging.getLogger(__name__)
+
+RUNNING, STARTING, FAILED = "running", "starting", "failed"
+
+
+class DetectorHealth:
+    """Restart bookkeeping of one detector"""
+
+    __slots__ = ("backoff", "healthy_since", "last_error", "next_restart", "restarts", "state")
+
+    def __init__(self, backoff):
+        self.state = STARTING
+        self.restarts = 0
+        self.backoff = backoff
+        self.next_restart = 0.0
+        self.healthy_since = None
+        self.last_error = None
+
+
+class DetectorSupervisor:
+    """Watches the detectors of the manager, restarting and checkpointing them
+
+    A detector is unhealthy when one of its pipeline stages crashed or its
+    heartbeat, the end of its last analysis, is older than the stall
+    timeout. Unhealthy detectors are restarted after a backoff that doubles
+    on every failure and resets once a detector stays healthy long enough.
+    Debounced statuses are checkpointed to the database so a restarted
+    detector, or the next process, resumes from them instead of starting
+    every space as undetermined. Profile captures requested for the lots of
+    this process are started from the same loop.
+    """
+
+    INTERVAL = 2.0
+    STALL_TIMEOUT = 60.0
+    MIN_BACKOFF = 1.0
+    MAX_BACKOFF = 300.0
+    STABLE_AFTER = 120.0  # healthy seconds before the backoff resets
+    CHECKPOINT_INTERVAL = 30.0
+    RESUME_MAX_AGE = 600.0  # older checkpoints are ignored
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.health = {}
+        self.last_checkpoint = time.monotonic()
+
+    def run(self):
+        """Supervise until the manager shuts down"""
+        while self.manager.running:
+            try:
+                self.check()
+                run_pending_captures(self.manager)
+                if time.monotonic() - self.last_checkpoint >= self.CHECKPOINT_INTERVAL:
+                    self.checkpoint()
+            except Exception as e:
+                logger.error(f"Error supervising detectors: {e}")
+
+            time.sleep(self.INTERVAL)
+
+    def check(self):
+        """Restart the detectors found unhealthy once their backoff is over"""
+        now = time.monotonic()
+        origins = dict(self.manager.origins)
+        for key in list(self.health):
+            if key not in origins:
+                del self.health[key]
+
+        for key in origins:
+            health = self.health.setdefault(key, DetectorHealth(self.MIN_BACKOFF))
+            problem = self.diagnose(key, now)
+
+            if problem is None:
+                if health.state != RUNNING:
+                    health.state, health.healthy_since = RUNNING, now
+                elif now - health.healthy_since >= self.STABLE_AFTER:
+                    health.backoff = self.MIN_BACKOFF
+                continue
+
+            if health.state != FAILED:
+                logger.warning(f"Detector {key} {problem}, restarting in {health.backoff:.0f}s")
+                health.state, health.last_error = FAILED, problem
+                health.next_restart = now + health.backoff
+
+            if now >= health.next_restart:
+                health.restarts += 1
+                health.backoff = min(health.backoff * 2, self.MAX_BACKOFF)
+                health.state = STARTING
+                self.manager.restart_camera(key)
+
+    def diagnose(self, key, now):
+        """What is wrong with a detector, None when it's healthy"""
+        detector = self.manager.detectors.get(key)
+        if detector is None:
+            return "is not running"
+        if detector.failure:
+            return f"crashed in {detector.failure}"
+        if not detector.is_alive():
+            return "stopped"
+
+        stall_timeout = self.STALL_TIMEOUT
+        schedule = self.manager.scheduler.stats().get(key)
+        if schedule is not None:
+            stall_timeout = max(stall_timeout, 4 * schedule["max_staleness"])
+        if now - detector.heartbeat > stall_timeout:
+            return f"stalled for {now - detector.heartbeat:.0f}s"
+        return None
+
+    def checkpoint(self):
+        """Store the debounced statuses of every running detector"""
+        self.last_checkpoint = time.monotonic()
+        started = time.perf_counter()
+        for key, (parking_lot_id, _) in list(self.manager.origins.items()):
+            detector = self.manager.detectors.get(key)
+            if detector is None or detector.geometry is None:
+                continue
+            DetectorCheckpoint.objects.update_or_create(
+                key=key,
+                defaults={
+                    'parking_lot_id': parking_lot_id,
+                    'statuses': to_checkpoint(detector.checkpoint()),
+                },
+            )
+        DB_WRITE_SECONDS.labels("checkpoint").observe(time.perf_counter() - started)
+
+    def resume(self, key):
+        """Statuses to start a detector from, empty without a recent checkpoint"""
+        cutoff = timezone.now() - timedelta(seconds=self.RESUME_MAX_AGE)
+        checkpoint = DetectorCheckpoint.objects.filter(key=key, updated_at__gte=cutoff).first()
+        return from_checkpoint(checkpoint.statuses) if checkpoint else {}
+
+    def stats(self, key):
+        """Health of a detector for the API"""
+        detector = self.manager.detectors.get(key)
+        health = self.health.get(key)
+        return {
+            'state': health.state if health else STARTING,
+            'fps': detector.fps if detector else 0.0,
+            'errors': detector.errors if detector else 0,
+            'heartbeat_age': time.monotonic() - detector.heartbeat if detector else None,
+            'restarts': health.restarts if health else 0,
+            'last_error': health.last_error if health else None,
+        }
+
+
+def to_checkpoint(statuses):
+    """JSON form of MotionDetector.checkpoint, JSON keys can't be integers"""
+    return [
+        {'id': space_id, 'status': status, 'changed_at': changed_at}
+        for space_id, (status, changed_at) in statuses.items()
+    ]
+
+
+def from_checkpoint(rows):
+    return {row['id']: (row['status'], row['changed_at']) for row in rows}
@@ -0,0 +1,155 @@
+import math
+import os
+
+import cv2 as open_cv
+import numpy as np
+import yaml
+from django.conf import settings
+
+BACKGROUND = os.path.join(settings.BASE_DIR, "assets", "images", "parking_lot_1.png")
+ASPHALT = (92, 96, 98)
+LINE_COLOR = (235, 235, 235)
+SPACE_ASPECT = 2.0  # height over width of a space
+MARGIN = 0.08  # share of a cell left between its space and the lines
+CAR_INSET = 0.15  # share of a space left around a parked car
+TRANSITION = 0.8  # seconds a car takes to drive in or out
+
+
+def lot_layout(spaces, width, height):
+    """Coordinates of `spaces` upright spaces in a grid filling the frame"""
+    columns = max(1, min(spaces, math.ceil(math.sqrt(SPACE_ASPECT * spaces * width / height))))
+    rows = math.ceil(spaces / columns)
+    cell_w, cell_h = width / columns, height / rows
+
+    coordinates = []
+    for index in range(spaces):
+        row, column = divmod(index, columns)
+        x1 = int(column * cell_w + MARGIN * cell_w)
+        y1 = int(row * cell_h + MARGIN * cell_h)
+        x2 = int((column + 1) * cell_w - MARGIN * cell_w) - 1
+        y2 = int((row + 1) * cell_h - MARGIN * cell_h) - 1
+        coordinates.append({"id": index, "coordinates": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]})
+    return coordinates
+
+
+def background(coordinates, width, height, image=BACKGROUND):
+    """Empty lot: the asset's tones smoothed into asphalt, with painted lines"""
+    source = open_cv.imread(image) if image and os.path.exists(image) else None
+    if source is None:
+        frame = np.full((height, width, 3), ASPHALT, dtype=np.uint8)
+    else:
+        frame = open_cv.resize(source, (width, height), interpolation=open_cv.INTER_AREA)
+        # Keep the lighting, drop the asset's own cars and markings
+        frame = open_cv.blur(frame, (width // 4 | 1, height // 4 | 1))
+        frame = open_cv.addWeighted(frame, 0.5, np.full_like(frame, ASPHALT), 0.5, 0)
+
+    thickness = max(1, width // 640)
+    for space in coordinates:
+        (x1, y1), _, (x2, y2), _ = space["coordinates"]
+        pad = max(2, (x2 - x1) // 12)
+        open_cv.line(frame, (x1 - pad, y1), (x1 - pad, y2), LINE_COLOR, thickness)
+        open_cv.line(frame, (x2 + pad, y1), (x2 + pad, y2), LINE_COLOR, thickness)
+    return frame
+
+
+def draw_car(frame, space, offset, color):
+    """Car sprite parked in a space, `offset` (0-1) of its length out of it"""
+    (x1, y1), _, (x2, y2), _ = space["coordinates"]
+    inset_x, inset_y = int((x2 - x1) * CAR_INSET), int((y2 - y1) * CAR_INSET / 2)
+    cx1, cx2 = x1 + inset_x, x2 - inset_x
+    length = y2 - y1 - 2 * inset_y
+    cy1 = y1 + inset_y + int(offset * (length + 2 * inset_y))
+    cy2 = cy1 + length
+
+    # Drawing is clipped to the space, the rest of the car is out of view
+    view = frame[y1 : y2 + 1, x1 : x2 + 1]
+    body = ((cx1 - x1, cy1 - y1), (cx2 - x1, cy2 - y1))
+    open_cv.rectangle(view, *body, color, -1)
+    open_cv.rectangle(view, *body, (20, 20, 20), 1)
+
+    car_w = cx2 - cx1
+    windshield = (cx1 + car_w // 6, cy1 + length // 5, cx2 - car_w // 6, cy1 + length // 3)
+    rear = (cx1 + car_w // 6, cy2 - length // 4, cx2 - car_w // 6, cy2 - length // 8)
+    for wx1, wy1, wx2, wy2 in (windshield, rear):
+        open_cv.rectangle(view, (wx1 - x1, wy1 - y1), (wx2 - x1, wy2 - y1), (40, 35, 30), -1)
+    for wheel_y in (cy1 + length // 6, cy2 - length // 6):
+        for wheel_x in (cx1, cx2):
+            open_cv.circle(view, (wheel_x - x1, wheel_y - y1), max(2, car_w // 10), (15, 15, 15), -1)
+
+
+class OccupancyScript:
+    """Random arrivals and departures, one car per space
+
+    A space changes on average every `mean_stay` seconds; the car drives
+    in or out over TRANSITION seconds. The ground truth counts a space as
+    occupied once more than half of its car is inside.
+    """
+
+    def __init__(self, spaces, fps, mean_stay=20.0, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.fps = fps
+        self.change_probability = 1.0 / (mean_stay * fps)
+        self.transition_frames = max(1, int(TRANSITION * fps))
+        self.parked = self.rng.random(spaces) < 0.5
+        self.progress = np.zeros(spaces, dtype=np.int32)  # frames into a transition
+        self.colors = self.rng.integers(30, 230, (spaces, 3))
+
+    def step(self):
+        """Advance one frame, returns each car's offset out of its space (1 = gone)"""
+        moving = self.progress > 0
+        self.progress[moving] += 1
+        done = self.progress >= self.transition_frames
+        self.parked[done] = ~self.parked[done]
+        self.progress[done] = 0
+
+        starting = (self.progress == 0) & (self.rng.random(len(self.parked)) < self.change_probability)
+        self.progress[starting] = 1
+
+        offsets = np.where(self.parked, 0.0, 1.0)
+        moving = self.progress > 0
+        fraction = self.progress[moving] / self.transition_frames
+        # Parked cars drive out, empty spaces see a car drive in
+        offsets[moving] = np.where(self.parked[moving], fraction, 1.0 - fraction)
+        return offsets
+
+    @staticmethod
+    def occupied(offsets):
+        return offsets < 0.5
+
+
+def write_synthetic_lot(directory, spaces, width, height, frames, fps=25, seed=0, image=BACKGROUND):
+    """Video, coordinates YAML and per-frame ground truth of a synthetic lot
+
+    Returns the paths of the video, the coordinates and the ground truth,
+    an .npy array of frames x spaces, true where a space is occupied.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"synthetic_{spaces}_{width}x{height}"
+    video_path = os.path.join(directory, f"{name}.avi")
+    coordinates_path = os.path.join(directory, f"{name}.yml")
+    truth_path = os.path.join(directory, f"{name}_truth.npy")
+
+    coordinates = lot_layout(spaces, width, height)
+    with open(coordinates_path, "w") as file:
+        yaml.safe_dump(coordinates, file)
+
+    empty = background(coordinates, width, height, image)
+    script = OccupancyScript(spaces, fps, seed=seed)
+    truth = np.zeros((frames, spaces), dtype=bool)
+    writer = open_cv.VideoWriter(video_path, open_cv.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    frame = np.empty_like(empty)
+
+    try:
+        for index in range(frames):
+            offsets = script.step()
+            np.copyto(frame, empty)
+            for space, offset, color in zip(coordinates, offsets, script.colors):
+                if offset < 1.0:
+                    draw_car(frame, space, offset, tuple(int(c) for c in color))
+            truth[index] = script.occupied(offsets)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    np.save(truth_path, truth)
+    return video_path, coordinates_path, truth_path
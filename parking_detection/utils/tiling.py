@@ -0,0 +1,113 @@
+import cv2 as open_cv
+import numpy as np
+
+
+def plan_tiles(bounds, tile_size, overlap):
+    """Cover every space with as few model-sized tiles as possible
+
+    Candidate tiles form an overlapping grid over the union of the space
+    bounds, plus tiles anchored on the top-left corners of the spaces,
+    which is where a tile covering the most spaces starts. Tiles are then
+    picked greedily, each time the one fully containing the most spaces not
+    covered yet. A space too large for any tile gets a tile of its own,
+    grown to fit it. Returns tiles as (x, y, w, h) and the index of the
+    tile assigned to each space.
+    """
+    bounds = np.asarray(bounds, dtype=np.int64).reshape(-1, 4)
+    if not len(bounds):
+        return [], []
+
+    left, top = bounds[:, 0].min(), bounds[:, 1].min()
+    right = (bounds[:, 0] + bounds[:, 2]).max()
+    bottom = (bounds[:, 1] + bounds[:, 3]).max()
+    stride = max(tile_size - overlap, 1)
+
+    xs = set(_grid_starts(left, right, tile_size, stride)) | set(bounds[:, 0].tolist())
+    ys = set(_grid_starts(top, bottom, tile_size, stride)) | set(bounds[:, 1].tolist())
+    candidates = [(x, y, tile_size, tile_size) for y in sorted(ys) for x in sorted(xs)]
+    contains = np.array([_contains(tile, bounds) for tile in candidates])
+
+    tiles = []
+    assignment = [None] * len(bounds)
+    uncovered = np.ones(len(bounds), dtype=bool)
+
+    while uncovered.any():
+        gains = (contains & uncovered).sum(axis=1)
+        best = int(np.argmax(gains))
+        if gains[best] == 0:
+            break
+
+        covered = contains[best] & uncovered
+        for index in np.flatnonzero(covered):
+            assignment[index] = len(tiles)
+        tiles.append(candidates[best])
+        uncovered &= ~covered
+
+    for index in np.flatnonzero(uncovered):
+        x, y, w, h = (int(v) for v in bounds[index])
+        size = max(w, h, tile_size)
+        assignment[index] = len(tiles)
+        tiles.append((x + (w - size) // 2, y + (h - size) // 2, size, size))
+
+    return [tuple(int(v) for v in tile) for tile in tiles], assignment
+
+
+def clip_tiles(tiles, height, width):
+    """Shift tiles inside the frame, shrinking those larger than it"""
+    clipped = []
+    for x, y, w, h in tiles:
+        w, h = min(w, width), min(h, height)
+        x = min(max(x, 0), width - w)
+        y = min(max(y, 0), height - h)
+        clipped.append((x, y, w, h))
+    return clipped
+
+
+def merge_detections(boxes, scores, score_threshold, nms_threshold):
+    """Indexes of the boxes kept by NMS across all tiles"""
+    if not len(boxes):
+        return np.empty(0, dtype=np.int64)
+
+    rects = [[float(x1), float(y1), float(x2 - x1), float(y2 - y1)] for x1, y1, x2, y2 in boxes]
+    kept = open_cv.dnn.NMSBoxes(rects, [float(s) for s in scores], score_threshold, nms_threshold)
+    return np.asarray(kept, dtype=np.int64).reshape(-1)
+
+
+def assign_to_spaces(boxes, bounds, min_overlap):
+    """Spaces covered by a detection for at least `min_overlap` of their rect"""
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    occupied = np.zeros(len(bounds), dtype=bool)
+    if not len(boxes):
+        return occupied
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    space_x1, space_y1 = bounds[:, 0], bounds[:, 1]
+    space_x2, space_y2 = space_x1 + bounds[:, 2], space_y1 + bounds[:, 3]
+
+    # Intersection of every box with every space rect, boxes x spaces
+    width = np.minimum(boxes[:, None, 2], space_x2) - np.maximum(boxes[:, None, 0], space_x1)
+    height = np.minimum(boxes[:, None, 3], space_y2) - np.maximum(boxes[:, None, 1], space_y1)
+    intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+    coverage = intersection / np.maximum(bounds[:, 2] * bounds[:, 3], 1)
+
+    occupied[(coverage >= min_overlap).any(axis=0)] = True
+    return occupied
+
+
+def _grid_starts(start, end, size, stride):
+    """Tile origins along one axis, the last tile flush with the end"""
+    if end - start <= size:
+        return [int(start)]
+    starts = list(range(int(start), int(end - size), stride))
+    starts.append(int(end - size))
+    return starts
+
+
+def _contains(tile, bounds):
+    x, y, w, h = tile
+    return (
+        (bounds[:, 0] >= x)
+        & (bounds[:, 1] >= y)
+        & (bounds[:, 0] + bounds[:, 2] <= x + w)
+        & (bounds[:, 1] + bounds[:, 3] <= y + h)
+    )
@@ -1,28 +1,60 @@
 import json
-from pathlib import Path
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.parsers import MultiPartParser, FormParser
-import yaml
+import logging
 import os
-import threading
+import shutil
 import uuid
+from pathlib import Path
+
+import cv2 as open_cv
+import numpy as np
 from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBase, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from server.settings import BASE_DIR
-from .utils.coordinates_generator import CoordinatesGenerator
-from .utils.detector_manager import DetectorManager
-from .models import ParkingLot, ParkingStatus
-from shared.colors import Color
 from shared.statuses import ParkingStatus as ParkingStatusEnum
-import logging
+
+from .models import (
+    Camera,
+    DetectorLease,
+    DetectorWorker,
+    ParkingLot,
+    ParkingStatus,
+    ProfileCapture,
+)
+from .renderers import FastJSONRenderer, StatusFeedRenderer
+from .utils import metrics as detector_metrics
+from .utils.analytics import lot_analytics
+from .utils.coordinates import (
+    CoordinatesError,
+    dump_coordinates,
+    load_coordinates,
+    load_geometry,
+    parse_coordinates,
+    validate_spaces,
+)
+from .utils.detector_manager import DetectorManager
+from .utils.forecast import MAX_MINUTES, forecast
+from .utils.frame_server import FORWARDED_HEADERS, open_upstream, relay
+from .utils.geo import MAX_RADIUS, MAX_RESULTS, nearby_lots
+from .utils.profiler import MAX_SECONDS, refresh_capture, request_capture
+from .utils.snapshots import SNAPSHOTS, frame_params
+from .utils.space_detection import detect_spaces
+from .utils.status_feed import StatusFeed
+from .utils.streams import CONTENT_TYPE as STREAM_CONTENT_TYPE
+from .utils.streams import STREAMS
 
 logger = logging.getLogger(__name__)
 
-# Initialize detector manager
-detector_manager = DetectorManager()
-threading.Thread(target=detector_manager.initialize, daemon=True).start()
+# Detectors run in lease-holding workers (run_detectors, or this process when
+# autostarted), the views only read what they store in the database
 
 class ParkingLotListView(APIView):
     """API endpoint for listing and creating parking lots"""
@@ -37,6 +69,8 @@ class ParkingLotListView(APIView):
             status_data = {
                 'id': str(lot.id),
                 'name': lot.name,
+                'latitude': lot.latitude,
+                'longitude': lot.longitude,
                 'created_at': lot.created_at,
                 'updated_at': lot.updated_at,
             }
@@ -72,6 +106,49 @@ class ParkingLotListView(APIView):
             video_file = request.FILES.get('video_file')
             data_file = request.FILES.get('data_file')
             start_frame = int(request.data.get('start_frame', 1))
+            model_name = request.data.get('model_name', '')
+            classifier = request.data.get('classifier', 'hybrid')
+            fusion = request.data.get('fusion', 'best_view')
+            latitude, longitude = request.data.get('latitude'), request.data.get('longitude')
+
+            if classifier not in dict(ParkingLot.CLASSIFIER_CHOICES):
+                return Response(
+                    {"error": f"Unknown classifier: {classifier}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if fusion not in dict(ParkingLot.FUSION_CHOICES):
+                return Response(
+                    {"error": f"Unknown fusion rule: {fusion}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if (latitude is None) != (longitude is None):
+                return Response(
+                    {"error": "Pass both latitude and longitude, or neither"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if latitude is not None:
+                try:
+                    latitude, longitude = float(latitude), float(longitude)
+                except ValueError:
+                    return Response(
+                        {"error": "Latitude and longitude must be numbers"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    return Response(
+                        {"error": "Latitude or longitude out of range"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            if not video_file:
+                return Response(
+                    {"error": "Video file is required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Reject invalid coordinates before anything is written
+            if data_file:
+                parse_coordinates(data_file.read())
+                data_file.seek(0)
 
             # Create directories if they don't exist
             media_root = settings.MEDIA_ROOT
@@ -85,58 +162,67 @@ class ParkingLotListView(APIView):
             lot = ParkingLot(
                 id=lot_id,
                 name=name,
-                start_frame=start_frame
+                start_frame=start_frame,
+                model_name=model_name,
+                classifier=classifier,
+                fusion=fusion,
+                latitude=latitude,
+                longitude=longitude
             )
 
+            # Process video file
+            video_path = os.path.join(lot_dir, video_file.name)
+            with open(video_path, 'wb+') as dest:
+                dest.writelines(video_file.chunks())
+            lot.video_path = video_path
+
             # Process image file if provided
             if image_file:
                 image_path = os.path.join(lot_dir, image_file.name)
                 with open(image_path, 'wb+') as dest:
-                    for chunk in image_file.chunks():
-                        dest.write(chunk)
+                    dest.writelines(image_file.chunks())
                 lot.image_path = image_path
 
-                # If no data file is provided, generate coordinates
-                if not data_file:
-                    data_path = os.path.join(lot_dir, f"{lot_id}_coordinates.yaml")
-                    with open(data_path, 'w+') as points:
-                        generator = CoordinatesGenerator(image_path, points, Color.RED)
-                        generator.generate()
-                    lot.data_path = data_path
-
-            # Process data file if provided
+            # Process data file if provided, its spaces must fit in the frames
             if data_file:
+                try:
+                    parse_coordinates(data_file.read(), _frame_size(lot.video_path, lot.image_path))
+                except CoordinatesError:
+                    shutil.rmtree(lot_dir, ignore_errors=True)
+                    raise
+                data_file.seek(0)
                 data_path = os.path.join(lot_dir, data_file.name)
                 with open(data_path, 'wb+') as dest:
-                    for chunk in data_file.chunks():
-                        dest.write(chunk)
+                    dest.writelines(data_file.chunks())
                 lot.data_path = data_path
 
-            # Process video file if provided
-            if video_file:
-                video_path = os.path.join(lot_dir, video_file.name)
-                with open(video_path, 'wb+') as dest:
-                    for chunk in video_file.chunks():
-                        dest.write(chunk)
-                lot.video_path = video_path
-            else:
-                return Response(
-                    {"error": "Video file is required"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # If no data file is provided, find the spaces in the image
+            elif image_file:
+                image = open_cv.imread(lot.image_path)
+                spaces = detect_spaces(image) if image is not None else []
+                if spaces:
+                    data_path = os.path.join(lot_dir, f"{lot_id}_coordinates.yaml")
+                    dump_coordinates(spaces, data_path)
+                    lot.data_path = data_path
 
-            # Save the parking lot
-            lot.save()
+            # Compile the geometry now, the detector memory-maps it when it starts
+            if lot.data_path:
+                load_geometry(lot.data_path)
 
-            # Start detector for this parking lot
-            detector_manager.start_detector(lot.id)
+            # Save the parking lot, a worker claims it on its next lease round
+            lot.save()
 
-            return Response({
+            response = {
                 "id": lot.id,
                 "name": lot.name,
                 "message": "Parking lot created successfully"
-            }, status=status.HTTP_201_CREATED)
+            }
+            if not lot.data_path:
+                response["message"] += ", no parking spaces found: submit them to its spaces endpoint"
+            return Response(response, status=status.HTTP_201_CREATED)
 
+        except CoordinatesError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error creating parking lot: {e}")
             return Response(
@@ -155,6 +241,8 @@ class ParkingLotDetailView(APIView):
             data = {
                 'id': str(lot.id),
                 'name': lot.name,
+                'latitude': lot.latitude,
+                'longitude': lot.longitude,
                 'created_at': lot.created_at,
                 'updated_at': lot.updated_at,
             }
@@ -183,6 +271,14 @@ class ParkingLotDetailView(APIView):
                     'status': 'No status available'
                 })
 
+            # Health of the lot's detectors, one per camera, as its worker last reported
+            lease = DetectorLease.objects.filter(parking_lot=lot, expires_at__gte=timezone.now()).first()
+            data['worker'] = lease.owner if lease else None
+            data['detectors'] = [
+                {'id': key, **health}
+                for key, health in (lease.health if lease else {}).items()
+            ]
+
             return Response(data)
 
         except ParkingLot.DoesNotExist:
@@ -196,10 +292,7 @@ class ParkingLotDetailView(APIView):
         try:
             lot = ParkingLot.objects.get(id=pk)
 
-            # Stop detector first
-            detector_manager.stop_detector(lot.id)
-
-            # Mark as inactive instead of deleting
+            # Mark as inactive instead of deleting, its worker stops the detectors
             lot.is_active = False
             lot.save()
 
@@ -214,49 +307,42 @@ class ParkingLotDetailView(APIView):
 
 class ParkingStatusView(APIView):
     """API endpoint for getting the latest parking status"""
+    renderer_classes = [FastJSONRenderer, StatusFeedRenderer, BrowsableAPIRenderer]
 
     def get(self, request):
-        """Get latest status for all parking lots"""
-        data = []
+        """Get latest status for all parking lots
 
+        Clients accepting application/x-parking-status get the compact
+        binary feed, with per-space statuses, instead of JSON.
+        """
         try:
-            # Get all active parking lots
-            lots = ParkingLot.objects.filter(is_active=True)
+            if isinstance(request.accepted_renderer, StatusFeedRenderer):
+                return Response(StatusFeed())
+            return Response(StatusFeed(raw=False).rows())
 
-            for lot in lots:
-                lot_data = {
-                    'id': str(lot.id),
-                    'name': lot.name,
-                }
+        except Exception as e:
+            logger.error(f"Error fetching parking status: {e}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-                try:
-                    # Get latest status
-                    latest_status = lot.statuses.latest()
-                    lot_data.update({
-                        'total_spaces': latest_status.total_spaces,
-                        'free_spaces': latest_status.free_spaces,
-                        'occupied_spaces': latest_status.occupied_spaces,
-                        'updated_at': latest_status.timestamp,
-                    })
-                except ParkingStatus.DoesNotExist:
-                    lot_data.update({
-                        'total_spaces': 0,
-                        'free_spaces': 0,
-                        'occupied_spaces': 0,
-                        'status': 'No status available'
-                    })
-
-                data.append(lot_data)
 
-            return Response(data)
+class StatusDictionaryView(APIView):
+    """API endpoint for the lot and space IDs the binary status feed refers to"""
 
+    def get(self, request):
+        """Get every active lot with its index and space IDs, and the revision"""
+        try:
+            return Response(StatusFeed().dictionary())
         except Exception as e:
-            logger.error(f"Error fetching parking status: {e}")
+            logger.error(f"Error fetching the status dictionary: {e}")
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        
+
+
 class ParkingAvailabilityView(APIView):
     def get(self, request):
         try:
@@ -269,3 +355,541 @@ class ParkingAvailabilityView(APIView):
                 return Response({"error": "Estado no disponible aún"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ForecastView(APIView):
+    """API endpoint for the free spaces a parking lot is expected to have"""
+
+    def get(self, request, pk):
+        """Get the free spaces expected in ?minutes= from now
+
+        Blends the lot's typical level at that time of week with how far
+        the live status is from its typical level now.
+        """
+        try:
+            lot = ParkingLot.objects.get(id=pk)
+        except ParkingLot.DoesNotExist:
+            return Response(
+                {"error": "Parking lot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            minutes = int(request.query_params.get('minutes', 0))
+        except ValueError:
+            return Response(
+                {"error": "minutes must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= minutes <= MAX_MINUTES:
+            return Response(
+                {"error": f"minutes must be between 0 and {MAX_MINUTES}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = forecast(lot, minutes)
+        if result is None:
+            return Response(
+                {"error": "No status of this parking lot yet"},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(result)
+
+
+class LotAnalyticsView(APIView):
+    """API endpoint for the dwell times and turnover of a parking lot's spaces"""
+
+    def get(self, request, pk):
+        """Get the dwell time statistics and turnover of every space and the lot
+
+        Reads the aggregates the detectors keep up to date, so the cost
+        does not grow with the status history.
+        """
+        try:
+            lot = ParkingLot.objects.get(id=pk)
+        except ParkingLot.DoesNotExist:
+            return Response(
+                {"error": "Parking lot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(lot_analytics(lot))
+
+
+class NearbyLotsView(APIView):
+    """API endpoint for the nearest parking lots with free spaces"""
+
+    def get(self, request):
+        """Get lots within ?radius= meters of ?lat= and ?lon=, nearest first
+
+        ?min_free= skips lots with fewer free spaces and ?limit= caps the
+        results. Free counts are the latest stored statuses.
+        """
+        try:
+            latitude = float(request.query_params['lat'])
+            longitude = float(request.query_params['lon'])
+            radius = float(request.query_params.get('radius', 2000))
+            min_free = int(request.query_params.get('min_free', 0))
+            limit = int(request.query_params.get('limit', 10))
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "lat and lon are required, all parameters are numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response(
+                {"error": "Latitude or longitude out of range"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < radius <= MAX_RADIUS or not 0 < limit <= MAX_RESULTS:
+            return Response(
+                {"error": f"radius must be up to {MAX_RADIUS} meters and limit up to {MAX_RESULTS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            return Response(nearby_lots(latitude, longitude, radius, min_free, limit))
+        except Exception as e:
+            logger.error(f"Error finding lots near {latitude}, {longitude}: {e}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class DetectorListView(APIView):
+    """API endpoint for the runtime state of the running detectors"""
+
+    def get(self, request):
+        """Get the worker, analysis rate, lag and health of every detector"""
+        leases = DetectorLease.objects.filter(expires_at__gte=timezone.now())
+        data = [
+            {
+                'id': key,
+                'parking_lot': str(lease.parking_lot_id),
+                'worker': lease.owner,
+                **stats,
+            }
+            for lease in leases
+            for key, stats in lease.health.items()
+        ]
+        return Response(data)
+
+
+class CameraListView(APIView):
+    """API endpoint for listing and adding the cameras of a parking lot"""
+    parser_classes = [MultiPartParser, FormParser]
+
+    def get(self, request, pk):
+        """Get the cameras of a parking lot"""
+        try:
+            lot = ParkingLot.objects.get(id=pk)
+        except ParkingLot.DoesNotExist:
+            return Response(
+                {"error": "Parking lot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        data = [
+            {
+                'id': str(camera.id),
+                'name': camera.name,
+                'start_frame': camera.start_frame,
+                'weight': camera.weight,
+                'is_active': camera.is_active,
+                'created_at': camera.created_at,
+            }
+            for camera in lot.cameras.all()
+        ]
+        return Response(data)
+
+    def post(self, request, pk):
+        """Add a camera with its own video and coordinates to a parking lot"""
+        try:
+            lot = ParkingLot.objects.get(id=pk)
+        except ParkingLot.DoesNotExist:
+            return Response(
+                {"error": "Parking lot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            video_file = request.FILES.get('video_file')
+            data_file = request.FILES.get('data_file')
+            if not (video_file and data_file):
+                return Response(
+                    {"error": "Video and data files are required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            parse_coordinates(data_file.read())
+            data_file.seek(0)
+
+            camera = Camera(
+                parking_lot=lot,
+                name=request.data.get('name', f"Camera {lot.cameras.count() + 1}"),
+                start_frame=int(request.data.get('start_frame', 1)),
+                weight=float(request.data.get('weight', 1.0))
+            )
+
+            camera_dir = os.path.join(settings.MEDIA_ROOT, str(lot.id), str(camera.id))
+            os.makedirs(camera_dir, exist_ok=True)
+            for field, upload in (('video_path', video_file), ('data_path', data_file)):
+                path = os.path.join(camera_dir, upload.name)
+                with open(path, 'wb+') as dest:
+                    dest.writelines(upload.chunks())
+                setattr(camera, field, path)
+            try:
+                load_coordinates(camera.data_path, _frame_size(camera.video_path))
+            except CoordinatesError:
+                shutil.rmtree(camera_dir, ignore_errors=True)
+                raise
+            load_geometry(camera.data_path)
+
+            camera.save()
+
+            # A new lot version makes its worker restart the detectors with every camera
+            lot.save(update_fields=['updated_at'])
+
+            return Response({
+                "id": camera.id,
+                "name": camera.name,
+                "message": "Camera added successfully"
+            }, status=status.HTTP_201_CREATED)
+
+        except CoordinatesError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error adding camera to parking lot {pk}: {e}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SpaceListView(APIView):
+    """API endpoint for reviewing and editing the parking spaces of a lot or camera"""
+
+    def get(self, request, pk):
+        """Get the spaces of a parking lot, or of one of its cameras with ?camera="""
+        try:
+            _, source = self._source(request, pk)
+        except (ParkingLot.DoesNotExist, Camera.DoesNotExist, ValueError):
+            return Response(
+                {"error": "Parking lot or camera not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not (source.data_path and os.path.exists(source.data_path)):
+            return Response([])
+        try:
+            return Response(load_coordinates(source.data_path))
+        except CoordinatesError as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def put(self, request, pk):
+        """Replace the spaces with a JSON list of {"id", "coordinates"} polygons"""
+        try:
+            lot, source = self._source(request, pk)
+        except (ParkingLot.DoesNotExist, Camera.DoesNotExist, ValueError):
+            return Response(
+                {"error": "Parking lot or camera not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return self._save(lot, source, request.data)
+
+    def post(self, request, pk):
+        """Detect the spaces in an uploaded `image_file`, or in the lot's image"""
+        try:
+            lot, source = self._source(request, pk)
+        except (ParkingLot.DoesNotExist, Camera.DoesNotExist, ValueError):
+            return Response(
+                {"error": "Parking lot or camera not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        image_file = request.FILES.get('image_file')
+        if image_file:
+            image = open_cv.imdecode(np.frombuffer(image_file.read(), np.uint8), open_cv.IMREAD_COLOR)
+        elif lot.image_path and os.path.exists(lot.image_path):
+            image = open_cv.imread(lot.image_path)
+        else:
+            image = None
+        if image is None:
+            return Response(
+                {"error": "An image of the empty lot is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        spaces = detect_spaces(image)
+        if not spaces:
+            return Response(
+                {"error": "No parking spaces found in the image"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return self._save(lot, source, spaces)
+
+    @staticmethod
+    def _source(request, pk):
+        """The lot and where its spaces are kept, the lot itself or a camera"""
+        lot = ParkingLot.objects.get(id=pk)
+        camera_id = request.query_params.get('camera')
+        return lot, lot.cameras.get(id=camera_id) if camera_id else lot
+
+    @staticmethod
+    def _save(lot, source, spaces):
+        """Validate, store and compile the spaces"""
+        try:
+            spaces = validate_spaces(spaces, _frame_size(source.video_path, lot.image_path))
+        except CoordinatesError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if not source.data_path:
+                directory = os.path.join(settings.MEDIA_ROOT, str(lot.id))
+                if source is not lot:
+                    directory = os.path.join(directory, str(source.id))
+                os.makedirs(directory, exist_ok=True)
+                source.data_path = os.path.join(directory, f"{source.id}_coordinates.yaml")
+                source.save(update_fields=['data_path'])
+            dump_coordinates(spaces, source.data_path)
+            load_geometry(source.data_path)
+
+            # A new lot version makes its worker restart the detectors with the new spaces
+            lot.save(update_fields=['updated_at'])
+            return Response(spaces)
+
+        except Exception as e:
+            logger.error(f"Error saving the spaces of parking lot {lot.id}: {e}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+def _frame_size(*paths):
+    """Width and height of the frames of the first readable video or image, if any"""
+    for path in paths:
+        if not (path and os.path.exists(path)):
+            continue
+        capture = open_cv.VideoCapture(path)
+        width = int(capture.get(open_cv.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(open_cv.CAP_PROP_FRAME_HEIGHT))
+        capture.release()
+        if width and height:
+            return width, height
+        image = open_cv.imread(path)
+        if image is not None:
+            return image.shape[1], image.shape[0]
+    return None
+
+
+def _frame_source(request, pk, name):
+    """Key and detector of the lot camera whose frames a request wants
+
+    Returns (key, detector, width, since), the width rounded up to one of
+    the snapshot WIDTHS, or a response to send back. Frames never leave
+    the process running the lot's detectors, so the `name` file of a lot
+    another worker runs is proxied from that worker's frame server.
+    """
+    try:
+        lot = ParkingLot.objects.get(id=pk)
+    except ParkingLot.DoesNotExist:
+        return Response(
+            {"error": "Parking lot not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        camera, width, since = frame_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    key, detector = DetectorManager().get_detector(lot.id, camera)
+    if detector is not None:
+        return key, detector, width, since
+
+    lease = DetectorLease.objects.filter(parking_lot=lot, expires_at__gte=timezone.now()).first()
+    if lease is None:
+        return Response(
+            {"error": "No worker is running this parking lot"},
+            status=status.HTTP_409_CONFLICT
+        )
+    worker = DetectorWorker.objects.filter(name=lease.owner).first()
+    if worker is None or not worker.url:
+        return Response(
+            {"error": f"Parking lot runs in worker {lease.owner}, which serves no frames "
+                      "(start it with run_detectors --http-port)", "worker": lease.owner},
+            status=status.HTTP_409_CONFLICT
+        )
+    return _proxy_frames(request, worker, f"lots/{lot.id}/{name}")
+
+
+def _proxy_frames(request, worker, path):
+    """Relay a snapshot or live stream from the worker running the lot"""
+    headers = {'If-None-Match': request.headers['If-None-Match']} if 'If-None-Match' in request.headers else {}
+    try:
+        upstream = open_upstream(worker.url, path, request.META.get('QUERY_STRING', ''), headers)
+    except OSError as e:
+        logger.warning(f"Worker {worker.name} at {worker.url} is unreachable: {e}")
+        return Response(
+            {"error": f"Worker {worker.name} running this parking lot is unreachable",
+             "worker": worker.name, "url": worker.url},
+            status=status.HTTP_502_BAD_GATEWAY
+        )
+
+    content_type = upstream.headers.get('Content-Type', '')
+    if upstream.status == status.HTTP_200_OK and content_type.startswith("multipart/"):
+        response = StreamingHttpResponse(relay(upstream), content_type=content_type)
+    else:
+        with upstream:
+            response = HttpResponse(upstream.read(), status=upstream.status, content_type=content_type or None)
+    for header in FORWARDED_HEADERS:
+        if header in upstream.headers:
+            response[header] = upstream.headers[header]
+    response['X-Detector-Worker'] = worker.name
+    return response
+
+
+class SnapshotView(APIView):
+    """API endpoint for the latest analysed frame of a lot, its spaces outlined by status"""
+
+    def get(self, request, pk):
+        """Get the latest frame as a JPEG, ?camera= picks a camera and ?width= downscales
+
+        Every frame version is encoded once however many clients ask. Pass
+        the X-Frame-Version of the last snapshot as ?since=, or its ETag as
+        If-None-Match, to get a 304 until a newer frame is analysed.
+        """
+        source = _frame_source(request, pk, "snapshot.jpg")
+        if isinstance(source, HttpResponseBase):
+            return source
+        key, detector, width, since = source
+
+        try:
+            snapshot = SNAPSHOTS.get(key, detector, width)
+        except open_cv.error as e:
+            logger.error(f"Error rendering the snapshot of parking lot {pk}: {e}")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        if snapshot is None:
+            return Response(
+                {"error": "No frame analysed yet"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        if since == snapshot.version or request.headers.get('If-None-Match') == snapshot.etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(snapshot.jpeg, content_type="image/jpeg")
+        response['ETag'] = snapshot.etag
+        response['X-Frame-Version'] = str(snapshot.version)
+        response['Cache-Control'] = "no-cache"
+        return response
+
+
+class LiveStreamView(APIView):
+    """API endpoint for a live MJPEG feed of a lot, its spaces outlined by status"""
+
+    def get(self, request, pk):
+        """Stream annotated frames as multipart/x-mixed-replace, with ?camera= and ?width=
+
+        All viewers share one encoder, capped at PARKING_STREAM_FPS, and
+        slow viewers skip frames. Every viewer holds a server thread.
+        """
+        source = _frame_source(request, pk, "stream.mjpg")
+        if isinstance(source, HttpResponseBase):
+            return source
+        key, _, width, _ = source
+
+        manager = DetectorManager()
+        stream, mailbox = STREAMS.attach(key, lambda: manager.detectors.get(key), width)
+        response = StreamingHttpResponse(stream.frames(mailbox), content_type=STREAM_CONTENT_TYPE)
+        response['Cache-Control'] = "no-cache"
+        return response
+
+
+class ProfileView(APIView):
+    """API endpoint for sampling the detectors of a running parking lot"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, pk):
+        """Request a profile of a lot's detector threads, returns 202 and the capture to poll"""
+        try:
+            lot = ParkingLot.objects.get(id=pk)
+        except ParkingLot.DoesNotExist:
+            return Response(
+                {"error": "Parking lot not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            seconds = int(request.data.get('seconds', 10))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "seconds must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= seconds <= MAX_SECONDS:
+            return Response(
+                {"error": f"seconds must be between 1 and {MAX_SECONDS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not DetectorLease.objects.filter(parking_lot=lot, expires_at__gte=timezone.now()).exists():
+            return Response(
+                {"error": "No worker is running this parking lot"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        capture = request_capture(lot, seconds)
+        url = reverse('lot_profile_capture', args=[lot.id, capture.id])
+        return Response(
+            {"id": capture.id, "status": capture.status, "seconds": capture.seconds, "url": url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": url}
+        )
+
+
+class ProfileCaptureView(APIView):
+    """API endpoint for polling a requested profile"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk, capture_id):
+        """Collapsed stacks for flamegraphs once done, 202 while the capture runs"""
+        try:
+            capture = ProfileCapture.objects.get(id=capture_id, parking_lot_id=pk)
+        except ProfileCapture.DoesNotExist:
+            return Response(
+                {"error": "Profile capture not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        refresh_capture(capture)
+        if capture.status == ProfileCapture.FAILED:
+            return Response(
+                {"error": capture.stacks or "Profile capture failed", "id": capture.id},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+        if capture.status != ProfileCapture.DONE:
+            return Response(
+                {"id": capture.id, "status": capture.status},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Retry-After": "1"}
+            )
+
+        response = HttpResponse(capture.stacks, content_type="text/plain; charset=utf-8")
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.folded"'
+        return response
+
+
+def metrics(request):
+    """Metrics of this process in the Prometheus text format"""
+    if not detector_metrics.REGISTRY.enabled:
+        raise Http404("Metrics are disabled")
+    return HttpResponse(
+        detector_metrics.REGISTRY.render(), content_type=detector_metrics.CONTENT_TYPE
+    )
@@ -126,3 +126,80 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# JSON is encoded with orjson, DRF's encoder only renders the indented
+# responses of the browsable API
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "parking_detection.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+
+# Parking detection
+# Run detectors in web server processes (gunicorn, uvicorn and the like, or
+# runserver) from their first request, as one more lease-holding worker.
+# Turn it off on web-only nodes, detectors then run in `manage.py run_detectors`
+# workers and the web tier only reads the statuses they store.
+
+PARKING_DETECTORS_AUTOSTART = os.getenv(
+    "PARKING_DETECTORS_AUTOSTART", "true"
+).lower() in ("1", "true", "yes")
+
+# Vehicle model weights live in a local directory described by models.yaml,
+# nothing is downloaded at runtime. Lots without a model use the default one.
+
+PARKING_MODELS_DIR = Path(os.getenv("PARKING_MODELS_DIR", BASE_DIR / "models"))
+PARKING_DEFAULT_MODEL = os.getenv("PARKING_DEFAULT_MODEL", "yolov8n")
+
+# Space geometry compiled from the coordinates files, keyed by their content
+# hash and memory-mapped by the detectors. Safe to delete, it is rebuilt.
+PARKING_GEOMETRY_CACHE = Path(os.getenv("PARKING_GEOMETRY_CACHE", BASE_DIR / "cache" / "geometry"))
+
+# Threads used by the inference backends, unset lets each runtime decide
+PARKING_INFERENCE_THREADS = int(os.getenv("PARKING_INFERENCE_THREADS", "0")) or None
+
+# CPU seconds per second the detectors may spend on analysis, shared by all
+# lots, and the highest analysis rate a single lot can get (analyses/s)
+PARKING_CPU_BUDGET = float(os.getenv("PARKING_CPU_BUDGET", "1.0"))
+PARKING_MAX_ANALYSIS_RATE = float(os.getenv("PARKING_MAX_ANALYSIS_RATE", "10"))
+
+# Seconds a worker holds a lot's lease without renewing it before another
+# worker may take the lot over. Leases are renewed every third of it.
+PARKING_LEASE_TTL = float(os.getenv("PARKING_LEASE_TTL", "30"))
+
+# Expose detector and database timings in the Prometheus text format on
+# /metrics, and on `run_detectors --http-port` for workers
+PARKING_METRICS_ENABLED = os.getenv(
+    "PARKING_METRICS_ENABLED", "true"
+).lower() in ("1", "true", "yes")
+
+# Address the `run_detectors --http-port` server listens on, this host only
+# by default. When the web tier or Prometheus run on other hosts, listen on
+# 0.0.0.0 and set a shared secret: workers then require it as a bearer token
+# and the web tier sends it when proxying frames.
+PARKING_WORKER_HTTP_ADDRESS = os.getenv("PARKING_WORKER_HTTP_ADDRESS", "127.0.0.1")
+PARKING_WORKER_SECRET = os.getenv("PARKING_WORKER_SECRET", "")
+
+# Seconds between updates of the forecast profiles of the lots a worker
+# runs, from the statuses it stored meanwhile. 0 leaves it to build_forecasts.
+PARKING_FORECAST_UPDATE_SECONDS = float(os.getenv("PARKING_FORECAST_UPDATE_SECONDS", "300"))
+
+# Shared memory for the decoded frames of each camera a worker runs, in MB.
+# A camera's ring keeps up to 10 frames and at least 6 whatever the budget:
+# about 6 MB each at 1080p, 25 MB at 4K. Rings live in /dev/shm, which
+# containers get 64 MB of by default: give workers room for all their
+# cameras with `docker run --shm-size` or `shm_size:` in docker compose.
+PARKING_FRAME_RING_MB = float(os.getenv("PARKING_FRAME_RING_MB", "64"))
+
+# Frames per second of the live MJPEG streams, whatever the analysis rate.
+# One encoder per lot camera serves every viewer.
+PARKING_STREAM_FPS = float(os.getenv("PARKING_STREAM_FPS", "5"))
+
+# Optional per-frame timing trace of every detector, one line per analysed
+# frame in a rotating file. Empty disables it.
+PARKING_FRAME_TRACE = os.getenv("PARKING_FRAME_TRACE", "")
+PARKING_FRAME_TRACE_BYTES = int(os.getenv("PARKING_FRAME_TRACE_BYTES", str(10 * 1024 * 1024)))
+PARKING_FRAME_TRACE_BACKUPS = int(os.getenv("PARKING_FRAME_TRACE_BACKUPS", "5"))
@@ -20,9 +20,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from parking_detection.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/parking/", include("parking_detection.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -2,9 +2,11 @@ from enum import Enum
 
 
 class Color(Enum):
+    """Drawing colors, in the BGR order OpenCV uses"""
+
     BLACK = (0, 0, 0)
-    BLUE = (0, 0, 255)
+    BLUE = (255, 0, 0)
     GREEN = (0, 255, 0)
-    RED = (255, 0, 0)
+    RED = (0, 0, 255)
     WHITE = (255, 255, 255)
     YELLOW = (0, 255, 255)
@@ -1,5 +1,12 @@
 import cv2 as open_cv
 from shared.colors import Color
+from shared.statuses import ParkingStatus
+
+# Border color of a space by its status, undetermined spaces are yellow
+STATUS_COLORS = {
+    ParkingStatus.FREE: Color.GREEN,
+    ParkingStatus.OCCUPIED: Color.RED,
+}
 
 
 def draw_contours(
@@ -12,6 +19,10 @@ def draw_contours(
     font=open_cv.FONT_HERSHEY_SIMPLEX,
     font_scale=0.5,
 ):
+    # OpenCV wants plain tuples, not Color members
+    border_color = getattr(border_color, "value", border_color)
+    font_color = getattr(font_color, "value", font_color)
+
     open_cv.drawContours(
         image,
         [coordinates],
@@ -37,3 +48,12 @@ def draw_contours(
         line_thickness,
         open_cv.LINE_AA,
     )
+
+
+def draw_statuses(image, geometry, statuses):
+    """Outline every space of a lot in the color of its status, labelled by ID"""
+    for space_id, coordinates, status in zip(geometry.ids.tolist(), geometry.contours, statuses):
+        draw_contours(
+            image, coordinates, str(space_id + 1), Color.WHITE,
+            STATUS_COLORS.get(status, Color.YELLOW)
+        )